@@ -0,0 +1,409 @@
+# src/adjustments.py
+
+"""
+Warstwa korekt o zdarzenia korporacyjne (splity, dywidendy).
+
+data_loader zapisuje ceny z Yahoo z auto_adjust=False (kolumny Close
+i Adj Close), a backtest_simple / universe_dynamic / screener pobierają
+auto_adjust=True – bez tej warstwy silnik liczył momentum na Close
+z dziurami po splitach, a backtest na cenach skorygowanych.
+
+Magazyn zostaje surowy (CSV bez zmian). Dla każdego tickera trzymamy
+osobno listę zdarzeń (data ex, rodzaj, współczynnik) i skumulowany
+wektor współczynników – data/adjustments/<TICKER>.json. Cena
+skorygowana powstaje dopiero przy odczycie:
+
+    adj_close[t] = close[t] * prod(współczynniki zdarzeń z datą ex > t)
+
+czyli jedno searchsorted + mnożenie kolumn. Nowy split dopisuje jedno
+zdarzenie i przelicza wektor (kilkadziesiąt liczb) – historia cen nie
+jest przepisywana.
+
+Źródła zdarzeń:
+  - "prices" – wyprowadzane z samych CSV: skok ilorazu Adj Close / Close
+    między sesjami to dywidenda albo split, który Yahoo uwzględnił w Adj
+    Close, a nie w Close (magazyn dociągany przyrostowo przez split).
+    Liczone przy każdym update() z okna ramki – tanio, wektorowo;
+  - "yahoo" – sync_yahoo(): splity i dywidendy z yfinance, gdy Adj Close
+    w starych wierszach jest nieaktualny,
+  - "manual" – record_split() / record_dividend().
+
+Split spoza "prices" jest stosowany tylko wtedy, gdy surowy Close
+faktycznie ma w tym dniu skok o ten współczynnik (±10·SPLIT_TOL – cena
+rusza się też w samej sesji) i nie dubluje splitu "prices" – inaczej
+(np. po ponownym pobraniu całej, już skorygowanej historii) byłby
+naliczony drugi raz.
+
+Skorygowane są Open / High / Low / Close (wszystkie zdarzenia) i Volume
+(tylko splity, odwrotnie). Ostatni wiersz ramki ma współczynnik 1 –
+wycena pozycji i ceny zleceń się nie zmieniają.
+
+    store = AdjustmentStore()
+    store.update("AAPL", df)                  # zdarzenia z ilorazu Adj Close / Close
+    adj = store.adjusted("AAPL", df)          # widok skorygowany
+    prices = store.view(price_data)           # {ticker: widok} liczony przy odczycie
+    store.record_split("NVDA", "2024-06-10", 10)
+    python src/adjustments.py --show AAPL
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import count
+
+ADJ_DIR = Path(__file__).resolve().parent.parent / "data" / "adjustments"
+
+# skok ilorazu Adj Close / Close mniejszy niż to = szum zaokrągleń CSV
+ADJ_TOL = 1e-5
+# tolerancja dopasowania współczynnika do typowego splitu / skoku Close
+SPLIT_TOL = 0.01
+# typowe splity (p:q) i ich odwrotności (scalenia akcji)
+SPLIT_RATIOS = np.array(sorted(
+    {p / q for p in range(1, 11) for q in range(1, 5) if p != q}
+    | {float(n) for n in (15, 20, 25, 30, 50, 100)}
+    | {1.0 / n for n in (15, 20, 25, 30, 50, 100)}
+))
+
+PRICE_COLUMNS = ("Open", "High", "Low", "Close")
+SOURCES = ("prices", "yahoo", "manual")
+
+
+def _day(value) -> np.datetime64:
+    return np.datetime64(pd.Timestamp(value).normalize().date(), "D")
+
+
+def _is_split_ratio(ratio: float) -> bool:
+    nearest = SPLIT_RATIOS[np.abs(np.log(SPLIT_RATIOS / ratio)).argmin()]
+    return abs(ratio / nearest - 1.0) <= SPLIT_TOL
+
+
+# -------------------------------------------------------------
+# Współczynniki jednego tickera
+# -------------------------------------------------------------
+class AdjustmentFactors:
+    """
+    Zdarzenia jednego tickera posortowane po dacie ex. Zdarzenie
+    (date, kind, factor, source): ceny PRZED `date` mnożymy przez `factor`
+    (split 4:1 → 0.25, dywidenda 1% → 0.99).
+    """
+
+    def __init__(self, ticker: str, events: List[tuple] | None = None):
+        self.ticker = ticker
+        self.events: List[tuple] = []
+        for date, kind, factor, source in events or []:
+            self.events.append((_day(date), kind, float(factor), source))
+        self._sort()
+
+    def __repr__(self) -> str:
+        splits = sum(e[1] == "split" for e in self.events)
+        return f"AdjustmentFactors({self.ticker}: {len(self.events)} zdarzeń, w tym {splits} splitów)"
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def _sort(self) -> None:
+        self.events.sort(key=lambda e: (e[0], e[1], e[3]))
+        self.dates = np.array([e[0] for e in self.events], dtype="datetime64[D]")
+        factors = np.array([e[2] for e in self.events], dtype=float)
+        splits = np.array([e[2] if e[1] == "split" else 1.0 for e in self.events], dtype=float)
+        # cum[i] = iloczyn współczynników zdarzeń i..n-1 (+ 1.0 za ostatnim zdarzeniem)
+        self.cumulative = np.r_[np.cumprod(factors[::-1])[::-1], 1.0]
+        self.cumulative_splits = np.r_[np.cumprod(splits[::-1])[::-1], 1.0]
+
+    # ---------------------------------------------------------
+    # Odczyt
+    # ---------------------------------------------------------
+    def at(self, index, splits_only: bool = False) -> np.ndarray:
+        """Współczynnik dla każdej daty `index` (zdarzenia z datą ex > data)."""
+        if not self.events:
+            return np.ones(len(index))
+        days = pd.DatetimeIndex(index).to_numpy().astype("datetime64[D]")
+        cum = self.cumulative_splits if splits_only else self.cumulative
+        return cum[np.searchsorted(self.dates, days, side="right")]
+
+    def adjust(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Skorygowana kopia ramki; bez zdarzeń w jej zakresie – ta sama ramka."""
+        # wszystkie zdarzenia nie później niż pierwszy wiersz → współczynnik 1 w całej ramce
+        if not self.events or len(df) == 0 or self.dates[-1] <= _day(df.index.min()):
+            return df
+        f = self.at(df.index)
+        if np.all(f == 1.0):
+            return df
+        out = df.copy()
+        for col in PRICE_COLUMNS:
+            if col in out:
+                out[col] = out[col].to_numpy(dtype=float) * f
+        if "Volume" in out:
+            out["Volume"] = out["Volume"].to_numpy(dtype=float) / self.at(df.index, splits_only=True)
+        count("adjustments.adjusted")
+        return out
+
+    # ---------------------------------------------------------
+    # Zmiany
+    # ---------------------------------------------------------
+    def add(self, date, kind: str, factor: float, source: str) -> bool:
+        """
+        Dodaje zdarzenie (to samo date+kind+source nadpisuje); True = zmiana.
+        Split już wyprowadzony z cen ("prices") tego dnia nie jest dublowany.
+        """
+        if source not in SOURCES:
+            raise ValueError(f"Nieznane źródło zdarzenia {source!r}. Dostępne: {SOURCES}")
+        event = (_day(date), kind, float(factor), source)
+        if kind == "split" and source != "prices" and any(
+            e[0] == event[0] and e[1] == "split" and e[3] == "prices" for e in self.events
+        ):
+            return False
+        same = [e for e in self.events if e[0] == event[0] and e[1] == kind and e[3] == source]
+        if same and all(np.isclose(e[2], event[2], rtol=1e-9) for e in same):
+            return False
+        self.events = [e for e in self.events if e not in same] + [event]
+        self._sort()
+        return True
+
+    def replace_inferred(self, inferred: List[tuple], lo, hi) -> bool:
+        """Podmienia zdarzenia "prices" z zakresu [lo, hi] na świeżo wyprowadzone."""
+        lo, hi = _day(lo), _day(hi)
+        keep = [e for e in self.events if not (e[3] == "prices" and lo <= e[0] <= hi)]
+        old = [e for e in self.events if e not in keep]
+        if len(old) == len(inferred) and all(
+            a[0] == b[0] and a[1] == b[1] and np.isclose(a[2], b[2], rtol=1e-9)
+            for a, b in zip(old, sorted(inferred, key=lambda e: e[0]))
+        ):
+            return False
+        self.events = keep + [(d, k, f, "prices") for d, k, f in inferred]
+        self._sort()
+        return True
+
+    def drop_unconfirmed_splits(self, df: pd.DataFrame) -> List[tuple]:
+        """
+        Usuwa splity "yahoo" / "manual", których nie widać w surowym Close
+        (w zakresie ramki) – historia jest już skorygowana – albo które
+        dublują split wyprowadzony z Adj Close ("prices"). Zwraca usunięte.
+        """
+        if "Close" not in df or len(df) < 2:
+            return []
+        close = df["Close"].to_numpy(dtype=float)
+        days = df.index.to_numpy().astype("datetime64[D]")
+        inferred = {e[0] for e in self.events if e[1] == "split" and e[3] == "prices"}
+        dropped = []
+        for e in self.events:
+            if e[1] != "split" or e[3] == "prices" or not (days[0] < e[0] <= days[-1]):
+                continue
+            i = int(np.searchsorted(days, e[0], side="left"))
+            jump = close[i] / close[i - 1]
+            if e[0] in inferred or not abs(jump / e[2] - 1.0) <= 10 * SPLIT_TOL:
+                dropped.append(e)
+        if dropped:
+            self.events = [e for e in self.events if e not in dropped]
+            self._sort()
+        return dropped
+
+    # ---------------------------------------------------------
+    # Zapis / odczyt
+    # ---------------------------------------------------------
+    def to_dict(self) -> dict:
+        return {
+            "ticker": self.ticker,
+            "events": [[str(d), k, f, s] for d, k, f, s in self.events],
+            "cumulative": self.cumulative[:-1].tolist(),
+        }
+
+    @classmethod
+    def load(cls, path: Path, ticker: str) -> "AdjustmentFactors":
+        if not path.exists():
+            return cls(ticker)
+        try:
+            with open(path, encoding="utf-8") as f:
+                return cls(ticker, [tuple(e) for e in json.load(f)["events"]])
+        except (OSError, ValueError, KeyError) as exc:
+            print(f"[ADJ] Nie udało się wczytać {path.name}: {exc} – zaczynam od pustej listy.")
+            return cls(ticker)
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=1)
+        os.replace(tmp, path)
+
+
+# -------------------------------------------------------------
+# Zdarzenia z ilorazu Adj Close / Close
+# -------------------------------------------------------------
+def infer_events(df: pd.DataFrame) -> List[tuple]:
+    """
+    [(date, kind, factor)] ze skoków a = Adj Close / Close między kolejnymi
+    wierszami: factor = a[t-1] / a[t] dotyczy cen przed t. kind = "split",
+    gdy 1 / factor to typowy split, inaczej "dividend".
+    """
+    if "Adj Close" not in df or "Close" not in df or len(df) < 2:
+        return []
+    with np.errstate(divide="ignore", invalid="ignore"):
+        a = df["Adj Close"].to_numpy(dtype=float) / df["Close"].to_numpy(dtype=float)
+    ok = np.isfinite(a) & (a > 0)
+    a, days = a[ok], df.index.to_numpy().astype("datetime64[D]")[ok]
+    if len(a) < 2:
+        return []
+    step = a[:-1] / a[1:]
+    idx = np.flatnonzero(np.abs(step - 1.0) > ADJ_TOL)
+    return [
+        (days[i + 1], "split" if _is_split_ratio(1.0 / step[i]) else "dividend", float(step[i]))
+        for i in idx
+    ]
+
+
+# -------------------------------------------------------------
+# Magazyn współczynników
+# -------------------------------------------------------------
+class AdjustmentStore:
+    """Współczynniki wszystkich tickerów: leniwie z dysku, zapis tylko po zmianie."""
+
+    def __init__(self, store_dir: str | Path | None = ADJ_DIR):
+        self.store_dir = Path(store_dir) if store_dir else None
+        self._factors: Dict[str, AdjustmentFactors] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, ticker: str) -> Path:
+        return self.store_dir / f"{ticker}.json"
+
+    def get(self, ticker: str) -> AdjustmentFactors:
+        with self._lock:
+            factors = self._factors.get(ticker)
+            if factors is None:
+                factors = (AdjustmentFactors.load(self._path(ticker), ticker) if self.store_dir
+                           else AdjustmentFactors(ticker))
+                self._factors[ticker] = factors
+            return factors
+
+    def _save(self, factors: AdjustmentFactors) -> None:
+        if self.store_dir:
+            factors.save(self._path(factors.ticker))
+
+    # ---------------------------------------------------------
+    def update(self, ticker: str, df: pd.DataFrame) -> int:
+        """
+        Odświeża zdarzenia "prices" z okna ramki (surowe ceny z data_loader)
+        i weryfikuje zewnętrzne splity. Zwraca liczbę zdarzeń tickera.
+        """
+        factors = self.get(ticker)
+        if len(df) == 0:
+            return len(factors)
+        changed = factors.replace_inferred(infer_events(df), df.index.min(), df.index.max())
+        for e in factors.drop_unconfirmed_splits(df):
+            print(f"[ADJ] {ticker}: split {e[0]} ({e[3]}) nie występuje w surowym Close – pomijam.")
+            changed = True
+        if changed:
+            self._save(factors)
+        return len(factors)
+
+    def adjusted(self, ticker: str, df: pd.DataFrame) -> pd.DataFrame:
+        return self.get(ticker).adjust(df)
+
+    def view(self, price_data: Dict[str, pd.DataFrame]) -> "AdjustedPrices":
+        return AdjustedPrices(price_data, self)
+
+    # ---------------------------------------------------------
+    def record_split(self, ticker: str, date, ratio: float, source: str = "manual") -> AdjustmentFactors:
+        """Split `ratio`:1 (np. 4 → ceny sprzed daty / 4; 0.1 = scalenie 1:10)."""
+        factors = self.get(ticker)
+        if factors.add(date, "split", 1.0 / float(ratio), source):
+            self._save(factors)
+        return factors
+
+    def record_dividend(self, ticker: str, date, amount: float, prev_close: float,
+                        source: str = "manual") -> AdjustmentFactors:
+        """Dywidenda `amount` na akcję; prev_close = Close z sesji przed datą ex."""
+        factors = self.get(ticker)
+        if factors.add(date, "dividend", 1.0 - float(amount) / float(prev_close), source):
+            self._save(factors)
+        return factors
+
+    def sync_yahoo(self, ticker: str, df: pd.DataFrame) -> int:
+        """
+        Dopisuje splity i dywidendy z yfinance (Ticker.splits / .dividends)
+        z datą ex w zakresie ramki, których nie ma jeszcze wśród zdarzeń
+        (dywidenda: brak zdarzenia w ±5 dni). Zwraca liczbę dodanych.
+        """
+        import yfinance as yf
+
+        count("yahoo.actions")
+        yt = yf.Ticker(ticker)
+        factors = self.get(ticker)
+        lo, hi = _day(df.index.min()), _day(df.index.max())
+        days = df.index.to_numpy().astype("datetime64[D]")
+        close = df["Close"].to_numpy(dtype=float)
+        known = factors.dates
+        added = 0
+
+        for date, ratio in yt.splits.items():
+            day = _day(date.tz_localize(None) if date.tzinfo else date)
+            if lo < day <= hi and not any(e[0] == day and e[1] == "split" for e in factors.events):
+                added += factors.add(day, "split", 1.0 / float(ratio), "yahoo")
+
+        for date, amount in yt.dividends.items():
+            day = _day(date.tz_localize(None) if date.tzinfo else date)
+            if not (lo < day <= hi) or (len(known) and np.abs((known - day).astype(int)).min() <= 5):
+                continue
+            i = int(np.searchsorted(days, day, side="left"))
+            added += factors.add(day, "dividend", 1.0 - float(amount) / close[i - 1], "yahoo")
+
+        # split z Yahoo, którego surowy Close nie ma (historia już skorygowana) – odrzucony
+        factors.drop_unconfirmed_splits(df)
+        if added:
+            self._save(factors)
+        return added
+
+
+class AdjustedPrices(Mapping):
+    """{ticker: ramka} skorygowana przy każdym odczycie (surowe ramki bez zmian)."""
+
+    def __init__(self, price_data: Dict[str, pd.DataFrame], store: AdjustmentStore):
+        self._raw = price_data
+        self._store = store
+
+    def __getitem__(self, ticker: str) -> pd.DataFrame:
+        return self._store.adjusted(ticker, self._raw[ticker])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._raw)
+
+    def __len__(self) -> int:
+        return len(self._raw)
+
+
+# -------------------------------------------------------------
+# CLI
+# -------------------------------------------------------------
+if __name__ == "__main__":
+    from data_loader import load_single_history
+
+    parser = argparse.ArgumentParser(description="Korekty o splity i dywidendy (współczynniki per ticker)")
+    parser.add_argument("tickers", nargs="+")
+    parser.add_argument("--sync", action="store_true", help="dopisz splity / dywidendy z yfinance")
+    parser.add_argument("--split", nargs=2, metavar=("DATA", "RATIO"), help="ręczny split, np. 2024-06-10 10")
+    parser.add_argument("--show", action="store_true", help="wypisz zdarzenia i współczynniki")
+    args = parser.parse_args()
+
+    store = AdjustmentStore()
+    for ticker in args.tickers:
+        df = load_single_history(ticker, start="1990-01-01", allow_download=False)
+        store.update(ticker, df)
+        if args.split:
+            store.record_split(ticker, args.split[0], float(args.split[1]))
+        if args.sync:
+            print(f"[ADJ] {ticker}: z Yahoo dodano {store.sync_yahoo(ticker, df)} zdarzeń")
+        factors = store.get(ticker)
+        print(f"[ADJ] {factors!r}")
+        if args.show:
+            for (d, k, f, s), cum in zip(factors.events, factors.cumulative):
+                print(f"  {d}  {k:<9} x{f:.6f}  (skumulowany x{cum:.6f}, źródło {s})")
@@ -0,0 +1,273 @@
+# src/analytics.py
+
+"""
+Metryki wyników – wektorowo, dla wielu krzywych equity naraz.
+
+Wejście to macierz equity [T x N] (N krzywych, np. N konfiguracji
+z przeglądu parametrów) albo pojedyncza krzywa [T]. Wpłaty/wypłaty
+(`flows`, ta sama forma) są wliczone w equity danego dnia, więc zwrot
+dzienny liczymy po ich odjęciu:
+
+    r_t = (E_t - F_t) / E_{t-1} - 1          (time-weighted, bez wpłat)
+
+Na tym opierają się TWR, CAGR, zmienność, Sharpe, Sortino i drawdowny
+(z indeksu TWR – wpłata nie "zasypuje" obsunięcia). IRR (money-weighted)
+liczony jest z przepływów: -E_0, -F_t, +E_T.
+
+    from analytics import summarize
+    stats = summarize(equity_df, flows=flows_df)       # DataFrame [krzywa x metryka]
+    stats = summarize(eq_matrix, dates=dates, names=configs)
+
+Te same funkcje używa backtest_simple, backtest_buffett_like i raporty.
+"""
+
+from __future__ import annotations
+
+from typing import Iterable, Sequence
+
+import numpy as np
+import pandas as pd
+
+PERIODS_PER_YEAR = 252
+
+METRICS = [
+    "final_equity", "net_flows", "total_return", "twr", "cagr", "volatility",
+    "sharpe", "sortino", "max_drawdown", "calmar", "irr", "turnover",
+]
+
+
+def _as_2d(x) -> np.ndarray:
+    arr = np.asarray(x, dtype=float)
+    return arr[:, None] if arr.ndim == 1 else arr
+
+
+def _years(dates: pd.DatetimeIndex | None, n: int, periods_per_year: int) -> float:
+    if dates is not None and len(dates) > 1:
+        return (dates[-1] - dates[0]).days / 365.25
+    return (n - 1) / periods_per_year
+
+
+# -------------------------------------------------------------
+# Zwroty
+# -------------------------------------------------------------
+def returns(equity, flows=None) -> np.ndarray:
+    """Dzienne zwroty time-weighted [T x N]; pierwszy wiersz = NaN."""
+    eq = _as_2d(equity)
+    fl = np.zeros_like(eq) if flows is None else _as_2d(flows)
+    out = np.full_like(eq, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[1:] = (eq[1:] - fl[1:]) / eq[:-1] - 1.0
+    # przed pierwszą wpłatą (equity 0) zwrotu nie ma
+    out[1:][eq[:-1] <= 0] = np.nan
+    return out
+
+
+def wealth_index(rets) -> np.ndarray:
+    """Indeks TWR (start = 1.0) z macierzy zwrotów."""
+    r = _as_2d(rets)
+    return np.cumprod(1.0 + np.nan_to_num(r), axis=0)
+
+
+def twr(rets) -> np.ndarray:
+    """Skumulowany zwrot time-weighted per krzywa."""
+    return wealth_index(rets)[-1] - 1.0
+
+
+def cagr(rets, years: float) -> np.ndarray:
+    """Roczny zwrot z TWR (bez wpływu wpłat)."""
+    growth = 1.0 + twr(rets)
+    if years <= 0:
+        return np.full_like(growth, np.nan)
+    with np.errstate(invalid="ignore"):
+        return growth ** (1.0 / years) - 1.0
+
+
+def volatility(rets, periods_per_year: int = PERIODS_PER_YEAR) -> np.ndarray:
+    return np.nanstd(_as_2d(rets), axis=0, ddof=1) * np.sqrt(periods_per_year)
+
+
+def sharpe(rets, rf: float = 0.0, periods_per_year: int = PERIODS_PER_YEAR) -> np.ndarray:
+    """Roczny Sharpe; rf – roczna stopa wolna od ryzyka."""
+    ex = _as_2d(rets) - rf / periods_per_year
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.nanmean(ex, axis=0) / np.nanstd(ex, axis=0, ddof=1) * np.sqrt(periods_per_year)
+
+
+def sortino(rets, rf: float = 0.0, periods_per_year: int = PERIODS_PER_YEAR) -> np.ndarray:
+    """Roczny Sortino (odchylenie tylko ujemnych nadwyżek)."""
+    ex = _as_2d(rets) - rf / periods_per_year
+    downside = np.sqrt(np.nanmean(np.minimum(ex, 0.0) ** 2, axis=0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.nanmean(ex, axis=0) / downside * np.sqrt(periods_per_year)
+
+
+# -------------------------------------------------------------
+# Drawdowny
+# -------------------------------------------------------------
+def drawdown(wealth) -> np.ndarray:
+    """Obsunięcie od szczytu [T x N] (0 … -1)."""
+    w = _as_2d(wealth)
+    return w / np.maximum.accumulate(w, axis=0) - 1.0
+
+
+def max_drawdown(wealth) -> np.ndarray:
+    return drawdown(wealth).min(axis=0)
+
+
+def rolling_drawdown(wealth, window: int = PERIODS_PER_YEAR) -> np.ndarray:
+    """Obsunięcie od szczytu z ostatnich `window` okresów [T x N]."""
+    w = pd.DataFrame(_as_2d(wealth))
+    peak = w.rolling(window, min_periods=1).max()
+    return (w / peak - 1.0).to_numpy()
+
+
+def rolling_max_drawdown(wealth, window: int = PERIODS_PER_YEAR) -> np.ndarray:
+    """Najgorsze obsunięcie w kroczącym oknie `window` [T x N]."""
+    return pd.DataFrame(rolling_drawdown(wealth, window)).rolling(window, min_periods=1).min().to_numpy()
+
+
+# -------------------------------------------------------------
+# Obrót
+# -------------------------------------------------------------
+def turnover(weights, years: float | None = None) -> np.ndarray | float:
+    """
+    Obrót portfela z wag docelowych w kolejnych rebalansach.
+
+    weights : [R x K] (jedna strategia, K tickerów; NaN = 0) albo
+              [R x N x K] (N strategii naraz).
+    Obrót rebalansu = 0.5 * sum |w_t - w_{t-1}| (pierwszy rebalans = wejście).
+    Zwraca sumę (albo średnią roczną, gdy podano `years`).
+    """
+    w = np.nan_to_num(np.asarray(weights, dtype=float))
+    prev = np.concatenate([np.zeros_like(w[:1]), w[:-1]], axis=0)
+    total = 0.5 * np.abs(w - prev).sum(axis=-1).sum(axis=0)
+    return total / years if years else total
+
+
+# -------------------------------------------------------------
+# IRR (money-weighted)
+# -------------------------------------------------------------
+def irr(equity, flows=None, dates: pd.DatetimeIndex | None = None,
+        periods_per_year: int = PERIODS_PER_YEAR, iterations: int = 50) -> np.ndarray:
+    """
+    Roczna wewnętrzna stopa zwrotu per krzywa (XIRR): inwestor wpłaca E_0
+    i kolejne F_t, na końcu "wypłaca" E_T. Bisekcja na wszystkich
+    krzywych naraz (monotoniczne NPV dla typowego planu wpłat).
+    """
+    eq = _as_2d(equity)
+    t_n, n = eq.shape
+    fl = np.zeros_like(eq) if flows is None else _as_2d(flows).copy()
+
+    cf = -fl
+    cf[0] -= eq[0] - fl[0]   # kapitał startowy (E_0 zawiera już wpłatę z dnia 0)
+    cf[-1] += eq[-1]
+
+    if dates is not None and len(dates) == t_n:
+        t = ((dates - dates[0]).days / 365.25).to_numpy(dtype=float)
+    else:
+        t = np.arange(t_n) / periods_per_year
+
+    # NPV liczymy tylko na dniach z przepływem (start, wpłaty, koniec)
+    rows = np.flatnonzero(np.any(cf != 0, axis=1))
+    cf, t = cf[rows], t[rows]
+
+    lo = np.full(n, -0.99)
+    hi = np.full(n, 10.0)
+
+    def npv(rate):
+        return (cf * (1.0 + rate)[None, :] ** (-t[:, None])).sum(axis=0)
+
+    f_lo = npv(lo)
+    valid = np.sign(f_lo) != np.sign(npv(hi))
+    for _ in range(iterations):
+        mid = 0.5 * (lo + hi)
+        f_mid = npv(mid)
+        left = np.sign(f_mid) == np.sign(f_lo)
+        lo = np.where(left, mid, lo)
+        f_lo = np.where(left, f_mid, f_lo)
+        hi = np.where(left, hi, mid)
+    return np.where(valid, 0.5 * (lo + hi), np.nan)
+
+
+# -------------------------------------------------------------
+# Podsumowanie
+# -------------------------------------------------------------
+def summarize(
+    equity,
+    flows=None,
+    dates: Iterable | None = None,
+    names: Sequence[str] | None = None,
+    weights=None,
+    rf: float = 0.0,
+    periods_per_year: int = PERIODS_PER_YEAR,
+) -> pd.DataFrame:
+    """
+    Pełny zestaw metryk dla N krzywych jednym wywołaniem.
+
+    equity  : DataFrame [data x krzywa] / ndarray [T x N] / Series / 1-D
+    flows   : wpłaty (+) / wypłaty (-) w tej samej formie (opcjonalnie)
+    weights : wagi z rebalansów do obrotu – [R x K] dla jednej krzywej
+              albo [R x N x K] (opcjonalnie)
+
+    Zwraca DataFrame [krzywa x METRICS].
+    """
+    if isinstance(equity, (pd.DataFrame, pd.Series)):
+        frame = equity.to_frame() if isinstance(equity, pd.Series) else equity
+        dates = dates if dates is not None else frame.index
+        names = names if names is not None else [str(c) for c in frame.columns]
+        eq = frame.to_numpy(dtype=float)
+    else:
+        eq = _as_2d(equity)
+    if isinstance(flows, (pd.DataFrame, pd.Series)):
+        flows = flows.to_numpy(dtype=float)
+
+    dates = pd.DatetimeIndex(dates) if dates is not None else None
+    fl = np.zeros_like(eq) if flows is None else _as_2d(flows)
+    rets = returns(eq, fl)
+    wealth = wealth_index(rets)
+    years = _years(dates, len(eq), periods_per_year)
+
+    mdd = max_drawdown(wealth)
+    growth = cagr(rets, years)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        calmar = np.where(mdd < 0, growth / -mdd, np.nan)
+
+    invested = eq[0] + fl[1:].sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        total = eq[-1] / invested - 1.0
+
+    out = pd.DataFrame({
+        "final_equity": eq[-1],
+        "net_flows": fl[1:].sum(axis=0),
+        "total_return": total,
+        "twr": wealth[-1] - 1.0,
+        "cagr": growth,
+        "volatility": volatility(rets, periods_per_year),
+        "sharpe": sharpe(rets, rf, periods_per_year),
+        "sortino": sortino(rets, rf, periods_per_year),
+        "max_drawdown": mdd,
+        "calmar": calmar,
+        "irr": irr(eq, fl, dates, periods_per_year),
+        "turnover": turnover(weights, years) if weights is not None else np.nan,
+    }, index=names if names is not None else range(eq.shape[1]))
+    return out[METRICS]
+
+
+def format_summary(stats: pd.Series) -> str:
+    """Czytelny blok tekstu dla jednej krzywej (wiersz z summarize())."""
+    lines = [
+        f"Końcowe equity:         {stats['final_equity']:,.2f}",
+        f"Wpłaty netto:           {stats['net_flows']:,.2f}",
+        f"Zwrot od wpłat:         {stats['total_return']:.2%}",
+        f"Zwrot TWR:              {stats['twr']:.2%}",
+        f"CAGR (TWR):             {stats['cagr']:.2%}",
+        f"IRR (money-weighted):   {stats['irr']:.2%}",
+        f"Zmienność roczna:       {stats['volatility']:.2%}",
+        f"Sharpe:                 {stats['sharpe']:.2f}",
+        f"Sortino:                {stats['sortino']:.2f}",
+        f"Maksymalne DD:          {stats['max_drawdown']:.2%}",
+        f"Calmar:                 {stats['calmar']:.2f}",
+    ]
+    if not pd.isna(stats["turnover"]):
+        lines.append(f"Obrót roczny:           {stats['turnover']:.2%}")
+    return "\n".join(lines)
@@ -21,6 +21,10 @@ import numpy as np
 from data_loader import load_price_history
 from universe import load_universe
 from buffett_lynch_portfolio import build_portfolio
+from indicators import realized_volatility, sma
+from analytics import summarize, format_summary
+from report_sink import ReportSink, read_columnar
+from costs import get_cost_model
 
 
 def compute_price_based_quality(prices: pd.Series,
@@ -55,7 +59,7 @@ def compute_price_based_quality(prices: pd.Series,
         return np.nan
     cagr = (1.0 + total_return) ** (1 / years) - 1.0
 
-    vol = ret.std() * np.sqrt(252)
+    vol = realized_volatility(px, log=False)
     if vol == 0 or np.isnan(vol):
         return np.nan
 
@@ -104,13 +108,17 @@ def build_scores_for_date(universe, price_panel, date) -> pd.DataFrame:
 def run_backtest(start_date: str = "2015-01-01",
                  end_date: str = "2025-12-05",
                  top_n: int = 15,
-                 rebalance_freq: str = "Q"):
+                 rebalance_freq: str = "QE",
+                 export_csv: bool = True,
+                 costs=None):
     """
     Prosty backtest cenowy:
       - uniwersum: load_universe()
       - rebalans: co kwartał (domyślnie)
       - wagi: Buffett/Lynch 2.0 (wg QualityScore) + cap/floor
       - hedge: jeśli SPY < SMA200 -> 100% cash (tu: 0% ekspozycji na rynek)
+      - koszty: CostModel / nazwa brokera (costs.py) – backtest zna tylko wagi,
+        więc koszt rebalansu = obrót (sum |Δw|) * proporcjonalna stawka brokera
 
     Wynik:
       - equity curve
@@ -141,6 +149,7 @@ def run_backtest(start_date: str = "2015-01-01",
 
     # Daty tradingowe (bierzemy z SPY jako proxy rynku)
     spy = price_panel["SPY"]
+    spy_sma200 = sma(spy["Close"], 200)  # raz dla całej historii
     trading_days = spy.index[(spy.index >= start_dt) & (spy.index <= end_dt)]
 
     if trading_days.empty:
@@ -158,25 +167,24 @@ def run_backtest(start_date: str = "2015-01-01",
     # 2. Symulacja portfela
     # ------------------------------------------------------
     equity = 1.0  # zaczynamy od 1.0
-    equity_curve = []
+    # krzywa equity strumieniowo na dysk (stała pamięć)
+    sink = ReportSink("reports", export_csv=export_csv)
+    equity_curve = sink.table("buffett_like_equity", {"date": "date", "equity": "f8"})
     current_weights = {}  # ticker -> weight
-
-    prev_date = trading_days[0]
+    rebalance_weights = {}  # data rebalansu -> wagi (do obrotu)
+    cost_rate = get_cost_model(costs).proportional_rate()  # akcje w USD z rachunku PLN
+    total_costs = 0.0
 
     for date in trading_days:
         # Czy rebalans?
         if date in rebal_dates:
-            # Najpierw zamykamy poprzedni „slot” equity
-            equity_curve.append({"date": prev_date, "equity": equity})
-            prev_date = date
-
+            previous_weights = current_weights
             # Market regime (SPY vs SMA200)
-            spy_sub = spy[spy.index <= date]
-            if spy_sub.shape[0] < 200:
+            sma200 = spy_sma200.loc[date]
+            if pd.isna(sma200):  # mniej niż 200 sesji historii
                 regime_bull = True
             else:
-                sma200 = spy_sub["Close"].rolling(200).mean().iloc[-1]
-                close_spy = spy_sub["Close"].iloc[-1]
+                close_spy = spy["Close"].loc[date]
                 regime_bull = close_spy >= sma200
 
             if not regime_bull:
@@ -204,6 +212,15 @@ def run_backtest(start_date: str = "2015-01-01",
                     for t, w in current_weights.items():
                         print(f"    {t}: {w:.2%}")
 
+            rebalance_weights[date] = dict(current_weights)
+
+            # koszt transakcji: obie strony zmiany wag naraz (wektorowo)
+            changed = pd.Series(current_weights, dtype=float).sub(
+                pd.Series(previous_weights, dtype=float), fill_value=0.0)
+            cost = equity * float(changed.abs().sum()) * cost_rate
+            equity -= cost
+            total_costs += cost
+
         # Aktualizacja equity wg bieżących wag
         if current_weights:
             # dzienny zwrot portfela
@@ -223,30 +240,24 @@ def run_backtest(start_date: str = "2015-01-01",
 
             equity *= (1.0 + port_ret)
 
-        equity_curve.append({"date": date, "equity": equity})
+        equity_curve.append(date, equity)
 
     # ------------------------------------------------------
     # 3. Statystyki + zapis
     # ------------------------------------------------------
-    eq_df = pd.DataFrame(equity_curve).drop_duplicates(subset="date").set_index("date")
-    eq_df = eq_df.sort_index()
-
-    total_return = eq_df["equity"].iloc[-1] - 1.0
-    years = (eq_df.index[-1] - eq_df.index[0]).days / 365.25
-    cagr = (eq_df["equity"].iloc[-1]) ** (1 / years) - 1.0 if years > 0 else np.nan
+    sink.close()
+    eq_df = read_columnar(equity_curve.path).set_index("date")
 
-    dd = eq_df["equity"] / eq_df["equity"].cummax() - 1.0
-    max_dd = dd.min()
+    weights_df = pd.DataFrame(list(rebalance_weights.values()), index=list(rebalance_weights)).fillna(0.0)
+    stats = summarize(
+        eq_df[["equity"]],
+        weights=weights_df.to_numpy() if not weights_df.empty else None,
+    )
 
     print("\n=== WYNIKI BACKTESTU (prototyp cenowy) ===\n")
     print(f"Okres:         {start_date} -> {end_date}")
-    print(f"Końcowe equity: {eq_df['equity'].iloc[-1]:.4f}")
-    print(f"Całkowity zwrot: {total_return:.2%}")
-    print(f"CAGR:            {cagr:.2%}")
-    print(f"Maksymalny DD:   {max_dd:.2%}")
-
-    # Zapis equity curve
-    import os
-    os.makedirs("reports", exist_ok=True)
-    eq_df.to_csv("reports/buffett_like_equity.csv")
-    print("\n[INFO] Zapisano krzywą kapitału do reports/buffett_like_equity.csv")
+    print(format_summary(stats.iloc[0]))
+    print(f"Koszty transakcyjne:    {total_costs:.4f} (equity start = 1.0, {get_cost_model(costs).name})")
+
+    print(f"\n[INFO] Zapisano krzywą kapitału do {equity_curve.path}"
+          + (" (+ reports/buffett_like_equity.csv)" if export_csv else ""))
@@ -3,6 +3,11 @@ import numpy as np
 import yfinance as yf
 from datetime import datetime
 from universe import load_universe
+from indicators import IndicatorCache
+from analytics import summarize, format_summary
+from report_sink import ReportSink, read_columnar
+from trading_calendar import rebalance_rows
+from costs import get_cost_model
 import os
 
 # =====================================================================
@@ -13,8 +18,8 @@ END = "2025-12-05"
 TOP_N = 5
 REBALANCE_DAY = 10
 MONTHLY_CONTRIBUTION = 2000  # PLN
-
-os.makedirs("reports", exist_ok=True)
+EXPORT_CSV = True  # oprócz formatu kolumnowego (.cols) także CSV
+BROKER = None  # model kosztów: nazwa z costs.BROKERS (None = MOMENTUM_BROKER / "none")
 
 
 # =====================================================================
@@ -36,92 +41,185 @@ def download_price_history(tickers):
 # =====================================================================
 # MOMENTUM SCORE
 # =====================================================================
-def compute_momentum_scores(price_df):
-    roc3 = price_df.pct_change(63).iloc[-1]
-    roc6 = price_df.pct_change(126).iloc[-1]
-    roc12 = price_df.pct_change(252).iloc[-1]
-    score = (roc3 + roc6 + roc12) / 3
+ROC_PERIODS = (63, 126, 252)  # ROC3 / ROC6 / ROC12 w sesjach
+
+
+def compute_momentum_scores(indicators, date, roc_periods=ROC_PERIODS):
+    # ROC liczone raz dla całego panelu, tu tylko odczyt wiersza z dnia `date`
+    rocs = [indicators.at("roc", date, periods=p) for p in roc_periods]
+    score = sum(rocs) / len(rocs)
     return score.sort_values(ascending=False)
 
 
+# =====================================================================
+# SIMULATION CORE
+# =====================================================================
+def iter_simulation(
+    prices,
+    indicators=None,
+    start=None,
+    end=None,
+    top_n=TOP_N,
+    roc_periods=ROC_PERIODS,
+    rebalance_day=REBALANCE_DAY,
+    contribution=MONTHLY_CONTRIBUTION,
+    costs=None,
+):
+    """
+    Strategia momentum na panelu Close [data x ticker] w oknie [start, end],
+    oddawana blokami między dniami rebalansu (pamięć wyników nie rośnie
+    z długością przebiegu – run_backtest zapisuje bloki od razu do ReportSink).
+
+    Wskaźniki liczone są na CAŁYM panelu (okno może zaczynać się od pierwszej
+    sesji z pełnym ROC12 – bez zaglądania w przyszłość, ROC patrzy wstecz).
+    Pozycje zmieniają się tylko w dni rebalansu, więc equity między nimi
+    liczone jest blokowo: cash + ceny[blok] @ ilości.
+
+    costs: CostModel / nazwa brokera (costs.py) – prowizja, poślizg i spread
+    FX (wpłaty w PLN, akcje w walucie) liczone wektorowo na całym rebalansie.
+
+    Każdy blok to dict:
+      dates, equity, flow  – dzienne tablice bloku (od dnia rebalansu do następnego),
+      trades               – transakcje zamknięte w dniu otwierającym blok
+                             (ticker, buy_date, sell_date, pnl_pct),
+      weights              – {data rebalansu: {ticker: waga}} z tego dnia,
+      costs                – koszty transakcyjne z tego dnia.
+    """
+    model = get_cost_model(costs)
+    if indicators is None:
+        indicators = IndicatorCache(prices)
+
+    window = prices.loc[start:end]
+    window = window[window.notna().any(axis=1)]
+    dates = window.index
+    tickers = list(window.columns)
+    col = {t: i for i, t in enumerate(tickers)}
+    # wycena: ostatnia znana cena (np. luka w notowaniach albo delisting)
+    px = window.ffill().to_numpy(dtype=float)
+    valued = np.nan_to_num(px)
+
+    n = len(dates)
+    if n == 0:
+        return
+    amounts = np.zeros(len(tickers))
+    buy_price = np.zeros(len(tickers))
+    buy_date = {}
+
+    cash = contribution   # pierwsza wpłata
+    flow = contribution   # wpłata z pierwszego dnia bloku
+    trades, weights, block_costs = [], {}, 0.0
+    block = 0
+
+    def emit(lo, hi):
+        block_flow = np.zeros(hi - lo)
+        block_flow[0] = flow
+        return {"dates": dates[lo:hi], "equity": cash + valued[lo:hi] @ amounts, "flow": block_flow,
+                "trades": trades, "weights": weights, "costs": block_costs}
+
+    # 10-ty albo pierwsza kolejna sesja – miesiąc z 10-tym w weekend / święto nie przepada
+    for i in rebalance_rows(dates, rebalance_day):
+        date = dates[i]
+        if i > block:
+            yield emit(block, i)
+            flow, trades, weights, block_costs = 0.0, [], {}, 0.0
+
+        # --------------------------
+        # MONTHLY CONTRIBUTION
+        # --------------------------
+        cash += contribution
+        flow += contribution
+
+        scores = compute_momentum_scores(indicators, date, roc_periods).dropna()
+        selected = [col[t] for t in scores.index[:top_n] if t in col]
+        row = px[i]
+
+        # ---------------------------------
+        # SELL positions outside TOP N (wszystkie naraz, ceny po kosztach)
+        # ---------------------------------
+        held = np.flatnonzero(amounts)
+        out = held[~np.isin(held, selected)]
+        if len(out):
+            sold = model.execution("SELL", amounts[out], row[out])
+            pnl = (sold["price_pln"] - buy_price[out]) / buy_price[out] * 100
+            trades.extend(zip([tickers[j] for j in out], [buy_date.pop(j) for j in out], [date] * len(out), pnl))
+            cash += (sold["price_pln"] * amounts[out]).sum()
+            block_costs += sold["cost_pln"].sum()
+            amounts[out] = 0.0
+
+        # ---------------------------------
+        # BUY – dokładamy do trzymanych, nowe otwieramy
+        # ---------------------------------
+        if cash > 0 and selected:
+            sel = np.array(selected)
+            add = model.buy_quantity(cash / len(sel), row[sel])
+            bought = model.execution("BUY", add, row[sel])
+            spent = bought["price_pln"] * add
+            new = amounts[sel] == 0
+            buy_price[sel] = np.where(new, bought["price_pln"],
+                                      (amounts[sel] * buy_price[sel] + spent) / (amounts[sel] + add))
+            buy_date.update((j, date) for j in sel[new])
+            amounts[sel] += add
+            cash = max(cash - spent.sum(), 0.0)  # all invested (reszta < minimalnej prowizji)
+            block_costs += bought["cost_pln"].sum()
+
+        invested = amounts * valued[i]
+        total = invested.sum() + cash
+        weights[date] = {tickers[j]: invested[j] / total for j in np.flatnonzero(amounts)}
+        block = i
+
+    yield emit(block, n)
+
+
+def simulate(prices, indicators=None, start=None, end=None, **params):
+    """
+    iter_simulation zebrane w całości (walk-forward: krótkie okna, metryki
+    na całej krzywej). Zwraca dict:
+      dates, equity, flow  – dzienne tablice numpy,
+      trades               – lista (ticker, buy_date, sell_date, pnl_pct),
+      weights              – {data rebalansu: {ticker: waga}},
+      costs                – suma kosztów transakcyjnych.
+    """
+    blocks = list(iter_simulation(prices, indicators, start=start, end=end, **params))
+    return {
+        "dates": pd.DatetimeIndex(np.concatenate([b["dates"] for b in blocks])) if blocks else pd.DatetimeIndex([]),
+        "equity": np.concatenate([b["equity"] for b in blocks]) if blocks else np.zeros(0),
+        "flow": np.concatenate([b["flow"] for b in blocks]) if blocks else np.zeros(0),
+        "trades": [t for b in blocks for t in b["trades"]],
+        "weights": {d: w for b in blocks for d, w in b["weights"].items()},
+        "costs": sum(b["costs"] for b in blocks),
+    }
+
+
 # =====================================================================
 # BACKTEST ENGINE (STABLE)
 # =====================================================================
 def run_backtest():
 
     print("\n=== BACKTEST: 2015 → 2025 ===\n")
+    os.makedirs("reports", exist_ok=True)
 
     tickers = load_universe()
     prices = download_price_history(tickers)
 
-    # EQUITY MODEL
-    cash = MONTHLY_CONTRIBUTION   # piewsza wpłata
-    positions = {}
-    trades = []
-    equity_curve = []
-
-    for date, row in prices.iterrows():
-
-        if row.isna().all():
-            continue
-
-        # --------------------------
-        # MONTHLY CONTRIBUTION
-        # --------------------------
-        if date.day == REBALANCE_DAY:
-            cash += MONTHLY_CONTRIBUTION
-
-            # Compute momentum
-            scores = compute_momentum_scores(prices.loc[:date])
-            selected = list(scores.head(TOP_N).index)
-
-            # ---------------------------------
-            # SELL positions outside TOP N
-            # ---------------------------------
-            for t, pos in list(positions.items()):
-                if t not in selected:
-                    buy_price = pos["buy_price"]
-                    sell_price = row[t]
-                    pnl = (sell_price - buy_price) / buy_price * 100
-
-                    trades.append([t, pos["buy_date"], date, pnl])
-                    cash += pos["amount"] * sell_price
-                    del positions[t]
-
-            # ---------------------------------
-            # BUY NEW POSITIONS
-            # ---------------------------------
-            if cash > 0:
-                allocation = cash / TOP_N
-
-                for t in selected:
-                    price = row[t]
-                    amount = allocation / price
-                    positions[t] = {
-                        "buy_date": date,
-                        "buy_price": price,
-                        "amount": amount
-                    }
-
-                cash = 0  # all invested
-
-        # --------------------------
-        # EQUITY CALCULATION
-        # --------------------------
-        portfolio_value = cash
-        for t, pos in positions.items():
-            portfolio_value += pos["amount"] * row[t]
-
-        equity_curve.append([date, portfolio_value])
+    # wyniki strumieniowo na dysk – blok po bloku rebalansu (stała pamięć, CSV opcjonalnie)
+    sink = ReportSink("reports", export_csv=EXPORT_CSV)
+    equity_curve = sink.table("backtest_equity", {"date": "date", "equity": "f8", "flow": "f8"})
+    trades = sink.table("backtest_trades", {"ticker": "str", "buy_date": "date", "sell_date": "date", "pnl_pct": "f8"})
+    rebalance_weights = {}
+    total_costs = 0.0
+    for block in iter_simulation(prices, costs=BROKER):
+        equity_curve.extend({"date": block["dates"], "equity": block["equity"], "flow": block["flow"]})
+        if block["trades"]:
+            trades.extend(pd.DataFrame(block["trades"], columns=list(trades.columns)))
+        rebalance_weights.update(block["weights"])
+        total_costs += block["costs"]
 
     # -----------------------------------------------------------------
     # SAVE RESULTS
     # -----------------------------------------------------------------
-    eq_df = pd.DataFrame(equity_curve, columns=["date", "equity"])
-    eq_df.to_csv("reports/backtest_equity.csv", index=False)
-
-    trades_df = pd.DataFrame(trades, columns=["ticker", "buy_date", "sell_date", "pnl_pct"])
-    trades_df.to_csv("reports/backtest_trades.csv", index=False)
+    sink.close()
+    eq_df = read_columnar(equity_curve.path)
+    trades_df = read_columnar(trades.path, columns=["pnl_pct"])
 
     # =================================================================
     # METRICS
@@ -134,24 +232,26 @@ def run_backtest():
     best_trade = trades_df["pnl_pct"].max() if num_trades else 0
     worst_trade = trades_df["pnl_pct"].min() if num_trades else 0
 
-    eq_vals = eq_df["equity"].values
-    max_running = np.maximum.accumulate(eq_vals)
-    dd = (eq_vals - max_running) / max_running * 100
-    max_dd = dd.min()
-
-    total_return = (eq_vals[-1] / eq_vals[0] - 1) * 100
+    weights_df = pd.DataFrame(list(rebalance_weights.values()), index=list(rebalance_weights)).fillna(0.0)
+    stats = summarize(
+        eq_df.set_index("date")[["equity"]],
+        flows=eq_df[["flow"]],
+        weights=weights_df.to_numpy() if not weights_df.empty else None,
+    )
+    stats.to_csv("reports/backtest_metrics.csv")
 
     print(f"Liczba transakcji:      {num_trades}")
     print(f"Win rate:               {win_rate:.2f}%")
     print(f"Średnie P&L:            {avg_pnl:.2f}%")
     print(f"Najlepsza transakcja:   {best_trade:.2f}%")
     print(f"Najgorsza transakcja:   {worst_trade:.2f}%")
-    print(f"Maksymalne DD:          {max_dd:.2f}%")
-    print(f"Całkowity zwrot:        {total_return:.2f}%")
+    print(format_summary(stats.iloc[0]))
+    print(f"Koszty transakcyjne:    {total_costs:,.2f} ({get_cost_model(BROKER).name})")
 
     print("\nPliki wygenerowane w /reports/:")
-    print(" - backtest_equity.csv")
-    print(" - backtest_trades.csv\n")
+    print(" - backtest_equity.cols" + (" / .csv" if EXPORT_CSV else ""))
+    print(" - backtest_trades.cols" + (" / .csv" if EXPORT_CSV else ""))
+    print(" - backtest_metrics.csv\n")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,475 @@
+# src/benchmark.py
+
+"""
+Benchmarki gorących ścieżek silnika na syntetycznych danych (offline).
+
+Mierzy:
+  - load_price_history (pierwsze wywołanie / kolejne),
+  - compute_top5_momentum, compute_regime,
+  - momentum_incremental (daily_state: ranking po jednym nowym słupku),
+  - estimate_total_equity, process_sell_signals,
+  - compute_scores (screener),
+  - backtest_simple.run_backtest, backtest_buffett_like.run_backtest,
+  - walk_forward (foldy train/test w puli procesów),
+  - monte_carlo (1 000 ścieżek bootstrapu + przesunięć rebalansu),
+
+dla rosnących rozmiarów uniwersum. Magazyn cen generowany jest raz
+(synthetic_data) dla największego rozmiaru, mniejsze rozmiary biorą
+prefiks listy tickerów. Całość działa w katalogu tymczasowym, więc
+nie dotyka data/ ani reports/ w repo: DATA_DIR, CALENDAR_DIR,
+INDICATOR_DIR i STATE_DIR wskazują na podkatalogi katalogu tymczasowego
+(bez wcześniej rozgrzanych cache), a podmienione atrybuty modułów
+(katalogi, loadery backtestów) są przywracane po przebiegu.
+
+Wynik: JSON z metadanymi środowiska + czasy (min / median / mean).
+
+Użycie:
+    python src/benchmark.py run --sizes 10 100 1000 --repeat 3
+    python src/benchmark.py compare base.json new.json --threshold 0.15
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_OUT_DIR = REPO_DIR / "reports" / "benchmarks"
+
+ALL_CASES = [
+    "load_price_history_first",
+    "load_price_history",
+    "compute_top5_momentum",
+    "momentum_incremental",
+    "compute_regime",
+    "estimate_total_equity",
+    "process_sell_signals",
+    "rebalance_orders",
+    "analytics_summary",
+    "compute_scores",
+    "backtest_simple",
+    "backtest_buffett_like",
+    "walk_forward",
+    "monte_carlo",
+]
+
+# Backtesty są wolne (pętle dzienne) – domyślnie nie puszczamy ich na 5 000 tickerów
+DEFAULT_MAX_SIZE = {
+    "backtest_simple": 1000,
+    "backtest_buffett_like": 500,
+    "walk_forward": 500,
+    "monte_carlo": 1000,
+}
+
+
+# -------------------------------------------------------------
+# Metadane środowiska
+# -------------------------------------------------------------
+def environment_metadata() -> dict:
+    import numpy as np
+    import pandas as pd
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=REPO_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        commit = None
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "hostname": platform.node(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+    }
+
+
+# -------------------------------------------------------------
+# Pomiar
+# -------------------------------------------------------------
+def _time_call(fn: Callable[[], object], repeat: int, quiet: bool = True) -> List[float]:
+    """Zwraca listę czasów [s] dla `repeat` wywołań (stdout wyciszony)."""
+    runs = []
+    for _ in range(repeat):
+        sink = io.StringIO() if quiet else sys.stdout
+        with contextlib.redirect_stdout(sink):
+            t0 = time.perf_counter()
+            fn()
+            runs.append(time.perf_counter() - t0)
+    return runs
+
+
+def _summary(case: str, size: int, runs: List[float]) -> dict:
+    return {
+        "case": case,
+        "size": size,
+        "runs": [round(r, 6) for r in runs],
+        "min": min(runs),
+        "median": statistics.median(runs),
+        "mean": statistics.fmean(runs),
+    }
+
+
+@contextlib.contextmanager
+def _patched(module, **attrs):
+    """Tymczasowo podmienia atrybuty modułu; oryginały wracają przy wyjściu."""
+    saved = {name: getattr(module, name) for name in attrs}
+    for name, value in attrs.items():
+        setattr(module, name, value)
+    try:
+        yield module
+    finally:
+        for name, value in saved.items():
+            setattr(module, name, value)
+
+
+@contextlib.contextmanager
+def _workdir(path: Path):
+    """Tymczasowo zmienia cwd (db.py i backtesty używają ścieżek względnych)."""
+    prev = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(prev)
+
+
+# -------------------------------------------------------------
+# Przygotowanie danych
+# -------------------------------------------------------------
+def _seed_positions(tickers: List[str], price_data: dict) -> None:
+    """Wstawia pozycje do tymczasowej bazy (po 10 szt. na ticker)."""
+    from db import get_connection
+
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM portfolio_positions")
+    cur.executemany(
+        """
+        INSERT INTO portfolio_positions (ticker, quantity, currency, avg_price_ccy, avg_price_pln)
+        VALUES (?, 10, 'USD', ?, ?)
+        """,
+        [
+            (t, float(price_data[t]["Close"].iloc[-1]), float(price_data[t]["Close"].iloc[-1]) * 4.0)
+            for t in tickers
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+
+@contextlib.contextmanager
+def _patch_backtests(store_dir: Path, universe: List[str], start: str, end: str):
+    """
+    Na czas bloku przepina backtesty na lokalny magazyn (bez Yahoo):
+      - load_universe -> syntetyczne tickery,
+      - backtest_simple.download_price_history -> panel Close z CSV,
+      - backtest_simple.START / END -> okres benchmarku,
+      - backtest_buffett_like.load_price_history -> czytanie bez pobierania.
+    """
+    import pandas as pd
+
+    import backtest_buffett_like
+    import backtest_simple
+    from data_loader import load_single_history
+
+    def _load(ticker, end=end, **_):
+        return load_single_history(ticker, start="1990-01-01", end=end, allow_download=False)
+
+    def _download(tickers):
+        closes = {t: _load(t)["Close"] for t in tickers}
+        df = pd.DataFrame(closes)
+        return df[(df.index >= backtest_simple.START) & (df.index <= backtest_simple.END)]
+
+    with _patched(backtest_simple, load_universe=lambda: list(universe), download_price_history=_download,
+                  START=start, END=end), \
+            _patched(backtest_buffett_like, load_universe=lambda: list(universe), load_price_history=_load):
+        yield
+
+
+# -------------------------------------------------------------
+# Suite
+# -------------------------------------------------------------
+def run_suite(
+    sizes: List[int],
+    repeat: int = 3,
+    years: int = 12,
+    cases: List[str] | None = None,
+    max_size: Dict[str, int] | None = None,
+    seed: int = 42,
+) -> dict:
+    import pandas as pd
+
+    cases = cases or ALL_CASES
+    limits = {**DEFAULT_MAX_SIZE, **(max_size or {})}
+    results = []
+
+    with tempfile.TemporaryDirectory(prefix="momentum_bench_") as tmp, contextlib.ExitStack() as patches:
+        tmp = Path(tmp)
+        store_dir = tmp / "prices"
+        (tmp / "data").mkdir()
+
+        import daily_state
+        import data_loader
+        import indicators
+        import synthetic_data
+        import trading_calendar
+
+        # absolutne katalogi cache (z __file__) – _workdir ich nie przekierowuje
+        patches.enter_context(_patched(data_loader, DATA_DIR=store_dir))
+        patches.enter_context(_patched(trading_calendar, CALENDAR_DIR=tmp / "calendars"))
+        patches.enter_context(_patched(indicators, INDICATOR_DIR=tmp / "indicators"))
+        patches.enter_context(_patched(daily_state, STATE_DIR=tmp / "state"))
+
+        print(f"[bench] Generuję magazyn: {max(sizes)} tickerów x {years} lat...")
+        manifest = synthetic_data.write_price_store(
+            out_dir=store_dir, n_tickers=max(sizes), years=years, seed=seed,
+        )
+        all_tickers = manifest["tickers"]
+        end = manifest["series"]["SPY"]["last_date"]
+        as_of = pd.Timestamp(end)
+
+        with _workdir(tmp):
+            import db
+            from analytics import summarize
+            from buffett_lynch_screener import compute_scores
+            from momentum import compute_top5_momentum
+            from portfolio import process_sell_signals
+            from portfolio_storage import estimate_total_equity, load_positions
+            from strategy_a import compute_regime
+            from trade_engine import build_rebalance_orders
+
+            db.init_db()
+            fx_row = pd.Series({"USD": 4.0, "EUR": 4.4, "PLN": 1.0})
+
+            for size in sorted(sizes):
+                universe = all_tickers[:size]
+                print(f"\n[bench] === rozmiar uniwersum: {size} ===")
+
+                def load():
+                    return data_loader.load_price_history(universe, as_of=as_of, allow_download=False)
+
+                runs = {}
+                # data_loader nie ma cache w procesie – pierwsze wywołanie różni się
+                # tylko rozgrzewką (page cache systemu, importy), to nie jest zimny start
+                if "load_price_history_first" in cases:
+                    runs["load_price_history_first"] = _time_call(load, 1)
+                price_data = load()
+                if "load_price_history" in cases:
+                    runs["load_price_history"] = _time_call(load, repeat)
+
+                if "compute_top5_momentum" in cases:
+                    runs["compute_top5_momentum"] = _time_call(
+                        lambda: compute_top5_momentum(price_data), repeat)
+
+                if "momentum_incremental" in cases:
+                    # stan z dnia poprzedniego, mierzymy dopisanie ostatniego słupka
+                    from daily_state import momentum_ranking
+                    state_dir = tmp / "state"
+                    momentum_ranking({t: df.iloc[:-1] for t, df in price_data.items()}, state_dir)
+                    snapshot = (state_dir / "momentum.npz").read_bytes()
+
+                    def incremental():
+                        (state_dir / "momentum.npz").write_bytes(snapshot)
+                        return momentum_ranking(price_data, state_dir)
+
+                    runs["momentum_incremental"] = _time_call(incremental, repeat)
+
+                if "compute_regime" in cases:
+                    spy = data_loader.load_price_history("SPY", as_of=as_of, allow_download=False)
+                    runs["compute_regime"] = _time_call(lambda: compute_regime(spy["Close"]), repeat)
+
+                held = universe[: max(5, size // 10)]
+                _seed_positions(held, price_data)
+
+                if "estimate_total_equity" in cases:
+                    runs["estimate_total_equity"] = _time_call(
+                        lambda: estimate_total_equity(price_data, fx_row), repeat)
+
+                if "process_sell_signals" in cases:
+                    held_data = {t: price_data[t] for t in held}
+                    runs["process_sell_signals"] = _time_call(
+                        lambda: process_sell_signals(
+                            today=end, regime_a="BULL", top5_tickers=held[:5],
+                            price_data=held_data, fx_row=fx_row,
+                        ),
+                        repeat,
+                    )
+
+                if "rebalance_orders" in cases:
+                    # pełne uniwersum jako target equal-weight vs trzymane pozycje (bez zapisu)
+                    alloc = pd.DataFrame({
+                        "ticker": universe,
+                        "currency": "USD",
+                        "target_value_ccy": 1_000_000 / len(universe),
+                    })
+                    positions = load_positions()
+                    runs["rebalance_orders"] = _time_call(
+                        lambda: build_rebalance_orders(positions, alloc, price_data, fx_row), repeat)
+
+                if "analytics_summary" in cases:
+                    # każdy ticker jako osobna "krzywa equity" – N krzywych naraz
+                    curves = pd.DataFrame({t: price_data[t]["Close"] for t in universe}).ffill().bfill()
+                    runs["analytics_summary"] = _time_call(lambda: summarize(curves), repeat)
+
+                if "compute_scores" in cases:
+                    raw = synthetic_data.generate_fundamentals(universe, seed=seed)
+                    raw["price_vol"] = pd.Series(
+                        {t: price_data[t]["Close"].pct_change().std() * 252 ** 0.5 for t in universe}
+                    )
+                    runs["compute_scores"] = _time_call(lambda: compute_scores(raw), repeat)
+
+                bt_cases = [c for c in ("backtest_simple", "backtest_buffett_like", "walk_forward",
+                                        "monte_carlo")
+                            if c in cases and size <= limits.get(c, size)]
+                if bt_cases:
+                    import backtest_buffett_like
+                    import backtest_simple
+
+                    start = (as_of - pd.DateOffset(years=years - 2)).strftime("%Y-%m-%d")
+                    with _patch_backtests(store_dir, universe, start, end):
+                        if "backtest_simple" in bt_cases:
+                            runs["backtest_simple"] = _time_call(backtest_simple.run_backtest, 1)
+                        if "backtest_buffett_like" in bt_cases:
+                            runs["backtest_buffett_like"] = _time_call(
+                                lambda: backtest_buffett_like.run_backtest(start_date=start, end_date=end), 1)
+                        if "walk_forward" in bt_cases:
+                            import walk_forward
+
+                            backtest_simple.START = "1990-01-01"   # pełna historia na rozgrzewkę ROC
+                            wf_prices = backtest_simple.download_price_history(universe)
+                            runs["walk_forward"] = _time_call(
+                                lambda: walk_forward.walk_forward(wf_prices, train_years=2, test_months=12), 1)
+                        if "monte_carlo" in bt_cases:
+                            import monte_carlo
+
+                            backtest_simple.START = "1990-01-01"
+                            mc_prices = backtest_simple.download_price_history(universe)
+                            runs["monte_carlo"] = _time_call(
+                                lambda: monte_carlo.run_monte_carlo(mc_prices, n_paths=1000), repeat)
+
+                for case, case_runs in runs.items():
+                    res = _summary(case, size, case_runs)
+                    results.append(res)
+                    print(f"[bench] {case:<26} n={size:<6} min={res['min']:.4f}s median={res['median']:.4f}s")
+
+    return {
+        "meta": environment_metadata(),
+        "params": {"sizes": sorted(sizes), "repeat": repeat, "years": years, "seed": seed},
+        "results": results,
+    }
+
+
+# -------------------------------------------------------------
+# Porównanie dwóch plików wyników
+# -------------------------------------------------------------
+def compare_results(base: dict, new: dict, threshold: float = 0.10, stat: str = "min") -> List[dict]:
+    """
+    Zwraca listę porównań (case, size) obecnych w obu plikach.
+    Regresja = new/base - 1 > threshold (np. 0.10 = 10% wolniej).
+    """
+    base_idx = {(r["case"], r["size"]): r for r in base["results"]}
+    rows = []
+    for r in new["results"]:
+        key = (r["case"], r["size"])
+        if key not in base_idx:
+            continue
+        b, n = base_idx[key][stat], r[stat]
+        change = n / b - 1.0 if b > 0 else 0.0
+        rows.append({
+            "case": r["case"],
+            "size": r["size"],
+            "base": b,
+            "new": n,
+            "change": change,
+            "regression": change > threshold,
+        })
+    return rows
+
+
+def _cmd_run(args) -> int:
+    res = run_suite(
+        sizes=args.sizes,
+        repeat=args.repeat,
+        years=args.years,
+        cases=args.cases,
+        seed=args.seed,
+    )
+    out = Path(args.out) if args.out else DEFAULT_OUT_DIR / f"bench_{datetime.now():%Y%m%d_%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(res, f, indent=2)
+    print(f"\n[bench] Zapisano wyniki → {out}")
+    return 0
+
+
+def _cmd_compare(args) -> int:
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+
+    rows = compare_results(base, new, threshold=args.threshold, stat=args.stat)
+    if not rows:
+        print("[bench] Brak wspólnych przypadków do porównania.")
+        return 0
+
+    print(f"{'case':<26} {'size':>6} {'base[s]':>10} {'new[s]':>10} {'zmiana':>8}")
+    for r in rows:
+        flag = "  <-- REGRESJA" if r["regression"] else ""
+        print(f"{r['case']:<26} {r['size']:>6} {r['base']:>10.4f} {r['new']:>10.4f} {r['change']:>+8.1%}{flag}")
+
+    n_reg = sum(r["regression"] for r in rows)
+    if n_reg:
+        print(f"\n[bench] {n_reg} regresji powyżej progu {args.threshold:.0%}.")
+        return 1
+    print(f"\n[bench] Brak regresji powyżej progu {args.threshold:.0%}.")
+    return 0
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Benchmarki silnika momentum (dane syntetyczne).")
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    r = sub.add_parser("run", help="uruchom benchmarki i zapisz JSON")
+    r.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    r.add_argument("--repeat", type=int, default=3)
+    r.add_argument("--years", type=int, default=12)
+    r.add_argument("--seed", type=int, default=42)
+    r.add_argument("--cases", nargs="+", choices=ALL_CASES, default=None)
+    r.add_argument("--out", default=None, help="plik wynikowy (domyślnie reports/benchmarks/bench_<ts>.json)")
+    r.set_defaults(func=_cmd_run)
+
+    c = sub.add_parser("compare", help="porównaj dwa pliki wyników")
+    c.add_argument("base")
+    c.add_argument("new")
+    c.add_argument("--threshold", type=float, default=0.10, help="próg regresji (0.10 = +10%%)")
+    c.add_argument("--stat", choices=["min", "median", "mean"], default="min")
+    c.set_defaults(func=_cmd_compare)
+
+    args = p.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,7 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 from buffett_lynch_portfolio import build_portfolio
+from indicators import realized_volatility, sma
 from universe_dynamic import load_universe_for_date, BASE_UNIVERSE
 from datetime import datetime
 
@@ -106,18 +107,9 @@ def fetch_price_volatility(tickers, window_days=252):
     )
 
     close = data["Close"] if "Close" in data.columns else data
-    vols = {}
 
-    for t in tickers:
-        if t not in close.columns:
-            vols[t] = np.nan
-            continue
-        s = close[t].dropna()
-        if len(s) < 30:
-            vols[t] = np.nan
-            continue
-        rets = np.log(s).diff().dropna()
-        vols[t] = rets.std() * np.sqrt(252)
+    # wszystkie tickery naraz; brakujące kolumny → NaN, < 30 notowań → NaN
+    vols = realized_volatility(close.reindex(columns=list(tickers)), min_obs=30)
 
     return pd.DataFrame({"price_vol": vols})
 
@@ -196,7 +188,7 @@ def get_market_regime():
         return "BULL"
 
     close = spy["Close"]
-    sma200 = close.rolling(200).mean()
+    sma200 = sma(close, 200)
 
     if close.iloc[-1] >= sma200.iloc[-1]:
         return "BULL"
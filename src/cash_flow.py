@@ -5,7 +5,7 @@ from typing import Literal
 
 import pandas as pd
 
-from db import get_connection
+from db import get_connection, invalidate_snapshots
 
 
 FlowType = Literal["DEPOSIT", "WITHDRAW"]
@@ -25,6 +25,7 @@ def add_cash_flow(dt: date, amount_pln: float, flow_type: FlowType, note: str =
         """,
         (dt.isoformat(), float(amount_pln), flow_type, note),
     )
+    invalidate_snapshots(conn, dt.isoformat()[:10])
     conn.commit()
     conn.close()
 
@@ -0,0 +1,272 @@
+# src/cli.py
+
+"""
+Jeden punkt wejścia dla skryptów projektu:
+
+    python src/cli.py run [--portfolios src/config/portfolios.json] [--workers 4]
+    python src/cli.py backtest [--strategy simple|buffett] [--broker xtb]
+    python src/cli.py screen [--top-n 15]
+    python src/cli.py build-universe [--start-year 2000]
+    python src/cli.py check-data [--repair]           # integralność magazynu cen
+    python src/cli.py pack [--codec delta --compress]  # kompaktowy panel cen (compact_store)
+    python src/cli.py serve-panel [--panel FILE]      # panel w shared_memory dla równoległych zadań
+    python src/cli.py report [--portfolios ...]       # status ksiąg + ostatni przebieg
+    python src/cli.py startup [--repeat 5]            # pomiar czasu startu vs budżet
+
+Moduły silnika (pandas, numpy, yfinance, pandas_market_calendars) są
+importowane dopiero w handlerze wybranej komendy – `--help` i `report`
+ładują tylko bibliotekę standardową (+ sqlite), więc startują w
+dziesiątkach milisekund zamiast ~1 s. Dlatego na górze tego pliku NIE
+wolno importować modułów projektu ciągnących pandas; pilnuje tego
+`startup` (budżety w STARTUP_BUDGET_S).
+
+Stare wywołania (`python src/main.py`, `python src/backtest_simple.py` …)
+działają bez zmian.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+import traceback
+from pathlib import Path
+
+# budżet czasu startu [s] (min z kilku uruchomień, łącznie ze startem interpretera)
+STARTUP_BUDGET_S = {
+    "--help": 0.15,
+    "report": 0.20,
+}
+
+
+# -------------------------------------------------------------
+# Komendy
+# -------------------------------------------------------------
+def _cmd_run(args) -> int:
+    from main import main
+
+    try:
+        main(profile=args.profile, trace_memory=args.trace_memory, max_workers=args.workers,
+             portfolios_config=args.portfolios)
+    except Exception:
+        print("\n[ERROR] Wystąpił błąd w engine:")
+        print(traceback.format_exc())
+        return 1
+    return 0
+
+
+def _cmd_backtest(args) -> int:
+    if args.strategy == "buffett":
+        from backtest_buffett_like import run_backtest
+
+        run_backtest(costs=args.broker)
+        return 0
+
+    import backtest_simple
+
+    if args.broker is not None:
+        backtest_simple.BROKER = args.broker
+    backtest_simple.run_backtest()
+    return 0
+
+
+def _cmd_screen(args) -> int:
+    from buffett_lynch_screener import run_screener
+
+    run_screener(top_n=args.top_n)
+    return 0
+
+
+def _cmd_build_universe(args) -> int:
+    from universe_dynamic import build_top100_universe
+
+    build_top100_universe(start_year=args.start_year, end_year=args.end_year)
+    return 0
+
+
+def _cmd_check_data(args) -> int:
+    from price_integrity import format_issues, refetch_list, repair, scan_store
+
+    issues = scan_store(args.tickers, force=args.force)
+    print(format_issues(issues))
+    todo = refetch_list(issues)
+    print(f"\n[INTEGRITY] Do ponownego pobrania: {len(todo)} tickerów")
+    if args.repair and todo:
+        repaired = repair(todo)
+        print(f"[INTEGRITY] Naprawione: {len(repaired)}/{len(todo)}")
+    return 0
+
+
+def _cmd_pack(args) -> int:
+    from compact_store import DEFAULT_PANEL, build_panel, verify
+
+    panel = build_panel(args.tickers, fields=args.fields)
+    out = panel.save(args.out or DEFAULT_PANEL, codec=args.codec, compress=args.compress)
+    print(f"[PANEL] {panel!r} → {out} ({out.stat().st_size / 2**20:.1f} MB)")
+    if args.verify:
+        report = verify(panel)
+        print(report.to_string(index=False))
+        return int(report["mismatches"].sum() > 0)
+    return 0
+
+
+def _cmd_serve_panel(args) -> int:
+    from compact_store import CompactPanel, build_panel
+    from panel_server import PanelServer
+
+    panel = CompactPanel.load(args.panel) if args.panel else build_panel()
+    PanelServer(panel, reserve_rows=args.reserve_rows).serve()
+    return 0
+
+
+def _print_ledger(name: str, path: Path) -> None:
+    import db
+
+    with db.use_database(path):
+        status = db.ledger_status()
+    print(f"[{name}] {path}")
+    if status is None:
+        print("  brak księgi (silnik jeszcze nie był uruchomiony)")
+        return
+    positions = status["positions"]
+    print(f"  pozycje:    {len(positions)} {' '.join(positions)}")
+    print(f"  transakcje: {status['transactions']} (ostatnia: {status['last_transaction'] or '-'})")
+    print(f"  wpłaty:     {status['contributed_pln']:,.2f} PLN")
+    if status["equity_pln"] is not None:
+        print(f"  equity:     {status['equity_pln']:,.2f} PLN ({status['equity_date']})")
+
+
+def _cmd_report(args) -> int:
+    import db
+    from instrumentation import REPORTS_DIR, format_summary
+
+    print("=== STATUS ===\n")
+    if args.portfolios:
+        # portfolio_config → costs → numpy; walidacja pliku jest tego warta
+        from portfolio_config import load_portfolios
+
+        for spec in load_portfolios(args.portfolios):
+            _print_ledger(spec.name, spec.db)
+    else:
+        _print_ledger("main", db.DB_PATH)
+
+    path = Path(args.run_report) if args.run_report else None
+    if path is None:
+        reports = sorted(REPORTS_DIR.glob("engine_*.json"))
+        path = reports[-1] if reports else None
+    print()
+    if path is None:
+        print(f"[report] Brak raportów przebiegu w {REPORTS_DIR}")
+        return 0
+    with open(path, encoding="utf-8") as f:
+        report = json.load(f)
+    print(f"Ostatni przebieg: {path.name} ({report.get('started', '?')})")
+    print(format_summary(report))
+    return 0
+
+
+# -------------------------------------------------------------
+# Budżet startu
+# -------------------------------------------------------------
+def _best_time(cmd: list[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def measure_startup(argv: list[str], repeat: int = 5) -> float:
+    """Najkrótszy czas [s] `python src/cli.py <argv>` w osobnym procesie (z interpreterem)."""
+    return _best_time([sys.executable, str(Path(__file__).resolve()), *argv], repeat)
+
+
+def _cmd_startup(args) -> int:
+    interpreter = _best_time([sys.executable, "-c", "pass"], args.repeat)
+
+    print(f"{'komenda':<12} {'czas[s]':>9} {'budżet[s]':>10}")
+    print(f"{'(python)':<12} {interpreter:>9.3f} {'':>10}")
+    over = 0
+    for command, budget in STARTUP_BUDGET_S.items():
+        t = measure_startup([command], repeat=args.repeat)
+        flag = "" if t <= budget else "  <-- PONAD BUDŻET"
+        over += t > budget
+        print(f"{command:<12} {t:>9.3f} {budget:>10.2f}{flag}")
+
+    if over:
+        print(f"\n[startup] {over} komend ponad budżet – sprawdź importy na poziomie modułu.")
+        return 1
+    print("\n[startup] OK – wszystkie komendy w budżecie.")
+    return 0
+
+
+# -------------------------------------------------------------
+# CLI
+# -------------------------------------------------------------
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="cli.py", description="Momentum Portfolio – wspólne CLI")
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    r = sub.add_parser("run", help="dzienny przebieg silnika (main.py)")
+    r.add_argument("--profile", action="store_true", help="cProfile całego przebiegu")
+    r.add_argument("--trace-memory", action="store_true", help="tracemalloc: szczytowa pamięć per etap")
+    r.add_argument("--workers", type=int, default=4, help="liczba równoległych etapów (1 = sekwencyjnie)")
+    r.add_argument("--portfolios", default=None, help="plik JSON z wieloma portfelami")
+    r.set_defaults(func=_cmd_run)
+
+    b = sub.add_parser("backtest", help="backtest strategii")
+    b.add_argument("--strategy", choices=["simple", "buffett"], default="simple",
+                   help="simple = backtest_simple (momentum), buffett = backtest_buffett_like")
+    b.add_argument("--broker", default=None, help="model kosztów z costs.BROKERS (np. xtb, ibkr)")
+    b.set_defaults(func=_cmd_backtest)
+
+    s = sub.add_parser("screen", help="screener Buffett/Lynch")
+    s.add_argument("--top-n", type=int, default=15)
+    s.set_defaults(func=_cmd_screen)
+
+    u = sub.add_parser("build-universe", help="dynamiczne TOP100 po latach (universe_dynamic)")
+    u.add_argument("--start-year", type=int, default=2000)
+    u.add_argument("--end-year", type=int, default=None)
+    u.set_defaults(func=_cmd_build_universe)
+
+    chk = sub.add_parser("check-data", help="luki, zera, błędne ticki w magazynie cen (price_integrity)")
+    chk.add_argument("--tickers", nargs="+", default=None, help="domyślnie wszystkie CSV z magazynu")
+    chk.add_argument("--force", action="store_true", help="ignoruj cache sum kontrolnych")
+    chk.add_argument("--repair", action="store_true", help="pobierz ponownie tickery z listy refetch")
+    chk.set_defaults(func=_cmd_check_data)
+
+    pk = sub.add_parser("pack", help="magazyn CSV -> kompaktowy panel float32 (compact_store)")
+    pk.add_argument("--tickers", nargs="+", default=None, help="domyślnie wszystkie CSV z magazynu")
+    pk.add_argument("--fields", nargs="+", default=["Open", "High", "Low", "Close", "Adj Close"])
+    pk.add_argument("--codec", choices=["raw", "delta"], default="raw")
+    pk.add_argument("--compress", action="store_true")
+    pk.add_argument("--out", default=None, help="domyślnie data/panels/prices.npz")
+    pk.add_argument("--verify", action="store_true", help="porównaj panel z CSV (gwarancja precyzji)")
+    pk.set_defaults(func=_cmd_pack)
+
+    sp = sub.add_parser("serve-panel", help="serwer panelu cen w shared_memory (panel_server)")
+    sp.add_argument("--panel", default=None, help="plik compact_store (.npz); domyślnie cały magazyn CSV")
+    sp.add_argument("--reserve-rows", type=int, default=64, help="wolne wiersze na nowe słupki")
+    sp.set_defaults(func=_cmd_serve_panel)
+
+    rep = sub.add_parser("report", help="status ksiąg i podsumowanie ostatniego przebiegu")
+    rep.add_argument("--portfolios", default=None, help="plik JSON z wieloma portfelami")
+    rep.add_argument("--run-report", default=None, help="raport JSON przebiegu (domyślnie najnowszy engine_*.json)")
+    rep.set_defaults(func=_cmd_report)
+
+    st = sub.add_parser("startup", help="zmierz czas startu --help / report względem budżetu")
+    st.add_argument("--repeat", type=int, default=5)
+    st.set_defaults(func=_cmd_startup)
+    return p
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,425 @@
+# src/compact_store.py
+
+"""
+Kompaktowy panel cen dla długich historii (wiele tysięcy tickerów x dekady).
+
+Magazyn CSV (data_loader) trzyma każdy ticker osobno, a po wczytaniu
+każda ramka ma pięć kolumn cen i Volume w float64, własny DatetimeIndex
+i powtórzoną w każdym wierszu kolumnę Ticker – panel 5000 tickerów
+x 25 lat to ~2 GB samych danych plus narzut pandas. CompactPanel trzyma
+to samo w tablicach numpy:
+
+    dates   [T]          datetime64[D] – jedna oś dat dla całego panelu
+    tickers [K]          nazwy – raz na panel
+    prices  [F x T x K]  float32 (Open, High, Low, Close, Adj Close; NaN = brak)
+    volume  [T x K]      najwęższy uint (uint32, gdy się mieści; inaczej uint64),
+                         brak = maksimum typu
+    present [T x K]      bool – ticker miał w tym dniu wiersz w CSV
+
+5000 x 25 lat (~6300 sesji): ceny 630 MB + wolumen 126 MB + maska 32 MB
+≈ 0.8 GB; z fields=("Close", "Adj Close") ≈ 0.4 GB.
+
+Gwarancja precyzji (float32, 24 bity mantysy, zaokrąglenie do najbliższej):
+  - błąd względny każdej ceny <= 2^-24 ≈ 6.0e-8 (PRICE_REL_TOL),
+  - ceny < 83 886 (= 0.005 * 2^24) po zaokrągleniu do 2 miejsc dają
+    dokładnie wartość z CSV notowanego w centach,
+  - iloraz / zwrot dwóch cen: błąd względny <= 2^-23 ≈ 1.2e-7, log-zwrot:
+    błąd bezwzględny <= 1.2e-7 – o rzędy wielkości poniżej progów
+    strategii (ROC, SMA200, stop-lossy w procentach),
+  - wolumen, daty i maska obecności – bez strat.
+Obliczenia robimy na float64: close_panel() / frame() poszerzają wartości
+(dokładnie), float32 jest tylko formatem przechowywania. verify()
+sprawdza gwarancję na żywych CSV.
+
+Zapis do jednego pliku .npz (save / load). codec="delta" jest bezstratny:
+ceny to XOR wzorców bitowych z poprzednią sesją (kolejne notowania dzielą
+znak, wykładnik i starsze bity mantysy), Adj Close najpierw XOR z Close
+tego samego dnia (bez dywidend to same zera), a tablice zapisujemy
+płaszczyznami bajtów per ticker. Z compress=True (zlib) plik cen jest
+o ~40% mniejszy niż sam zlib na float32 (zmierzone na magazynie
+syntetycznym – losowe błądzenie, więc to raczej dolna granica).
+
+    panel = build_panel()                              # cały magazyn CSV
+    panel.save(DEFAULT_PANEL, codec="delta", compress=True)
+    panel = CompactPanel.load(DEFAULT_PANEL)
+    prices = panel.close_panel("Adj Close")            # [data x ticker] float64
+    df = panel.frame("AAPL")                           # jak load_single_history
+    python src/compact_store.py --codec delta --compress --verify
+    python src/compact_store.py --info data/panels/prices.npz
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import zipfile
+from pathlib import Path
+from typing import Dict, Iterable, Sequence
+
+import numpy as np
+import pandas as pd
+
+import data_loader
+from instrumentation import count
+
+PANEL_DIR = Path(__file__).resolve().parent.parent / "data" / "panels"
+DEFAULT_PANEL = PANEL_DIR / "prices.npz"
+
+PRICE_FIELDS = ("Open", "High", "Low", "Close", "Adj Close")
+CODECS = ("raw", "delta")
+FORMAT_VERSION = 1
+
+PRICE_REL_TOL = 2.0 ** -24      # maks. błąd względny ceny po zapisie w float32
+
+
+def _volume_dtype(max_volume: float) -> np.dtype:
+    """Najwęższy uint mieszczący wolumen (maksimum typu = brak danych)."""
+    return np.dtype(np.uint32 if max_volume < np.iinfo(np.uint32).max else np.uint64)
+
+
+def _volume_missing(dtype) -> int:
+    return int(np.iinfo(dtype).max)
+
+
+# -------------------------------------------------------------
+# Kodowanie delta (bezstratne)
+# -------------------------------------------------------------
+def _shuffle(a: np.ndarray) -> np.ndarray:
+    """[..., T] -> płaszczyzny bajtów [nbytes, ..., T] (wolnozmienne bajty obok siebie)."""
+    a = np.ascontiguousarray(a)
+    return np.ascontiguousarray(np.moveaxis(a.view(np.uint8).reshape(a.shape + (a.itemsize,)), -1, 0))
+
+
+def _unshuffle(planes: np.ndarray, dtype) -> np.ndarray:
+    return np.ascontiguousarray(np.moveaxis(planes, 0, -1)).view(dtype)[..., 0]
+
+
+def _encode_field(bits: np.ndarray, base: np.ndarray | None = None) -> np.ndarray:
+    """
+    Jedna kolumna cen [T x K] (wzorce bitowe uint32): opcjonalnie XOR z `base`
+    (Adj Close vs Close – zwykle identyczne -> zera), potem XOR z poprzednią
+    sesją; zapis per ticker [K x T] płaszczyznami bajtów.
+    """
+    enc = bits ^ base if base is not None else bits.copy()
+    enc[1:] ^= bits[:-1] if base is None else (bits[:-1] ^ base[:-1])
+    return _shuffle(enc.T)
+
+
+def _decode_field(planes: np.ndarray) -> np.ndarray:
+    return np.bitwise_xor.accumulate(_unshuffle(planes, np.uint32), axis=1).T
+
+
+# -------------------------------------------------------------
+# Panel
+# -------------------------------------------------------------
+class CompactPanel:
+    """
+    Panel OHLC + Adj Close (float32) i Volume (uint) na wspólnej osi dat.
+    Tablice są tylko do odczytu – panel zmieniamy, budując nowy.
+    """
+
+    def __init__(
+        self,
+        dates: np.ndarray,
+        tickers: Sequence[str],
+        fields: Sequence[str],
+        prices: np.ndarray,
+        volume: np.ndarray | None,
+        present: np.ndarray,
+    ):
+        self.dates = np.asarray(dates, dtype="datetime64[D]")
+        self.tickers = list(tickers)
+        self.fields = tuple(fields)
+        self.prices = prices
+        self.volume = volume
+        self.present = present
+        self._pos = {t: j for j, t in enumerate(self.tickers)}
+        for a in (self.dates, prices, volume, present):
+            if a is not None:
+                a.flags.writeable = False
+
+    def __repr__(self) -> str:
+        span = f"{self.dates[0]} → {self.dates[-1]}" if len(self.dates) else "pusty"
+        return (f"CompactPanel({len(self.tickers)} tickerów x {len(self.dates)} dat, {span}, "
+                f"{'/'.join(self.fields)}{' + Volume' if self.volume is not None else ''}, "
+                f"{self.nbytes / 2**20:.1f} MB)")
+
+    def __contains__(self, ticker: str) -> bool:
+        return ticker in self._pos
+
+    def __len__(self) -> int:
+        return len(self.tickers)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.dates, self.prices, self.volume, self.present) if a is not None)
+
+    # ---------------------------------------------------------
+    # Budowa
+    # ---------------------------------------------------------
+    @classmethod
+    def from_frames(
+        cls,
+        frames: Dict[str, pd.DataFrame],
+        fields: Sequence[str] = PRICE_FIELDS,
+        volume: bool = True,
+    ) -> "CompactPanel":
+        """{ticker: DataFrame jak z data_loader} -> panel (brak kolumny = NaN)."""
+        fields = tuple(fields)
+        tickers = [t for t, df in frames.items() if df is not None]
+        days = [frames[t].index.to_numpy().astype("datetime64[D]") for t in tickers]
+        grid = np.unique(np.concatenate(days)) if days else np.array([], dtype="datetime64[D]")
+
+        shape = (len(grid), len(tickers))
+        prices = np.full((len(fields),) + shape, np.nan, dtype=np.float32)
+        present = np.zeros(shape, dtype=bool)
+        vols = [frames[t]["Volume"].to_numpy(dtype=float) if volume and "Volume" in frames[t] else None
+                for t in tickers]
+        finite = [np.nanmax(v) for v in vols if v is not None and np.isfinite(v).any()]
+        vdtype = _volume_dtype(max(finite, default=0.0))
+        vol = np.full(shape, _volume_missing(vdtype), dtype=vdtype) if volume else None
+
+        for j, (t, d) in enumerate(zip(tickers, days)):
+            df = frames[t]
+            rows = np.searchsorted(grid, d)
+            present[rows, j] = True
+            for i, f in enumerate(fields):
+                if f in df:
+                    prices[i, rows, j] = df[f].to_numpy(dtype=np.float32)
+            v = vols[j]
+            if v is not None:
+                ok = np.isfinite(v)
+                vol[rows[ok], j] = np.rint(v[ok]).astype(vdtype)
+
+        count("compact_panel.build")
+        return cls(grid, tickers, fields, prices, vol, present)
+
+    # ---------------------------------------------------------
+    # Odczyt
+    # ---------------------------------------------------------
+    def field(self, name: str) -> np.ndarray:
+        """Widok [T x K] float32 jednej kolumny cen (bez kopii)."""
+        try:
+            return self.prices[self.fields.index(name)]
+        except ValueError:
+            raise KeyError(f"Panel nie ma kolumny {name!r}. Dostępne: {self.fields}") from None
+
+    def _rows(self, start=None, end=None) -> slice:
+        lo = np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start), "D")) if start is not None else 0
+        hi = (np.searchsorted(self.dates, np.datetime64(pd.Timestamp(end), "D"), side="right")
+              if end is not None else len(self.dates))
+        return slice(lo, hi)
+
+    def close_panel(
+        self,
+        field: str = "Close",
+        tickers: Iterable[str] | None = None,
+        start=None,
+        end=None,
+        dtype=np.float64,
+    ) -> pd.DataFrame:
+        """Panel [data x ticker] kolumny `field` (jak indicators.close_panel, bez ffill)."""
+        rows = self._rows(start, end)
+        cols = list(tickers) if tickers is not None else self.tickers
+        idx = [self._pos[t] for t in cols]
+        values = self.field(field)[rows][:, idx].astype(dtype)
+        return pd.DataFrame(values, index=pd.DatetimeIndex(self.dates[rows], name="Date"), columns=cols)
+
+    def frame(self, ticker: str, start=None, end=None) -> pd.DataFrame:
+        """Ramka jednego tickera – kształt jak data_loader.load_single_history (float64)."""
+        j = self._pos[ticker]
+        rows = self._rows(start, end)
+        mask = self.present[rows, j]
+        data = {f: self.prices[i, rows, j][mask].astype(np.float64) for i, f in enumerate(self.fields)}
+        if self.volume is not None:
+            v = self.volume[rows, j][mask]
+            data["Volume"] = np.where(v == _volume_missing(v.dtype), np.nan, v.astype(np.float64))
+        df = pd.DataFrame(data, index=pd.DatetimeIndex(self.dates[rows][mask], name="Date"))
+        df["Ticker"] = ticker
+        return df
+
+    def frames(self, tickers: Iterable[str] | None = None, start=None, end=None) -> Dict[str, pd.DataFrame]:
+        return {t: self.frame(t, start, end) for t in (tickers if tickers is not None else self.tickers)}
+
+    # ---------------------------------------------------------
+    # Zapis / odczyt
+    # ---------------------------------------------------------
+    def save(self, path: str | Path = DEFAULT_PANEL, codec: str = "raw", compress: bool = False) -> Path:
+        """Zapis .npz (atomowo). codec="delta" + compress=True = najmniejszy plik."""
+        if codec not in CODECS:
+            raise ValueError(f"Nieznany codec {codec!r}. Dostępne: {CODECS}")
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        fields = self.fields
+        base = fields.index("Close") if "Close" in fields and "Adj Close" in fields else None
+        bits = self.prices.view(np.uint32)
+
+        def arrays():
+            # generator – przy codec="delta" w pamięci jest naraz tylko jedna zakodowana kolumna
+            yield "version", np.array(FORMAT_VERSION)
+            yield "codec", np.array(codec)
+            yield "dates", self.dates.astype(np.int32)  # dni od 1970-01-01
+            yield "tickers", np.array(self.tickers, dtype=str)
+            yield "fields", np.array(fields, dtype=str)
+            for i, f in enumerate(fields):
+                if codec == "raw":
+                    yield f"price_{i}", self.prices[i]
+                else:
+                    yield f"price_{i}", _encode_field(bits[i], bits[base] if f == "Adj Close" and base is not None else None)
+            if self.volume is not None:
+                yield "volume", self.volume if codec == "raw" else _shuffle(self.volume.T)
+                yield "volume_dtype", np.array(str(self.volume.dtype))
+            yield "present", np.packbits(self.present, axis=None)
+
+        tmp = path.with_name(path.name + ".tmp")
+        with zipfile.ZipFile(tmp, "w", zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED) as zf:
+            for name, a in arrays():
+                with zf.open(f"{name}.npy", "w", force_zip64=True) as f:
+                    np.lib.format.write_array(f, np.asanyarray(a), allow_pickle=False)
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path: str | Path = DEFAULT_PANEL) -> "CompactPanel":
+        with np.load(Path(path), allow_pickle=False) as z:
+            version = int(z["version"])
+            if version != FORMAT_VERSION:
+                raise ValueError(f"{path}: wersja formatu {version}, obsługiwana {FORMAT_VERSION}")
+            dates = z["dates"].astype("datetime64[D]")
+            tickers = z["tickers"].tolist()
+            fields = tuple(z["fields"].tolist())
+            delta = str(z["codec"]) == "delta"
+
+            prices = np.empty((len(fields), len(dates), len(tickers)), dtype=np.float32)
+            bits = prices.view(np.uint32)
+            for i in range(len(fields)):
+                bits[i] = _decode_field(z[f"price_{i}"]) if delta else z[f"price_{i}"].view(np.uint32)
+            if delta and "Close" in fields and "Adj Close" in fields:
+                bits[fields.index("Adj Close")] ^= bits[fields.index("Close")]
+
+            volume = None
+            if "volume" in z:
+                volume = z["volume"]
+                if delta:
+                    volume = np.ascontiguousarray(_unshuffle(volume, np.dtype(str(z["volume_dtype"]))).T)
+            shape = (len(dates), len(tickers))
+            present = np.unpackbits(z["present"], count=shape[0] * shape[1]).astype(bool).reshape(shape)
+            count("compact_panel.load")
+            return cls(dates, tickers, fields, prices, volume, present)
+
+
+# -------------------------------------------------------------
+# Magazyn CSV -> panel
+# -------------------------------------------------------------
+def _read_csv(path: Path, fields: Sequence[str], volume: bool) -> pd.DataFrame:
+    """Tylko potrzebne kolumny; ceny od razu jako float32."""
+    wanted = set(fields) | ({"Volume"} if volume else set())
+    return pd.read_csv(
+        path,
+        usecols=lambda c: c == "Date" or c in wanted,
+        dtype={f: np.float32 for f in fields},
+        parse_dates=["Date"],
+        date_format="%Y-%m-%d",
+        index_col="Date",
+    ).sort_index()
+
+
+def build_panel(
+    tickers: Iterable[str] | None = None,
+    store_dir: str | Path | None = None,
+    fields: Sequence[str] = PRICE_FIELDS,
+    volume: bool = True,
+) -> CompactPanel:
+    """Czyta CSV z magazynu (domyślnie data_loader.DATA_DIR) i buduje panel."""
+    store_dir = Path(store_dir or data_loader.DATA_DIR)
+    if tickers is None:
+        tickers = sorted(p.stem for p in store_dir.glob("*.csv"))
+    frames = {}
+    for t in tickers:
+        path = store_dir / f"{t}.csv"
+        if path.exists():
+            frames[t] = _read_csv(path, fields, volume)
+        else:
+            print(f"[PANEL] Brak {path.name} – pomijam.")
+    return CompactPanel.from_frames(frames, fields=fields, volume=volume)
+
+
+def load_or_build(
+    path: str | Path = DEFAULT_PANEL,
+    store_dir: str | Path | None = None,
+    codec: str = "delta",
+    compress: bool = True,
+) -> CompactPanel:
+    """Panel z pliku, a gdy któryś CSV magazynu jest nowszy – przebudowa i zapis."""
+    path = Path(path)
+    store_dir = Path(store_dir or data_loader.DATA_DIR)
+    newest = max((p.stat().st_mtime for p in store_dir.glob("*.csv")), default=0.0)
+    if path.exists() and path.stat().st_mtime >= newest:
+        return CompactPanel.load(path)
+    print(f"[PANEL] Przebudowa {path.name} z {store_dir}...")
+    panel = build_panel(store_dir=store_dir)
+    panel.save(path, codec=codec, compress=compress)
+    return panel
+
+
+def verify(panel: CompactPanel, store_dir: str | Path | None = None) -> pd.DataFrame:
+    """
+    Porównuje panel z CSV (float64): maks. błąd względny cen per kolumna
+    i liczba różnic wolumenu / obecności wierszy. Gwarancja: rel <= PRICE_REL_TOL.
+    """
+    store_dir = Path(store_dir or data_loader.DATA_DIR)
+    worst = {f: 0.0 for f in panel.fields}
+    volume_diff = rows_diff = 0
+    for t in panel.tickers:
+        src = pd.read_csv(store_dir / f"{t}.csv", parse_dates=["Date"], index_col="Date").sort_index()
+        got = panel.frame(t)
+        if not got.index.equals(src.index):
+            rows_diff += 1
+            continue
+        for f in panel.fields:
+            if f in src:
+                a, b = src[f].to_numpy(dtype=float), got[f].to_numpy()
+                ok = np.isfinite(a) & (a != 0)
+                if ok.any():
+                    worst[f] = max(worst[f], float(np.max(np.abs(b[ok] / a[ok] - 1.0))))
+        if panel.volume is not None and "Volume" in src:
+            volume_diff += int((~np.isclose(src["Volume"].to_numpy(dtype=float), got["Volume"].to_numpy(),
+                                            rtol=0, atol=0.5, equal_nan=True)).sum())
+    return pd.DataFrame({
+        "field": list(worst) + ["Volume", "rows"],
+        "max_rel_error": list(worst.values()) + [np.nan, np.nan],
+        "mismatches": [int(v > PRICE_REL_TOL) for v in worst.values()] + [volume_diff, rows_diff],
+    })
+
+
+# -------------------------------------------------------------
+# CLI
+# -------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Kompaktowy panel cen (float32 + uint, jedna oś dat)")
+    parser.add_argument("--tickers", nargs="+", default=None, help="domyślnie wszystkie CSV z magazynu")
+    parser.add_argument("--fields", nargs="+", default=list(PRICE_FIELDS), help="kolumny cen w panelu")
+    parser.add_argument("--no-volume", action="store_true")
+    parser.add_argument("--codec", choices=CODECS, default="raw")
+    parser.add_argument("--compress", action="store_true", help="zlib (np.savez_compressed)")
+    parser.add_argument("--out", default=str(DEFAULT_PANEL))
+    parser.add_argument("--verify", action="store_true", help="porównaj zapisany panel z CSV")
+    parser.add_argument("--info", metavar="PLIK", default=None, help="tylko opis istniejącego panelu")
+    args = parser.parse_args()
+
+    if args.info:
+        print(f"[PANEL] {CompactPanel.load(args.info)!r}, plik {Path(args.info).stat().st_size / 2**20:.1f} MB")
+        raise SystemExit(0)
+
+    panel = build_panel(args.tickers, fields=args.fields, volume=not args.no_volume)
+    out = panel.save(args.out, codec=args.codec, compress=args.compress)
+    print(f"[PANEL] {panel!r}")
+    print(f"[PANEL] Zapisano {out} ({out.stat().st_size / 2**20:.1f} MB, codec={args.codec}, "
+          f"compress={args.compress})")
+    if args.verify:
+        report = verify(CompactPanel.load(out))
+        print(report.to_string(index=False))
+        bad = int(report["mismatches"].sum())
+        print(f"[PANEL] {'OK' if not bad else f'{bad} niezgodności'} "
+              f"(gwarancja: błąd względny cen <= {PRICE_REL_TOL:.1e}, wolumen dokładny)")
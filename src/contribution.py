@@ -1,8 +1,11 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 import pandas as pd
 
+from trading_calendar import get_calendar, monthly_session
+
 # CONTRIBUTION AMOUNT FOR BACKTEST (later manual)
 MONTHLY_CONTRIBUTION_PLN = 2000
+CONTRIBUTION_DAY = 10
 
 
 def is_weekend(date):
@@ -10,10 +13,8 @@ def is_weekend(date):
 
 
 def next_business_day(date):
-    """Return the next weekday (Mon–Fri)."""
-    while is_weekend(date):
-        date += timedelta(days=1)
-    return date
+    """Return the first trading session (NYSE calendar, holidays included) on or after `date`."""
+    return get_calendar().next_trading_day(date)
 
 
 def check_contribution_day(today: datetime):
@@ -21,19 +22,12 @@ def check_contribution_day(today: datetime):
     Returns how much PLN to contribute today.
     Logic:
     - Contribution day = 10th of month
-    - If 10th is weekend → next business day
-    - If today is that business day → contribute 2000 PLN
+    - If 10th is not a trading session (weekend / holiday) → next session
+    - If today is that session → contribute 2000 PLN
     """
 
-    # Expected contribution day this month
-    target = today.replace(day=10)
-
-    # If target day already passed this month, no contribution
-    if today.date() < target.date():
-        return 0
-
-    # Move 10th to next business day if needed
-    target = next_business_day(target)
+    # 10th of this month, moved to the next trading session if needed
+    target = monthly_session(today, CONTRIBUTION_DAY)
 
     # Only contribute if TODAY == calculated contribution day
     if today.date() == target.date():
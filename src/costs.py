@@ -0,0 +1,164 @@
+# src/costs.py
+
+"""
+Model kosztów transakcyjnych: prowizja brokera, poślizg (bps) i spread FX.
+
+Wszystko liczone wektorowo na całych kolumnach zleceń / macierzach
+transakcji (numpy), więc backtest z kosztami jest tak samo szybki jak bez:
+
+    model = get_cost_model("xtb")
+    net = model.sell_value(qty, price, fx, currency)            # wpływ PLN po kosztach
+    qty = model.buy_quantity(value_pln, price, fx, currency)    # ile kupić za budżet
+    ex = model.execution(side, qty, price, fx, currency)        # pełne rozbicie (trade_engine)
+
+Składniki (dla zlecenia o wartości N = qty * cena):
+  - poślizg:   cena wykonania = cena * (1 ± slippage_bps / 1e4)
+  - spread FX: kurs wymiany PLN ↔ waluta = kurs * (1 ± fx_spread_bps / 1e4)
+               (tylko waluty inne niż PLN – zakup akcji z USA za złotówki)
+  - prowizja:  rate * N + per_share * qty, nie mniej niż commission_min
+               i (opcjonalnie) nie więcej niż commission_max_rate * N;
+               w walucie zlecenia
+  (+ dla BUY, - dla SELL: zawsze na niekorzyść inwestora)
+
+Taryfy w BROKERS są przybliżone (do symulacji) – przed realnym użyciem
+porównaj z aktualną tabelą opłat brokera. Domyślny model: zmienna
+środowiskowa MOMENTUM_BROKER, inaczej "none" (bez kosztów).
+"""
+
+from __future__ import annotations
+
+import os
+
+import numpy as np
+
+
+class CostModel:
+    """Taryfa jednego brokera; metody przyjmują skalary albo tablice (broadcast)."""
+
+    def __init__(
+        self,
+        name: str = "none",
+        commission_rate: float = 0.0,
+        commission_min: float = 0.0,
+        commission_max_rate: float | None = None,
+        per_share: float = 0.0,
+        slippage_bps: float = 0.0,
+        fx_spread_bps: float = 0.0,
+    ):
+        self.name = name
+        self.commission_rate = commission_rate
+        self.commission_min = commission_min
+        self.commission_max_rate = commission_max_rate
+        self.per_share = per_share
+        self.slippage_bps = slippage_bps
+        self.fx_spread_bps = fx_spread_bps
+
+    def __repr__(self) -> str:
+        return (f"CostModel({self.name}: prowizja {self.commission_rate:.2%} min {self.commission_min}, "
+                f"{self.per_share}/szt., poślizg {self.slippage_bps} bps, spread FX {self.fx_spread_bps} bps)")
+
+    @property
+    def is_free(self) -> bool:
+        return not (self.commission_rate or self.commission_min or self.per_share
+                    or self.slippage_bps or self.fx_spread_bps)
+
+    # ---------------------------------------------------------
+    # Składniki
+    # ---------------------------------------------------------
+    def _spread(self, currency) -> np.ndarray:
+        """Spread FX jako ułamek; PLN = 0."""
+        if currency is None:
+            return np.asarray(self.fx_spread_bps / 1e4)
+        return np.where(np.asarray(currency, dtype=object) == "PLN", 0.0, self.fx_spread_bps / 1e4)
+
+    def commission(self, quantity, notional) -> np.ndarray:
+        """Prowizja w walucie zlecenia (0 dla pustych zleceń)."""
+        qty = np.asarray(quantity, dtype=float)
+        notional = np.asarray(notional, dtype=float)
+        fee = np.maximum(self.commission_rate * notional + self.per_share * qty, self.commission_min)
+        if self.commission_max_rate is not None:
+            fee = np.minimum(fee, np.maximum(self.commission_max_rate * notional, self.commission_min))
+        return np.where(qty > 0, fee, 0.0)
+
+    def proportional_rate(self, currency="USD") -> float | np.ndarray:
+        """
+        Koszt jednej strony transakcji jako ułamek wartości (bez minimów
+        i opłat za sztukę) – dla backtestów operujących tylko na wagach.
+        """
+        return self.slippage_bps / 1e4 + self._spread(currency) + self.commission_rate
+
+    # ---------------------------------------------------------
+    # Wykonanie
+    # ---------------------------------------------------------
+    def execution(self, side, quantity, price_ccy, fx_rate=1.0, currency=None) -> dict:
+        """
+        Pełne rozbicie wykonania (tablice):
+          price_ccy  – cena wykonania (z poślizgiem),
+          fx_rate    – kurs wymiany (ze spreadem),
+          fee_ccy / fee_pln – prowizja,
+          price_pln  – efektywna cena za sztukę w PLN (wszystkie koszty w środku),
+          cost_pln   – koszt względem wykonania po cenie i kursie "mid".
+        """
+        sign = np.where(np.asarray(side, dtype=object) == "BUY", 1.0, -1.0)
+        qty = np.asarray(quantity, dtype=float)
+        mid_px = np.asarray(price_ccy, dtype=float)
+        mid_fx = np.asarray(fx_rate, dtype=float)
+
+        px = mid_px * (1.0 + sign * self.slippage_bps / 1e4)
+        fx = mid_fx * (1.0 + sign * self._spread(currency))
+        fee_ccy = self.commission(qty, qty * px)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            price_pln = np.where(qty > 0, (qty * px + sign * fee_ccy) * fx / qty, px * fx)
+        return {
+            "price_ccy": px,
+            "fx_rate": fx,
+            "fee_ccy": fee_ccy,
+            "fee_pln": fee_ccy * fx,
+            "price_pln": price_pln,
+            "cost_pln": sign * qty * (px * fx - mid_px * mid_fx) + fee_ccy * fx,
+        }
+
+    def sell_value(self, quantity, price, fx_rate=1.0, currency=None) -> np.ndarray:
+        """Wpływ ze sprzedaży (PLN, po kosztach)."""
+        ex = self.execution("SELL", quantity, price, fx_rate, currency)
+        return ex["price_pln"] * np.asarray(quantity, dtype=float)
+
+    def buy_quantity(self, value, price, fx_rate=1.0, currency=None) -> np.ndarray:
+        """
+        Ile sztuk kupić za budżet `value` (PLN) z kosztami. Prowizja liczona
+        od ilości "bez prowizji" jest >= prowizji od ilości końcowej,
+        więc budżet nigdy nie zostaje przekroczony.
+        """
+        value = np.asarray(value, dtype=float)
+        px = np.asarray(price, dtype=float) * (1.0 + self.slippage_bps / 1e4)
+        fx = np.asarray(fx_rate, dtype=float) * (1.0 + self._spread(currency))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            gross = value / (px * fx)
+            fee_pln = self.commission(gross, gross * px) * fx
+            return np.maximum((value - fee_pln) / (px * fx), 0.0)
+
+
+# Przybliżone taryfy (akcje z USA kupowane z rachunku w PLN)
+BROKERS = {
+    "none": CostModel("none"),
+    # 0% prowizji (do limitu obrotu), przewalutowanie ~0.5%
+    "xtb": CostModel("xtb", slippage_bps=5, fx_spread_bps=50),
+    # taryfa za sztukę z minimum i maksimum, tani FX
+    "ibkr": CostModel("ibkr", per_share=0.005, commission_min=1.0, commission_max_rate=0.01,
+                      slippage_bps=5, fx_spread_bps=3),
+    # procentowa prowizja z minimum, spread kantoru banku
+    "mbank": CostModel("mbank", commission_rate=0.0029, commission_min=19.0,
+                       slippage_bps=5, fx_spread_bps=35),
+}
+
+DEFAULT_BROKER = os.environ.get("MOMENTUM_BROKER", "none")
+
+
+def get_cost_model(costs: CostModel | str | None = None) -> CostModel:
+    """CostModel z obiektu / nazwy z BROKERS / domyślnego brokera (None)."""
+    if isinstance(costs, CostModel):
+        return costs
+    name = costs or DEFAULT_BROKER
+    if name not in BROKERS:
+        raise ValueError(f"Nieznany broker {name!r}. Dostępne: {sorted(BROKERS)}")
+    return BROKERS[name]
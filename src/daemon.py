@@ -0,0 +1,238 @@
+# src/daemon.py
+
+"""
+Tryb daemon silnika: jeden długo żyjący proces zamiast `python src/main.py`
+z crona.
+
+Stan trzymany w pamięci między sesjami:
+  - RunDataContext z panelem cen (uniwersum + pozycje + SPY),
+  - IndicatorCache (SMA / ROC) i historia FX,
+  - zaimportowane moduły (pandas, yfinance, pandas_market_calendars…).
+
+Harmonogram pochodzi z kalendarza giełdy (trading_calendar): daemon śpi
+do zamknięcia kolejnej sesji (z uwzględnieniem skróconych sesji) plus
+`delay_minutes` na publikację notowań, potem:
+
+  1. ctx.advance(sesja)  – dociąga TYLKO nowy słupek każdego tickera,
+  2. graf silnika (main.build_engine_graph / run_portfolios) z `warm`:
+     wskaźniki przedłużane o nowe wiersze, FX tylko z ostatniego miesiąca,
+  3. raport instrumentation jak w main (reports/engine_<ts>.json).
+
+Na starcie (warm-up) liczone są tylko etapy rynkowe – bez sell/buy, więc
+restart daemona nie powtarza transakcji ani wpłat dnia. Ta sama sesja nie
+jest przetwarzana dwa razy w jednym procesie; nie łącz daemona z cronowym
+main.py na tych samych księgach.
+
+Połączenia SQLite zostają krótkie (otwierane per operacja) – otwarcie
+pliku kosztuje mikrosekundy, a moduły zamykają połączenia same.
+
+    python src/daemon.py
+    python src/daemon.py --portfolios src/config/portfolios.example.json --delay-minutes 45
+    python src/daemon.py --catch-up --max-runs 1      # od razu ostatnia zamknięta sesja
+"""
+
+from __future__ import annotations
+
+import argparse
+import signal
+import time
+import traceback
+from datetime import datetime
+
+import pandas as pd
+
+from instrumentation import format_summary, span, start_run, write_report
+from main import build_engine_graph, build_market_graph, run_portfolios
+from portfolio_config import PortfolioSpec, load_portfolios
+from run_context import RunDataContext
+from trading_calendar import DEFAULT_EXCHANGE, get_calendar
+
+# notowania dnia są w Yahoo zwykle kilkanaście minut po zamknięciu
+DATA_DELAY_MINUTES = 30
+# najdłuższy pojedynczy sen – żeby SIGTERM / Ctrl+C działały od razu
+MAX_SLEEP_SECONDS = 60
+
+
+class EngineDaemon:
+    """Silnik z ciepłym stanem; run_session() = jeden przebieg po zamknięciu sesji."""
+
+    def __init__(
+        self,
+        portfolios_config: str | None = None,
+        exchange: str = DEFAULT_EXCHANGE,
+        delay_minutes: int = DATA_DELAY_MINUTES,
+        max_workers: int = 4,
+        allow_download: bool = True,
+    ):
+        self.specs = load_portfolios(portfolios_config) if portfolios_config else None
+        self.calendar = get_calendar(exchange)
+        self.delay = pd.Timedelta(minutes=delay_minutes)
+        self.max_workers = max_workers
+        self.allow_download = allow_download
+
+        self.ctx: RunDataContext | None = None
+        self.warm: dict = {}
+        self.last_session: pd.Timestamp | None = None
+        self._stop = False
+
+    # ---------------------------------------------------------
+    # Harmonogram
+    # ---------------------------------------------------------
+    def next_wake(self, now: pd.Timestamp) -> tuple[pd.Timestamp, pd.Timestamp]:
+        """(moment pobudki UTC, data sesji) dla pierwszego zamknięcia + opóźnienie po `now`."""
+        close = self.calendar.next_close(now - self.delay)
+        return close + self.delay, self.calendar.session_of_close(close)
+
+    def last_closed_session(self, now: pd.Timestamp) -> pd.Timestamp:
+        """Ostatnia sesja, której dane (zamknięcie + opóźnienie) są już dostępne."""
+        wake, session = self.next_wake(now)
+        prev = self.calendar.sessions[self.calendar.sessions < session.to_datetime64().astype("datetime64[D]")]
+        return pd.Timestamp(prev[-1])
+
+    # ---------------------------------------------------------
+    # Przebiegi
+    # ---------------------------------------------------------
+    def _market_specs(self):
+        return self.specs or [PortfolioSpec()]
+
+    def _remember(self, results: dict) -> None:
+        self.warm = {k: results[k] for k in ("indicators", "fx_history") if k in results}
+
+    def warm_up(self, session: pd.Timestamp) -> None:
+        """Ładuje panel, wskaźniki i FX na dzień `session` – tylko etapy rynkowe."""
+        print(f"[DAEMON] Warm-up na sesję {session:%Y-%m-%d}...")
+        t0 = time.perf_counter()
+        self.ctx = RunDataContext(as_of=session, allow_download=self.allow_download)
+        with span("daemon.warm_up"):
+            results = build_market_graph(session.to_pydatetime(), self.ctx, self._market_specs()).run(
+                max_workers=self.max_workers)
+        self._remember(results)
+        print(f"[DAEMON] Warm-up gotowy: {len(self.ctx.tickers)} tickerów w {time.perf_counter() - t0:.1f}s\n")
+
+    def run_session(self, session: pd.Timestamp) -> dict | None:
+        """Pełny przebieg silnika dla sesji `session` na ciepłym stanie."""
+        session = pd.Timestamp(session).normalize()
+        if self.last_session is not None and session <= self.last_session:
+            print(f"[DAEMON] Sesja {session:%Y-%m-%d} już przetworzona – pomijam.")
+            return None
+
+        start_run("engine")
+        try:
+            print(f"\n=== Momentum Portfolio Engine (daemon) – sesja {session:%Y-%m-%d} ===\n")
+            if self.ctx is None:
+                self.ctx = RunDataContext(as_of=session, allow_download=self.allow_download)
+            else:
+                with span("daemon.advance") as s:
+                    added = self.ctx.advance(session)
+                    s.rows = sum(added.values())
+                stale = sorted(t for t, n in added.items() if n == 0)
+                print(f"[DAEMON] Nowe słupki: {sum(added.values())} dla {len(added) - len(stale)}/{len(added)} tickerów")
+                if stale:
+                    print(f"[DAEMON] Bez nowego słupka: {stale[:10]}{' …' if len(stale) > 10 else ''}")
+
+            today_dt = session.to_pydatetime()
+            if self.specs:
+                per_portfolio = run_portfolios(today_dt, self.ctx, self.specs, self.max_workers, warm=self.warm)
+                results = next(iter(per_portfolio.values()))
+            else:
+                results = build_engine_graph(today_dt, self.ctx, warm=self.warm).run(max_workers=self.max_workers)
+            self._remember(results)
+            self.last_session = session
+            print("\n=== ENGINE COMPLETE ===\n")
+            return results
+        finally:
+            report_path = write_report()
+            print("[PERF] Podsumowanie etapów:")
+            print(format_summary())
+            print(f"[PERF] Raport → {report_path}\n")
+
+    # ---------------------------------------------------------
+    # Pętla
+    # ---------------------------------------------------------
+    def stop(self, *_args) -> None:
+        print("\n[DAEMON] Zatrzymuję po bieżącym kroku...")
+        self._stop = True
+
+    def _sleep_until(self, wake: pd.Timestamp, now_fn, sleep_fn) -> bool:
+        """Śpi do `wake` kawałkami; False = przerwane przez stop()."""
+        while not self._stop:
+            left = (wake - now_fn()).total_seconds()
+            if left <= 0:
+                return True
+            sleep_fn(min(left, MAX_SLEEP_SECONDS))
+        return False
+
+    def serve(
+        self,
+        max_runs: int | None = None,
+        catch_up: bool = False,
+        now_fn=None,
+        sleep_fn=time.sleep,
+    ) -> int:
+        """
+        Główna pętla: warm-up, potem przebieg po każdym zamknięciu sesji.
+
+        catch_up=True → od razu przebieg dla ostatniej zamkniętej sesji
+        (np. gdy dzisiejszy cron się nie wykonał). now_fn / sleep_fn do testów.
+        Zwraca liczbę wykonanych przebiegów.
+        """
+        now_fn = now_fn or (lambda: pd.Timestamp.now(tz="UTC"))
+        runs = 0
+
+        last = self.last_closed_session(now_fn())
+        if catch_up:
+            runs += self._safe_run(last)
+        else:
+            start_run("daemon")
+            self.warm_up(last)
+            self.last_session = last
+            print(f"[PERF] Warm-up → {write_report()}\n")
+
+        while not self._stop and (max_runs is None or runs < max_runs):
+            wake, session = self.next_wake(now_fn())
+            print(f"[DAEMON] Następny przebieg: sesja {session:%Y-%m-%d}, pobudka {wake:%Y-%m-%d %H:%M} UTC")
+            if not self._sleep_until(wake, now_fn, sleep_fn):
+                break
+            runs += self._safe_run(session)
+
+        if self.ctx is not None:
+            self.ctx.close()
+        print(f"[DAEMON] Koniec – wykonane przebiegi: {runs}")
+        return runs
+
+    def _safe_run(self, session: pd.Timestamp) -> int:
+        """Błąd jednego przebiegu nie zabija daemona – czekamy na następną sesję."""
+        try:
+            return int(self.run_session(session) is not None)
+        except Exception:
+            print(f"\n[ERROR] Przebieg dla sesji {session:%Y-%m-%d} nie powiódł się:")
+            print(traceback.format_exc())
+            self.last_session = max(self.last_session or session, session)
+            return 0
+
+
+# -------------------------------------------------------------
+# CLI
+# -------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Momentum Portfolio Engine – daemon")
+    parser.add_argument("--portfolios", default=None, help="plik JSON z wieloma portfelami")
+    parser.add_argument("--exchange", default=DEFAULT_EXCHANGE, help="kalendarz sesji (NYSE / WSE / XETRA)")
+    parser.add_argument("--delay-minutes", type=int, default=DATA_DELAY_MINUTES,
+                        help="ile minut po zamknięciu sesji pobierać dane")
+    parser.add_argument("--workers", type=int, default=4, help="liczba równoległych etapów")
+    parser.add_argument("--catch-up", action="store_true", help="od razu przebieg dla ostatniej zamkniętej sesji")
+    parser.add_argument("--max-runs", type=int, default=None, help="zakończ po N przebiegach")
+    args = parser.parse_args()
+
+    daemon = EngineDaemon(
+        portfolios_config=args.portfolios,
+        exchange=args.exchange,
+        delay_minutes=args.delay_minutes,
+        max_workers=args.workers,
+    )
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+
+    print(f"[DAEMON] Start {datetime.now():%Y-%m-%d %H:%M:%S}, giełda {args.exchange}")
+    daemon.serve(max_runs=args.max_runs, catch_up=args.catch_up)
@@ -0,0 +1,341 @@
+# src/daily_state.py
+
+"""
+Przyrostowy stan dzienny dla momentum (ROC3/6/12, score) i regime (SMA200).
+
+Zamiast co dzień liczyć ROC i SMA200 na 15–20 latach historii każdego
+tickera, trzymamy na dysku (data/state/<nazwa>.npz) tylko to, co jest
+potrzebne do ostatniego punktu:
+
+  - bufor ostatnich WINDOW = 253 cen zamknięcia (ROC12 potrzebuje ceny
+    sprzed 252 sesji),
+  - kroczącą sumę ostatnich 200 cen i liczbę NaN w tym oknie (SMA200),
+  - datę i cenę ostatniego słupka (kontrola, czy historia się nie zmieniła),
+  - ostatni ranking momentum.
+
+Każdy przebieg bierze z ramek tylko wiersze po zapisanej dacie (zwykle
+jeden nowy słupek), przesuwa bufor i aktualizuje sumę o wchodzące
+i wychodzące ceny. Tickery nowe, ze zmienioną historią (przepisany CSV
+po splicie) albo z datą spoza ramki są odbudowywane z ogona ich historii.
+
+Definicje jak w pełnym przeliczeniu (momentum.compute_momentum,
+strategy_a.compute_regime): wskaźniki po wierszach własnej historii
+tickera, SMA200 = NaN dopóki w oknie jest brak danych. Tryb weryfikacji
+porównuje stan z pełnym przeliczeniem:
+
+    ranking = momentum_ranking(price_data)       # jak compute_momentum_ranking
+    regime = market_regime(spy_df["Close"])      # jak compute_regime
+    python src/daily_state.py --verify           # stan vs pełne przeliczenie
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import count
+
+STATE_DIR = Path(__file__).resolve().parent.parent / "data" / "state"
+_DEFAULT_DIR = object()  # store_dir domyślny: STATE_DIR odczytany przy wywołaniu (można go podmienić)
+
+ROC_PERIODS = {"roc3": 63, "roc6": 126, "roc12": 252}
+SCORE_WEIGHTS = {"roc3": 0.2, "roc6": 0.3, "roc12": 0.5}
+SMA_WINDOW = 200
+WINDOW = max(max(ROC_PERIODS.values()) + 1, SMA_WINDOW)
+
+# tolerancja weryfikacji (krocząca suma vs rolling().mean() z pandas)
+VERIFY_RTOL = 1e-9
+
+
+class RollingState:
+    """
+    Ostatnie WINDOW cen per ticker + krocząca suma SMA; update() przyjmuje
+    pełne szeregi cen, ale czyta z nich tylko wiersze po zapisanej dacie.
+    """
+
+    def __init__(self, tickers=(), buf=None, sma_sum=None, sma_nan=None, last_date=None, last_close=None):
+        self.tickers = list(tickers)
+        k = len(self.tickers)
+        self.buf = buf if buf is not None else np.full((k, WINDOW), np.nan)
+        self.sma_sum = sma_sum if sma_sum is not None else np.zeros(k)
+        self.sma_nan = sma_nan if sma_nan is not None else np.full(k, SMA_WINDOW, dtype=np.int64)
+        self.last_date = last_date if last_date is not None else np.full(k, np.datetime64("NaT"), dtype="datetime64[D]")
+        self.last_close = last_close if last_close is not None else np.full(k, np.nan)
+        self._pos = {t: i for i, t in enumerate(self.tickers)}
+        self.ranking: pd.DataFrame | None = None
+
+    def __repr__(self) -> str:
+        last = self.last_date[~np.isnat(self.last_date)]
+        return f"RollingState({len(self.tickers)} tickerów, ostatnia data {last.max() if len(last) else '-'})"
+
+    # ---------------------------------------------------------
+    # Zapis / odczyt
+    # ---------------------------------------------------------
+    @classmethod
+    def load(cls, path: Path) -> "RollingState":
+        if not path.exists():
+            return cls()
+        try:
+            z = np.load(path, allow_pickle=False)
+            state = cls(z["tickers"].tolist(), z["buf"], z["sma_sum"], z["sma_nan"], z["last_date"], z["last_close"])
+            if "rank_tickers" in z:
+                state.ranking = pd.DataFrame({"ticker": z["rank_tickers"], "score": z["rank_scores"]})
+            count("daily_state.disk_hit")
+            return state
+        except Exception as exc:
+            print(f"[STATE] Nie udało się wczytać {path.name}: {exc} – buduję od nowa.")
+            return cls()
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        extra = {}
+        if self.ranking is not None:
+            extra = {"rank_tickers": self.ranking["ticker"].to_numpy(dtype=str),
+                     "rank_scores": self.ranking["score"].to_numpy(dtype=float)}
+        tmp = path.with_suffix(".tmp.npz")
+        np.savez(tmp, tickers=np.array(self.tickers, dtype=str), buf=self.buf, sma_sum=self.sma_sum,
+                 sma_nan=self.sma_nan, last_date=self.last_date, last_close=self.last_close, **extra)
+        os.replace(tmp, path)
+
+    # ---------------------------------------------------------
+    # Aktualizacja
+    # ---------------------------------------------------------
+    def _add_tickers(self, tickers) -> None:
+        new = [t for t in tickers if t not in self._pos]
+        if not new:
+            return
+        k = len(new)
+        self.tickers += new
+        self.buf = np.vstack([self.buf, np.full((k, WINDOW), np.nan)])
+        self.sma_sum = np.concatenate([self.sma_sum, np.zeros(k)])
+        self.sma_nan = np.concatenate([self.sma_nan, np.full(k, SMA_WINDOW, dtype=np.int64)])
+        self.last_date = np.concatenate([self.last_date, np.full(k, np.datetime64("NaT"), dtype="datetime64[D]")])
+        self.last_close = np.concatenate([self.last_close, np.full(k, np.nan)])
+        self._pos = {t: i for i, t in enumerate(self.tickers)}
+
+    def _rebuild(self, i: int, series: pd.Series) -> None:
+        tail = series.to_numpy(dtype=float)[-WINDOW:]
+        row = np.full(WINDOW, np.nan)
+        row[WINDOW - len(tail):] = tail
+        self.buf[i] = row
+        window = row[-SMA_WINDOW:]
+        self.sma_sum[i] = np.nansum(window)
+        self.sma_nan[i] = np.isnan(window).sum()
+
+    def update(self, closes: Dict[str, pd.Series]) -> Dict[str, int]:
+        """
+        Dopisuje do stanu nowe wiersze szeregów `closes` {ticker: Close}.
+        Zwraca liczniki: appended (nowe słupki), rebuilt (tickery od nowa).
+        """
+        self._add_tickers(closes)
+        stats = {"appended": 0, "rebuilt": 0}
+        groups: Dict[int, list] = {}
+
+        for ticker, series in closes.items():
+            i = self._pos[ticker]
+            index = series.index
+            if len(index) == 0:
+                continue
+            last = self.last_date[i]
+            j = index.searchsorted(pd.Timestamp(last), side="left") if not np.isnat(last) else -1
+            known = (0 <= j < len(index) and index[j] == pd.Timestamp(last)
+                     and _same(series.iloc[j], self.last_close[i]))
+            if not known:
+                self._rebuild(i, series)
+                stats["rebuilt"] += 1
+            else:
+                new = series.to_numpy(dtype=float)[j + 1:]
+                if len(new) >= SMA_WINDOW:
+                    self._rebuild(i, series)
+                    stats["rebuilt"] += 1
+                elif len(new):
+                    groups.setdefault(len(new), []).append((i, new))
+            self.last_date[i] = np.datetime64(index[-1].date(), "D")
+            self.last_close[i] = float(series.iloc[-1])
+
+        # zwykle jedna grupa (n = 1 nowy słupek) – przesuwamy ją wektorowo
+        for n, items in groups.items():
+            rows = np.array([i for i, _ in items])
+            new = np.vstack([v for _, v in items])
+            leaving = self.buf[rows, WINDOW - SMA_WINDOW:WINDOW - SMA_WINDOW + n]
+            self.sma_sum[rows] += np.nansum(new, axis=1) - np.nansum(leaving, axis=1)
+            self.sma_nan[rows] += np.isnan(new).sum(axis=1) - np.isnan(leaving).sum(axis=1)
+            self.buf[rows] = np.concatenate([self.buf[rows, n:], new], axis=1)
+            stats["appended"] += n * len(rows)
+
+        count("daily_state.appended", stats["appended"])
+        count("daily_state.rebuilt", stats["rebuilt"])
+        return stats
+
+    # ---------------------------------------------------------
+    # Ostatni punkt wskaźników
+    # ---------------------------------------------------------
+    def _rows(self, tickers) -> np.ndarray:
+        return np.array([self._pos[t] for t in tickers], dtype=np.int64)
+
+    def close(self, tickers) -> np.ndarray:
+        return self.buf[self._rows(tickers), -1]
+
+    def sma(self, tickers) -> np.ndarray:
+        rows = self._rows(tickers)
+        return np.where(self.sma_nan[rows] == 0, self.sma_sum[rows] / SMA_WINDOW, np.nan)
+
+    def roc(self, tickers, periods: int) -> np.ndarray:
+        b = self.buf[self._rows(tickers)]
+        return b[:, -1] / b[:, -1 - periods] - 1.0
+
+
+def _same(a, b) -> bool:
+    return bool(np.isclose(a, b, rtol=1e-10, equal_nan=True))
+
+
+def _closes(price_data: Dict[str, pd.DataFrame], column: str = "Close") -> Dict[str, pd.Series]:
+    return {t: df[column] for t, df in price_data.items() if df is not None and not df.empty}
+
+
+# -------------------------------------------------------------
+# Momentum
+# -------------------------------------------------------------
+def _ranking(state: RollingState, tickers) -> pd.DataFrame:
+    tickers = list(tickers)
+    rocs = {name: state.roc(tickers, p) * 100 for name, p in ROC_PERIODS.items()}
+    score = sum(SCORE_WEIGHTS[name] * rocs[name] for name in ROC_PERIODS)
+    mom_df = pd.DataFrame({"ticker": tickers, "score": score, **rocs})
+    return mom_df.sort_values("score", ascending=False).reset_index(drop=True)
+
+
+def _store_dir(store_dir):
+    return STATE_DIR if store_dir is _DEFAULT_DIR else store_dir
+
+
+def momentum_ranking(price_data: Dict[str, pd.DataFrame], store_dir: str | Path | None = _DEFAULT_DIR) -> pd.DataFrame:
+    """
+    Ranking jak momentum.compute_momentum_ranking (ticker | score | roc3 |
+    roc6 | roc12, od najlepszego), liczony ze stanu przyrostowego.
+    store_dir=None → stan tylko w pamięci (pełna odbudowa, bez zapisu).
+    """
+    store_dir = _store_dir(store_dir)
+    path = Path(store_dir) / "momentum.npz" if store_dir is not None else None
+    state = RollingState.load(path) if path is not None else RollingState()
+    closes = _closes(price_data)
+    stats = state.update(closes)
+    ranking = _ranking(state, closes)
+    state.ranking = ranking
+    if path is not None:
+        state.save(path)
+    print(f"[STATE] Momentum: {stats['appended']} nowych słupków, {stats['rebuilt']} tickerów od nowa")
+    return ranking
+
+
+def last_ranking(store_dir: str | Path = _DEFAULT_DIR) -> pd.DataFrame | None:
+    """Ranking zapisany przy ostatnim przebiegu (ticker | score) albo None."""
+    return RollingState.load(Path(_store_dir(store_dir)) / "momentum.npz").ranking
+
+
+# -------------------------------------------------------------
+# Regime
+# -------------------------------------------------------------
+def market_regime(spy_close: pd.Series, store_dir: str | Path | None = _DEFAULT_DIR, ticker: str = "SPY") -> str:
+    """BULL / BEAR / UNKNOWN jak strategy_a.compute_regime, ze stanu przyrostowego."""
+    series = spy_close.dropna()
+    if series.empty:
+        print("[Strategy A] Brak danych SPY – zwracam UNKNOWN")
+        return "UNKNOWN"
+
+    store_dir = _store_dir(store_dir)
+    path = Path(store_dir) / "regime.npz" if store_dir is not None else None
+    state = RollingState.load(path) if path is not None else RollingState()
+    state.update({ticker: series})
+    if path is not None:
+        state.save(path)
+
+    sma200 = state.sma([ticker])[0]
+    if np.isnan(sma200):
+        print("[Strategy A] Za mało danych do SMA200 – zwracam UNKNOWN")
+        return "UNKNOWN"
+    return "BULL" if state.close([ticker])[0] >= sma200 else "BEAR"
+
+
+# -------------------------------------------------------------
+# Weryfikacja: stan przyrostowy vs pełne przeliczenie
+# -------------------------------------------------------------
+def verify(
+    price_data: Dict[str, pd.DataFrame],
+    spy_close: pd.Series,
+    store_dir: str | Path = _DEFAULT_DIR,
+    top_n: int = 10,
+) -> dict:
+    """
+    Aktualizuje stan na dysku (jak zwykły przebieg) i porównuje go z pełnym
+    przeliczeniem (compute_momentum_ranking / sma / compute_regime).
+
+    Zwraca {"ok": bool, "max_rel_err": {...}, "top_match": bool, "regime": (inc, full)}.
+    """
+    from indicators import sma
+    from momentum import compute_momentum_ranking
+    from strategy_a import compute_regime
+
+    store_dir = _store_dir(store_dir)
+    inc = momentum_ranking(price_data, store_dir).set_index("ticker")
+    full = compute_momentum_ranking(price_data).set_index("ticker")
+
+    def rel_err(a: pd.Series, b: pd.Series) -> float:
+        a, b = a.astype(float), b.reindex(a.index).astype(float)
+        if not (np.isnan(a.to_numpy()) == np.isnan(b.to_numpy())).all():
+            return float("inf")
+        with np.errstate(invalid="ignore", divide="ignore"):
+            err = np.abs(a - b) / np.maximum(np.abs(b), 1e-12)
+        return float(np.nanmax(err.to_numpy())) if err.notna().any() else 0.0
+
+    errors = {c: rel_err(inc[c], full[c]) for c in ("roc3", "roc6", "roc12", "score")}
+
+    state = RollingState.load(Path(store_dir) / "momentum.npz")
+    closes = _closes(price_data)
+    tickers = list(closes)
+    sma_full = pd.Series({t: sma(s, SMA_WINDOW).iloc[-1] for t, s in closes.items()})
+    errors["sma200"] = rel_err(pd.Series(state.sma(tickers), index=tickers), sma_full)
+
+    top_match = inc.index[:top_n].tolist() == full.index[:top_n].tolist()
+    regime = (market_regime(spy_close, store_dir), compute_regime(spy_close))
+    ok = all(e <= VERIFY_RTOL for e in errors.values()) and top_match and regime[0] == regime[1]
+    return {"ok": ok, "max_rel_err": errors, "top_match": top_match, "regime": regime}
+
+
+# -------------------------------------------------------------
+# CLI
+# -------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Przyrostowy stan momentum / regime")
+    parser.add_argument("--verify", action="store_true", help="porównaj stan z pełnym przeliczeniem")
+    parser.add_argument("--as-of", default=None, help="data (YYYY-MM-DD), domyślnie dziś")
+    parser.add_argument("--store-dir", default=str(STATE_DIR))
+    args = parser.parse_args()
+
+    from run_context import RunDataContext
+    from universe import load_universe
+
+    with RunDataContext(as_of=args.as_of) as ctx:
+        price_data = ctx.load(load_universe())
+        spy_close = ctx.history("SPY", period="15y")["Close"]
+
+        if not args.verify:
+            ranking = momentum_ranking(price_data, args.store_dir)
+            print(ranking.head(10).to_string(index=False))
+            print(f"[STATE] Regime: {market_regime(spy_close, args.store_dir)}")
+            sys.exit(0)
+
+        report = verify(price_data, spy_close, args.store_dir)
+
+    print("\n[VERIFY] Maks. błąd względny (stan vs pełne przeliczenie):")
+    for name, err in report["max_rel_err"].items():
+        print(f"  {name:<7} {err:.2e}")
+    print(f"[VERIFY] TOP ranking zgodny: {report['top_match']}")
+    print(f"[VERIFY] Regime: przyrostowo={report['regime'][0]}, pełne={report['regime'][1]}")
+    print(f"[VERIFY] {'OK' if report['ok'] else 'NIEZGODNOŚĆ'}")
+    sys.exit(0 if report["ok"] else 1)
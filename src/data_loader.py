@@ -2,15 +2,26 @@
 
 from __future__ import annotations
 
+import io
+import os
 from pathlib import Path
 from typing import Iterable, Dict, Union
 
 import pandas as pd
-import yfinance as yf
+
+from instrumentation import count
 
 # Katalog z danymi: data/prices/*.csv
-DATA_DIR = Path(__file__).resolve().parent.parent / "data" / "prices"
-DATA_DIR.mkdir(parents=True, exist_ok=True)
+# (MOMENTUM_PRICE_DIR pozwala podpiąć np. magazyn z synthetic_data.py)
+DATA_DIR = Path(
+    os.environ.get(
+        "MOMENTUM_PRICE_DIR",
+        Path(__file__).resolve().parent.parent / "data" / "prices",
+    )
+)
+
+# ile bajtów od końca CSV czytamy na start przy dociąganiu nowych słupków
+TAIL_BYTES = 1 << 16
 
 
 # -------------------------------------------------------------
@@ -20,6 +31,12 @@ def _csv_path(ticker: str) -> Path:
     return DATA_DIR / f"{ticker}.csv"
 
 
+def _yf():
+    """yfinance importowany dopiero przy pobieraniu – przebieg z ciepłego CSV go nie ładuje."""
+    import yfinance as yf
+    return yf
+
+
 def _read_from_csv(ticker: str) -> pd.DataFrame | None:
     path = _csv_path(ticker)
     if not path.exists():
@@ -39,7 +56,8 @@ def _download_full_from_yahoo(
 ) -> pd.DataFrame:
     """Pobiera pełną historię z Yahoo i nadpisuje CSV."""
     print(f"[data_loader] Pobieram pełną historię z Yahoo dla {ticker} ({start} → {end or 'today'})...")
-    df = yf.download(
+    count("yahoo.download")
+    df = _yf().download(
         ticker,
         start=start,
         end=end,
@@ -51,6 +69,7 @@ def _download_full_from_yahoo(
         raise ValueError(f"[data_loader] Yahoo Finance zwrócił puste dane dla {ticker}")
 
     df = df.rename_axis("Date").reset_index()
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
     df.to_csv(_csv_path(ticker), index=False)
 
     df.set_index("Date", inplace=True)
@@ -77,8 +96,9 @@ def _append_missing_from_yahoo(
 
     start_dl = (last_date + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
     print(f"[data_loader] Dociągam nowe dane z Yahoo dla {ticker} ({start_dl} → {end or 'today'})...")
+    count("yahoo.append")
 
-    new_df = yf.download(
+    new_df = _yf().download(
         ticker,
         start=start_dl,
         end=end,
@@ -124,6 +144,7 @@ def load_single_history(
     start_ts = pd.to_datetime(start).normalize()
 
     df = _read_from_csv(ticker)
+    count("price_store.miss" if df is None else "price_store.hit")
 
     if df is None:
         if not allow_download:
@@ -142,6 +163,145 @@ def load_single_history(
     return df.copy()
 
 
+# -------------------------------------------------------------
+# Publiczne API: tylko nowe słupki (daemon – panel trzymany w pamięci)
+# -------------------------------------------------------------
+def _read_csv_tail(ticker: str, after: pd.Timestamp) -> pd.DataFrame | None:
+    """
+    Wiersze CSV z datą > after, czytane od końca pliku: parsujemy ostatnie
+    TAIL_BYTES (x4 aż ogon sięgnie `after`), a nie całą historię.
+    None = brak pliku.
+    """
+    path = _csv_path(ticker)
+    if not path.exists():
+        return None
+
+    with open(path, "rb") as f:
+        header = f.readline()
+        size = f.seek(0, os.SEEK_END)
+        block = TAIL_BYTES
+        while True:
+            start = max(len(header), size - block)
+            f.seek(start)
+            chunk = f.read(size - start)
+            if start > len(header):
+                chunk = chunk.split(b"\n", 1)[1] if b"\n" in chunk else b""  # urwana pierwsza linia
+            df = pd.read_csv(io.BytesIO(header + chunk), parse_dates=["Date"]).set_index("Date")
+            if start == len(header) or (len(df) and df.index.min() <= after):
+                break
+            block *= 4
+
+    return df[df.index > after].sort_index()
+
+
+def _append_rows_to_csv(ticker: str, rows: pd.DataFrame) -> None:
+    """Dopisuje wiersze na końcu CSV (kolumny jak w nagłówku pliku), bez przepisywania historii."""
+    path = _csv_path(ticker)
+    if not path.exists():
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        rows.rename_axis("Date").reset_index().to_csv(path, index=False)
+        return
+
+    with open(path, "rb") as f:
+        columns = f.readline().decode().strip().split(",")
+        f.seek(-1, os.SEEK_END)
+        newline = f.read(1) != b"\n"
+    rows = rows.rename_axis("Date").reset_index().reindex(columns=columns)
+    with open(path, "a", newline="") as f:
+        if newline:
+            f.write("\n")
+        rows.to_csv(f, index=False, header=False)
+
+
+def load_new_bars(
+    ticker: str,
+    after,
+    end=None,
+    allow_download: bool = True,
+) -> pd.DataFrame:
+    """
+    Tylko słupki z datą w (after, end] – do dociągania dnia w RunDataContext.advance():
+
+    - najpierw ogon lokalnego CSV (mógł go dopisać inny proces),
+    - potem, jeśli allow_download, Yahoo od ostatniej znanej daty
+      (dopisane na koniec CSV, bez przepisywania pliku).
+
+    Zwraca ramkę jak load_single_history (index Date, kolumna Ticker), może być pusta.
+    """
+    after = pd.to_datetime(after).normalize()
+    end_ts = pd.to_datetime(end).normalize() if end else pd.Timestamp.today().normalize()
+
+    new = _read_csv_tail(ticker, after)
+    count("price_store.tail" if new is not None else "price_store.miss")
+    if new is None:
+        new = pd.DataFrame(index=pd.DatetimeIndex([], name="Date"))
+
+    last = max(after, new.index.max()) if len(new) else after
+    if allow_download and last < end_ts:
+        try:
+            count("yahoo.append")
+            dl = _yf().download(
+                ticker,
+                start=(last + pd.Timedelta(days=1)).strftime("%Y-%m-%d"),
+                # `end` w yfinance jest wyłączny – chcemy też słupek z dnia end
+                end=(end_ts + pd.Timedelta(days=1)).strftime("%Y-%m-%d"),
+                auto_adjust=False,
+                progress=False,
+            )
+            if isinstance(dl.columns, pd.MultiIndex):  # nowsze yfinance: (Price, Ticker)
+                dl.columns = dl.columns.get_level_values(0)
+            dl = dl.rename_axis("Date")
+            dl = dl[dl.index > last]
+            if not dl.empty:
+                _append_rows_to_csv(ticker, dl)
+                new = pd.concat([new, dl]) if len(new) else dl
+        except Exception as exc:
+            print(f"[data_loader] Ostrzeżenie: nie udało się dociągnąć nowych słupków dla {ticker}: {exc}")
+
+    new = new[new.index <= end_ts].copy()
+    new["Ticker"] = ticker
+    return new
+
+
+# -------------------------------------------------------------
+# Publiczne API: naprawa (lista refetch z price_integrity)
+# -------------------------------------------------------------
+def refetch_from_yahoo(ticker: str, start, end=None) -> pd.DataFrame:
+    """
+    Ponownie pobiera z Yahoo zakres [start, end] i ZASTĘPUJE nim te wiersze
+    w CSV (luki, zera, błędne ticki); wiersze spoza zakresu zostają.
+    Brak pliku = pełne pobranie. Zwraca całą historię jak load_single_history.
+    """
+    start_ts = pd.to_datetime(start).normalize()
+    end_ts = pd.to_datetime(end).normalize() if end else pd.Timestamp.today().normalize()
+
+    old = _read_from_csv(ticker)
+    if old is None:
+        return _download_full_from_yahoo(ticker, end=end)
+
+    print(f"[data_loader] Pobieram ponownie {ticker} ({start_ts:%Y-%m-%d} → {end_ts:%Y-%m-%d})...")
+    count("yahoo.refetch")
+    dl = _yf().download(
+        ticker,
+        start=start_ts.strftime("%Y-%m-%d"),
+        end=(end_ts + pd.Timedelta(days=1)).strftime("%Y-%m-%d"),  # `end` w yfinance jest wyłączny
+        auto_adjust=False,
+        progress=False,
+    )
+    if dl.empty:
+        raise ValueError(f"[data_loader] Yahoo Finance zwrócił puste dane dla {ticker}")
+    if isinstance(dl.columns, pd.MultiIndex):  # nowsze yfinance: (Price, Ticker)
+        dl.columns = dl.columns.get_level_values(0)
+
+    old = old.drop(columns=["Ticker"])
+    keep = old[(old.index < start_ts) | (old.index > end_ts)]
+    merged = pd.concat([keep, dl.rename_axis("Date").reindex(columns=old.columns)]).sort_index()
+    merged.reset_index().to_csv(_csv_path(ticker), index=False)
+
+    merged["Ticker"] = ticker
+    return merged
+
+
 # -------------------------------------------------------------
 # Publiczne API: główna funkcja wykorzystywana w main.py
 # -------------------------------------------------------------
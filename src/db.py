@@ -1,8 +1,8 @@
 import sqlite3
+from contextlib import contextmanager
 from pathlib import Path
 
 DB_PATH = Path("data/portfolio.db")
-DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
 
 # ==============================================================
@@ -10,11 +10,32 @@ DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 # ==============================================================
 
 def get_connection():
-    """Return SQLite connection, create DB if missing."""
+    """Return SQLite connection, create DB (and its directory) if missing."""
+    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
     conn = sqlite3.connect(DB_PATH)
     return conn
 
 
+@contextmanager
+def use_database(path):
+    """
+    Temporarily point every get_connection() at another ledger file
+    (multi-portfolio runs: one DB per account); path=None keeps the
+    current one. Not thread-safe – portfolios are processed one at a time.
+    """
+    global DB_PATH
+    previous = DB_PATH
+    if path is None:
+        yield DB_PATH
+        return
+    DB_PATH = Path(path)
+    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        yield DB_PATH
+    finally:
+        DB_PATH = previous
+
+
 # ==============================================================
 # INIT DB STRUCTURE
 # ==============================================================
@@ -46,9 +67,15 @@ def init_db():
             currency TEXT,
             price_pln REAL,
             regime TEXT,
-            note TEXT
+            note TEXT,
+            fee_pln REAL DEFAULT 0
         )
     """)
+    # price_pln is the effective per-share price (slippage, FX spread and fee included);
+    # fee_pln is the commission part of it, for cost reports (costs.py)
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(transactions)")}
+    if "fee_pln" not in columns:
+        cur.execute("ALTER TABLE transactions ADD COLUMN fee_pln REAL DEFAULT 0")
 
     # Table with monthly contributions
     cur.execute("""
@@ -59,10 +86,76 @@ def init_db():
         )
     """)
 
+    # Table with extra deposits / withdrawals (cash_flow.py)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS cash_flows (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT,
+            amount_pln REAL,
+            type TEXT,
+            note TEXT
+        )
+    """)
+
+    # All external money movements (contributions + deposits - withdrawals)
+    cur.execute("""
+        CREATE VIEW IF NOT EXISTS external_flows AS
+            SELECT timestamp, amount_pln FROM contributions
+            UNION ALL
+            SELECT date AS timestamp,
+                   CASE WHEN type = 'WITHDRAW' THEN -amount_pln ELSE amount_pln END AS amount_pln
+            FROM cash_flows
+    """)
+
+    # Ledger snapshots: materialised positions at period ends (see ledger.py)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS ledger_snapshots (
+            snapshot_date TEXT PRIMARY KEY,
+            last_txn_id INTEGER,
+            cash_pln REAL,
+            created_at TEXT
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS position_snapshots (
+            snapshot_date TEXT,
+            ticker TEXT,
+            quantity REAL,
+            currency TEXT,
+            avg_price_ccy REAL,
+            avg_price_pln REAL,
+            PRIMARY KEY (snapshot_date, ticker)
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_transactions_timestamp ON transactions (timestamp)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_contributions_timestamp ON contributions (timestamp)")
+
+    # Daily mark-to-market equity of the live portfolio (equity_history.py)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS equity_history (
+            date TEXT PRIMARY KEY,
+            positions_pln REAL,
+            cash_pln REAL,
+            flow_pln REAL,
+            equity_pln REAL
+        )
+    """)
+
     conn.commit()
     conn.close()
 
 
+def invalidate_snapshots(conn, since):
+    """
+    Usuwa stan wyliczony z ledgera (snapshoty pozycji, historia equity)
+    z datą >= since (YYYY-MM-DD) – wywoływane przy zapisie zdarzenia,
+    żeby zdarzenie z datą wsteczną nie zostało pominięte.
+    """
+    conn.execute("DELETE FROM position_snapshots WHERE snapshot_date >= ?", (since,))
+    conn.execute("DELETE FROM ledger_snapshots WHERE snapshot_date >= ?", (since,))
+    conn.execute("DELETE FROM equity_history WHERE date >= ?", (since,))
+
+
 # ==============================================================
 # CRUD FOR POSITIONS
 # ==============================================================
@@ -111,17 +204,101 @@ def remove_position(ticker):
 # TRANSACTIONS
 # ==============================================================
 
-def record_transaction(timestamp, ticker, side, quantity, price_ccy, currency, price_pln, regime, note=""):
+def record_transaction(timestamp, ticker, side, quantity, price_ccy, currency, price_pln, regime, note="",
+                       fee_pln=0.0):
     conn = get_connection()
     cur = conn.cursor()
 
     cur.execute("""
         INSERT INTO transactions (
             timestamp, ticker, side, quantity, price_ccy, currency,
-            price_pln, regime, note
+            price_pln, regime, note, fee_pln
         )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (timestamp, ticker, side, quantity, price_ccy, currency, price_pln, regime, note))
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (timestamp, ticker, side, quantity, price_ccy, currency, price_pln, regime, note, fee_pln))
+    invalidate_snapshots(conn, str(timestamp)[:10])
 
     conn.commit()
     conn.close()
+
+
+# ==============================================================
+# BATCH (one transaction per rebalance)
+# ==============================================================
+
+def write_order_batch(transactions, position_upserts, position_deletes):
+    """
+    Zapisuje cały batch zleceń w JEDNEJ transakcji SQLite:
+
+      transactions      : lista krotek (timestamp, ticker, side, quantity,
+                          price_ccy, currency, price_pln, regime, note, fee_pln)
+      position_upserts  : lista krotek (ticker, quantity, currency,
+                          avg_price_ccy, avg_price_pln) – stan PO transakcji
+      position_deletes  : lista tickerów do usunięcia (pozycja zamknięta)
+    """
+    conn = get_connection()
+    try:
+        with conn:
+            conn.executemany("""
+                INSERT INTO transactions (
+                    timestamp, ticker, side, quantity, price_ccy, currency,
+                    price_pln, regime, note, fee_pln
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, transactions)
+
+            conn.executemany("""
+                INSERT INTO portfolio_positions (ticker, quantity, currency, avg_price_ccy, avg_price_pln)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(ticker) DO UPDATE SET
+                    quantity = excluded.quantity,
+                    avg_price_ccy = excluded.avg_price_ccy,
+                    avg_price_pln = excluded.avg_price_pln
+            """, position_upserts)
+
+            conn.executemany(
+                "DELETE FROM portfolio_positions WHERE ticker=?",
+                [(t,) for t in position_deletes],
+            )
+
+            # ledger jest append-only: snapshoty nowsze niż zapisane zdarzenia są nieaktualne
+            if transactions:
+                invalidate_snapshots(conn, min(str(t[0])[:10] for t in transactions))
+    finally:
+        conn.close()
+
+
+# ==============================================================
+# STATUS (CLI report – sqlite only, no pandas)
+# ==============================================================
+
+def ledger_status():
+    """
+    Short summary of the current ledger for status commands:
+    open positions, last transaction, total contributions and the last
+    equity_history row. Returns None when the DB file does not exist
+    (a status check must not create an empty ledger).
+    """
+    if not DB_PATH.exists():
+        return None
+    conn = get_connection()
+    try:
+        positions = [r[0] for r in conn.execute("SELECT ticker FROM portfolio_positions ORDER BY ticker")]
+        n_txn, last_txn = conn.execute("SELECT COUNT(*), MAX(timestamp) FROM transactions").fetchone()
+        contributed = conn.execute("SELECT COALESCE(SUM(amount_pln), 0) FROM contributions").fetchone()[0]
+        equity = conn.execute(
+            "SELECT date, equity_pln FROM equity_history ORDER BY date DESC LIMIT 1"
+        ).fetchone()
+    except sqlite3.OperationalError:  # plik bez schematu (init_db nie był uruchomiony)
+        return {"positions": [], "transactions": 0, "last_transaction": None,
+                "contributed_pln": 0.0, "equity_date": None, "equity_pln": None}
+    finally:
+        conn.close()
+    return {
+        "positions": positions,
+        "transactions": n_txn,
+        "last_transaction": last_txn,
+        "contributed_pln": float(contributed),
+        "equity_date": equity[0] if equity else None,
+        "equity_pln": equity[1] if equity else None,
+    }
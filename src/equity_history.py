@@ -0,0 +1,314 @@
+# src/equity_history.py
+
+"""
+Dzienna historia equity (PLN, mark-to-market) realnego portfela z ledgera.
+
+Źródła: `transactions` (BUY / SELL), `contributions` i `cash_flows`
+(widok `external_flows`), ceny Close z data_loader i historia FX.
+
+Liczenie jest macierzowe, bez pętli po dniach:
+  qty   [dzień x ticker] = stan startowy + cumsum(zmian ilości z transakcji);
+                           zmiany liczone per zdarzenie regułą ledger.replay
+                           (SELL bez pozycji pomijany, pozycja <= 0 znika)
+  price [dzień x ticker] = Close (ffill), a przed pierwszą sesją tickera
+                           cena z ostatniej transakcji
+  fx    [dzień x ticker] = kurs waluty tickera z historii FX (ffill)
+  equity = (qty * price * fx).sum(axis=1) + cash
+
+Wynik trafia do tabeli `equity_history` (date | positions_pln | cash_pln |
+flow_pln | equity_pln). Każde uruchomienie liczy tylko dni od ostatniego
+zapisanego (ostatni dzień liczony ponownie – mógł mieć niepełną sesję);
+stan startowy bierzemy z ledgera (snapshot + replay), nie z całego logu.
+Zdarzenie z datą wsteczną kasuje wiersze od swojej daty
+(db.invalidate_snapshots), więc zostaną przeliczone.
+
+    update_equity_history()              # main: etap "equity_history"
+    eq = load_equity_history("2024-01-01")
+    python src/equity_history.py --csv reports/equity.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+from datetime import datetime
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from db import get_connection, init_db
+from instrumentation import count
+from ledger import QTY_DECIMALS, state_as_of
+from trading_calendar import trading_sessions
+
+COLUMNS = ["positions_pln", "cash_pln", "flow_pln", "equity_pln"]
+
+
+def _day(value) -> str:
+    return pd.Timestamp(value).strftime("%Y-%m-%d")
+
+
+# -------------------------------------------------------------
+# Odczyt
+# -------------------------------------------------------------
+def load_equity_history(start=None, end=None) -> pd.DataFrame:
+    """Zapisana historia equity jako DataFrame [date] x COLUMNS."""
+    conn = get_connection()
+    try:
+        df = pd.read_sql(
+            "SELECT date, positions_pln, cash_pln, flow_pln, equity_pln FROM equity_history "
+            "WHERE date >= ? AND date <= ? ORDER BY date",
+            conn,
+            params=(_day(start) if start is not None else "", _day(end) if end is not None else "9999"),
+        )
+    finally:
+        conn.close()
+    df["date"] = pd.to_datetime(df["date"])
+    return df.set_index("date")
+
+
+def _last_stored_day(conn) -> str | None:
+    return conn.execute("SELECT MAX(date) FROM equity_history").fetchone()[0]
+
+
+def _first_event_day(conn) -> str | None:
+    first = conn.execute(
+        """
+        SELECT MIN(ts) FROM (
+            SELECT MIN(timestamp) AS ts FROM transactions
+            UNION ALL SELECT MIN(timestamp) FROM external_flows
+        )
+        """
+    ).fetchone()[0]
+    return str(first)[:10] if first is not None else None
+
+
+# -------------------------------------------------------------
+# Liczenie (czyste funkcje na macierzach)
+# -------------------------------------------------------------
+def _to_days(stamps: pd.Series, days: pd.DatetimeIndex) -> np.ndarray:
+    """Zdarzenie z dnia wolnego przypisujemy do najbliższej kolejnej sesji."""
+    pos = days.searchsorted(pd.to_datetime(stamps.str[:10]), side="left")
+    return np.minimum(pos, len(days) - 1)
+
+
+def _effective_changes(start_qty: pd.Series, events: pd.DataFrame) -> np.ndarray:
+    """
+    Zmiana ilości każdego zdarzenia tak, jak nakłada ją ledger.replay: SELL
+    bez pozycji nic nie zmienia, pozycja spadająca do <= 0 znika (kolejny BUY
+    startuje od zera). Przycinanie samej sumy (max(cumsum, 0)) pamiętałoby
+    nadwyżkę sprzedaży i zjadało nią późniejsze zakupy.
+    """
+    held = start_qty.to_dict()
+    out = np.zeros(len(events))
+    sides = events["side"].to_numpy()
+    qtys = events["quantity"].to_numpy(dtype=float)
+    for i, (ticker, side, q) in enumerate(zip(events["ticker"].to_numpy(), sides, qtys)):
+        cur = held.get(ticker, 0.0)
+        if side == "BUY":
+            new = round(cur + q, QTY_DECIMALS)
+        else:
+            new = round(cur - q, QTY_DECIMALS) if ticker in held else cur
+            if new <= 0:
+                new = 0.0
+                held.pop(ticker, None)
+        if new > 0:
+            held[ticker] = new
+        out[i] = new - cur
+    return out
+
+
+def compute_equity_history(
+    days: pd.DatetimeIndex,
+    start_positions: pd.DataFrame,
+    start_cash: float,
+    events: pd.DataFrame,
+    flows: pd.DataFrame,
+    prices: pd.DataFrame,
+    fx_history: pd.DataFrame,
+) -> pd.DataFrame:
+    """
+    days            : sesje do policzenia
+    start_positions : ticker | quantity | currency (stan przed days[0])
+    start_cash      : gotówka PLN przed days[0]
+    events          : transakcje w oknie: timestamp | ticker | side | quantity |
+                      currency | price_ccy | price_pln
+    flows           : wpłaty / wypłaty w oknie: timestamp | amount_pln
+    prices          : panel Close [data x ticker]
+    fx_history      : kursy [data x waluta] (USD, EUR, PLN)
+    """
+    n = len(days)
+    tickers = sorted(set(start_positions["ticker"]) | set(events["ticker"]))
+    out = pd.DataFrame(index=days, columns=COLUMNS, dtype=float)
+    out.index.name = "date"
+
+    # --- ilości: stan startowy + cumsum zmian ---
+    qty = np.zeros((n, len(tickers)))
+    col = {t: i for i, t in enumerate(tickers)}
+    start_qty = start_positions.set_index("ticker")["quantity"].astype(float)
+    qty[0, [col[t] for t in start_qty.index]] += start_qty.to_numpy()
+
+    ev_day = _to_days(events["timestamp"], days) if len(events) else np.array([], dtype=int)
+    ev_col = np.array([col[t] for t in events["ticker"]], dtype=int)
+    signed = np.where(events["side"] == "BUY", 1.0, -1.0) * events["quantity"].to_numpy(dtype=float)
+    # SELL bez pozycji (np. pozycja wpisana ręcznie) nie tworzy shortu – jak w ledger.replay
+    np.add.at(qty, (ev_day, ev_col), _effective_changes(start_qty, events))
+    qty = np.maximum(np.round(np.cumsum(qty, axis=0), QTY_DECIMALS), 0.0)
+
+    # --- gotówka: wpłaty/wypłaty i rozliczenia transakcji ---
+    flow = np.zeros(n)
+    if len(flows):
+        np.add.at(flow, _to_days(flows["timestamp"], days), flows["amount_pln"].to_numpy(dtype=float))
+    trade_cash = np.zeros(n)
+    np.add.at(trade_cash, ev_day, -signed * events["price_pln"].to_numpy(dtype=float))
+    cash = start_cash + np.cumsum(flow + trade_cash)
+
+    # --- ceny: Close, luki ffill; przed pierwszą sesją – cena z transakcji ---
+    px = prices.reindex(columns=tickers)
+    px = px.reindex(px.index.union(days)).sort_index().ffill().reindex(days)
+    if len(events):
+        trade_px = (
+            pd.DataFrame({"day": days[ev_day], "ticker": events["ticker"].to_numpy(),
+                          "px": events["price_ccy"].to_numpy(dtype=float)})
+            .groupby(["day", "ticker"])["px"].last()
+            .unstack()
+            .reindex(index=days, columns=tickers)
+            .ffill()
+        )
+        px = px.fillna(trade_px)
+    px = px.to_numpy(dtype=float)
+
+    # --- FX: kurs waluty każdego tickera na każdy dzień ---
+    ccy = pd.concat([
+        start_positions.set_index("ticker")["currency"],
+        events.set_index("ticker")["currency"],
+    ])
+    ccy = ccy[~ccy.index.duplicated(keep="last")].reindex(tickers).fillna("PLN")
+    fx = fx_history.reindex(fx_history.index.union(days)).sort_index().ffill().bfill().reindex(days)
+    fx["PLN"] = 1.0
+    fx = fx.reindex(columns=ccy.to_numpy()).fillna(1.0).to_numpy(dtype=float)
+
+    held = qty != 0
+    value = np.where(held, qty * np.nan_to_num(px) * fx, 0.0)
+    missing = held & np.isnan(px)
+    if missing.any():
+        count("equity_history.missing_price", int(missing.sum()))
+
+    out["positions_pln"] = value.sum(axis=1).round(2)
+    out["cash_pln"] = cash.round(2)
+    out["flow_pln"] = flow.round(2)
+    out["equity_pln"] = (out["positions_pln"] + out["cash_pln"]).round(2)
+    return out
+
+
+# -------------------------------------------------------------
+# Przyrostowa aktualizacja
+# -------------------------------------------------------------
+def _load_prices(tickers, start: pd.Timestamp, end: pd.Timestamp) -> Dict[str, pd.DataFrame]:
+    from run_context import RunDataContext
+
+    years = max(1, math.ceil((end - start).days / 365) + 1)
+    with RunDataContext(as_of=end, years=years) as ctx:
+        return ctx.load(tickers, strict=False, raw=True)
+
+
+def update_equity_history(
+    as_of=None,
+    price_data: Dict[str, pd.DataFrame] | None = None,
+    fx_history: pd.DataFrame | None = None,
+    rebuild: bool = False,
+) -> pd.DataFrame:
+    """
+    Dopisuje do `equity_history` dni od ostatniego zapisanego do `as_of`
+    (domyślnie dziś) i zwraca nowe wiersze.
+
+    price_data : {ticker: DataFrame} SUROWYCH cen (np. ctx.histories(..., raw=True))
+                 – brakujące tickery są doładowywane; fx_history: wynik fx.load_fx_history().
+    rebuild    : liczy całą historię od pierwszego zdarzenia.
+    """
+    end = pd.Timestamp(as_of if as_of is not None else datetime.now()).normalize()
+    conn = get_connection()
+    try:
+        if rebuild:
+            with conn:
+                conn.execute("DELETE FROM equity_history")
+        resume = _last_stored_day(conn) or _first_event_day(conn)
+        if resume is None:
+            return pd.DataFrame(columns=COLUMNS)
+
+        days = trading_sessions(resume, end)   # sesje NYSE – święta to nie dni wyceny
+        if len(days) == 0:
+            return pd.DataFrame(columns=COLUMNS)
+        before = _day(days[0] - pd.Timedelta(days=1))
+        lo, hi = _day(days[0]), _day(end + pd.Timedelta(days=1))
+
+        events = pd.read_sql(
+            "SELECT timestamp, ticker, side, quantity, currency, price_ccy, price_pln FROM transactions "
+            "WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp, id",
+            conn, params=(lo, hi),
+        )
+        flows = pd.read_sql(
+            "SELECT timestamp, amount_pln FROM external_flows WHERE timestamp >= ? AND timestamp < ?",
+            conn, params=(lo, hi),
+        )
+    finally:
+        conn.close()
+
+    start_positions, start_cash = state_as_of(before)
+    tickers = sorted(set(start_positions["ticker"]) | set(events["ticker"]))
+    count("equity_history.days", len(days))
+
+    price_data = dict(price_data or {})
+    missing = [t for t in tickers if t not in price_data]
+    if missing:
+        price_data.update(_load_prices(missing, days[0] - pd.Timedelta(days=10), end))
+    closes = {t: price_data[t]["Close"] for t in tickers if t in price_data}
+    prices = pd.DataFrame(closes).sort_index() if closes else pd.DataFrame(index=days)
+
+    if fx_history is None:
+        from fx import load_fx_history
+
+        years = max(1, math.ceil((end - days[0]).days / 365) + 1)
+        fx_history = load_fx_history(f"{years}y")
+
+    new = compute_equity_history(days, start_positions, start_cash, events, flows, prices, fx_history)
+
+    conn = get_connection()
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO equity_history (date, positions_pln, cash_pln, flow_pln, equity_pln) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(d.strftime("%Y-%m-%d"), *map(float, row)) for d, row in zip(new.index, new[COLUMNS].to_numpy())],
+            )
+    finally:
+        conn.close()
+
+    print(f"[EQUITY] Historia equity: {len(new)} dni ({days[0]:%Y-%m-%d} … {days[-1]:%Y-%m-%d}), "
+          f"ostatnio {new['equity_pln'].iloc[-1]:,.2f} PLN")
+    return new
+
+
+# -------------------------------------------------------------
+# CLI
+# -------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dzienna historia equity portfela (PLN)")
+    parser.add_argument("--as-of", default=None, help="ostatni dzień (domyślnie dziś)")
+    parser.add_argument("--rebuild", action="store_true", help="przelicz całą historię od zera")
+    parser.add_argument("--csv", default=None, help="eksport zapisanej historii do CSV")
+    args = parser.parse_args()
+
+    init_db()
+    update_equity_history(as_of=args.as_of, rebuild=args.rebuild)
+    history = load_equity_history()
+    print(history.tail(10))
+    if len(history) > 1:
+        from analytics import format_summary, summarize
+
+        stats = summarize(history[["equity_pln"]], flows=history[["flow_pln"]])
+        print("\n" + format_summary(stats.iloc[0]))
+    if args.csv:
+        history.to_csv(args.csv)
+        print(f"[EQUITY] Zapisano → {args.csv}")
@@ -1,6 +1,7 @@
-import yfinance as yf
 import pandas as pd
 
+from instrumentation import count
+
 # Ticker-y FX z yfinance
 FX_TICKERS = {
     "USD": "USDPLN=X",
@@ -14,17 +15,26 @@ FALLBACK = {
 }
 
 
-def _download_single_ccy(ccy: str, ticker: str, period: str) -> pd.Series:
-    """Pomocniczo pobiera jedną walutę, a jak się nie uda – używa fallback."""
+def _download_single_ccy(ccy: str, ticker: str, period: str, fallback: bool = True) -> pd.Series | None:
+    """Pomocniczo pobiera jedną walutę, a jak się nie uda – używa fallback (albo None)."""
     try:
+        import yfinance as yf  # dopiero przy pobieraniu (szybszy start CLI)
+
+        count("yahoo.download")
         df = yf.download(ticker, period=period, auto_adjust=True)
         if df.empty:
             raise ValueError("empty data")
         s = df["Close"].copy()
+        if isinstance(s, pd.DataFrame):  # nowsze yfinance: kolumny MultiIndex (Price, Ticker)
+            s = s.iloc[:, 0]
         s.name = ccy
         return s
     except Exception as e:
+        if not fallback:
+            print(f"[FX] ERROR dla {ticker}: {e}, zostawiam dotychczasowe kursy")
+            return None
         print(f"[FX] ERROR dla {ticker}: {e}, używam fallback={FALLBACK[ccy]}")
+        count("fx.fallback")
         return pd.Series(
             FALLBACK[ccy],
             index=pd.date_range(end=pd.Timestamp.today().normalize(), periods=1),
@@ -48,6 +58,24 @@ def load_fx_history(period: str = "10y") -> pd.DataFrame:
     return fx
 
 
+def extend_fx_history(fx: pd.DataFrame, period: str = "1mo") -> pd.DataFrame:
+    """
+    Dociąga tylko ostatnie `period` kursów do historii z load_fx_history()
+    (daemon: zamiast 10 lat co dzień). Nowe notowania nadpisują stare
+    na wspólnych datach; przy błędzie pobrania zostaje dotychczasowa historia.
+    """
+    recent = [_download_single_ccy(ccy, ticker, period, fallback=False) for ccy, ticker in FX_TICKERS.items()]
+    recent = [s for s in recent if s is not None]
+    if not recent:
+        return fx
+
+    new = pd.concat(recent, axis=1)
+    new.index = pd.DatetimeIndex(new.index).tz_localize(None) if new.index.tz is not None else new.index
+    out = new.combine_first(fx.drop(columns=["PLN"]))
+    out["PLN"] = 1.0
+    return out.ffill()
+
+
 def load_fx_row() -> pd.Series:
     """
     Zwraca OSTATNI dostępny wiersz z kursami (dzisiejszy / ostatni dzień).
@@ -57,3 +85,19 @@ def load_fx_row() -> pd.Series:
     row = fx.iloc[-1]
     row.name = "FX_TODAY"
     return row
+
+
+def fx_rates_for(currencies, fx_row: pd.Series | None = None) -> pd.Series:
+    """
+    Kursy PLN dla całej kolumny walut naraz (np. orders["currency"]).
+    Nieznana waluta / PLN → 1.0. Bez fx_row pobiera dzisiejszy wiersz.
+    """
+    if fx_row is None:
+        fx_row = load_fx_row()
+    rates = pd.Series(fx_row, dtype=float)
+    return pd.Series(list(currencies), dtype=object).map(rates).fillna(1.0).astype(float)
+
+
+def get_fx_rate(currency: str, fx_row: pd.Series | None = None) -> float:
+    """Kurs PLN jednej waluty (USD → USDPLN itd.)."""
+    return float(fx_rates_for([currency], fx_row).iloc[0])
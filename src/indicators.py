@@ -0,0 +1,329 @@
+# src/indicators.py
+
+"""
+Wspólny cache wskaźników technicznych (SMA, ROC, zmienność).
+
+Panel = DataFrame [data x ticker] z cenami zamknięcia (unia dat wszystkich
+tickerów). Krótkie luki w notowaniach są wypełniane ostatnią ceną
+(maks. FFILL_LIMIT dni), żeby pojedynczy brakujący dzień nie wyzerował
+SMA200 na kolejne 200 sesji; po delistingu wartości zostają NaN.
+
+Klucz cache: (ticker, wskaźnik, parametry). Każdy wskaźnik liczony jest
+RAZ dla całego panelu (wektorowo, wszystkie tickery naraz):
+
+    ind = IndicatorCache.from_price_data(price_data, store_dir=INDICATOR_DIR)
+    sma = ind.get("sma", window=200)              # DataFrame [data x ticker]
+    roc = ind.at("roc", as_of, periods=252)       # Series [ticker] na dzień
+    s = ind.series("AAPL", "sma", window=200)     # jeden szereg
+
+Z `store_dir` wynik jest zapisywany na dysk (pickle per wskaźnik+parametry).
+Przy kolejnym uruchomieniu, gdy doszły nowe sesje, liczony jest tylko ogon:
+ostatnie `lookback + n_nowych` wierszy panelu, a nie cała historia.
+Jeśli historia się zmieniła (np. przepisany CSV po splicie), dotknięte
+tickery są liczone od zera – zmianę wykrywa ogon źródła (ostatnie
+`lookback` wierszy, porównanie dokładne) i odcisk całej kolumny źródła
+(suma i liczba NaN w blokach po FINGERPRINT_ROWS sesji). Proces, który trzyma cache w pamięci (daemon),
+przedłuża go tak samo przez extended(nowy_panel) – bez czytania pickli.
+
+Te same funkcje (sma / roc / volatility / realized_volatility) działają
+na pojedynczym Series – używają ich strategy_a, momentum, backtesty
+i screener, żeby definicje wskaźników były w jednym miejscu.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import count
+
+FFILL_LIMIT = 5
+
+INDICATOR_DIR = Path(__file__).resolve().parent.parent / "data" / "indicators"
+
+FINGERPRINT_ROWS = 64   # sesje źródła na blok odcisku (suma + liczba NaN per ticker)
+
+
+# -------------------------------------------------------------
+# Definicje wskaźników (Series lub panel -> to samo)
+# -------------------------------------------------------------
+def close(x):
+    return x
+
+
+def sma(x, window: int = 200):
+    return x.rolling(window).mean()
+
+
+def roc(x, periods: int = 252):
+    """Rate of change jako ułamek (0.12 = +12%)."""
+    return x / x.shift(periods) - 1.0
+
+
+def volatility(x, window: int = 252):
+    """Roczna zmienność log-zwrotów w kroczącym oknie `window`."""
+    return np.log(x).diff().rolling(window).std() * np.sqrt(252)
+
+
+def realized_volatility(x, min_obs: int = 2, log: bool = True):
+    """
+    Roczna zmienność z CAŁEJ próbki (nie krocząca).
+    Dla panelu liczy wszystkie kolumny naraz; kolumny z mniej niż
+    `min_obs` cenami dostają NaN.
+    """
+    rets = np.log(x).diff() if log else x.pct_change()
+    vol = rets.std() * np.sqrt(252)
+    if isinstance(x, pd.DataFrame):
+        return vol.where(x.count() >= min_obs)
+    return vol if x.count() >= min_obs else np.nan
+
+
+# nazwa -> (funkcja, ile wierszy historii potrzeba do policzenia ostatniego punktu)
+INDICATORS: Dict[str, tuple[Callable, Callable[..., int]]] = {
+    "close": (close, lambda: 1),
+    "sma": (sma, lambda window=200: window),
+    "roc": (roc, lambda periods=252: periods + 1),
+    "volatility": (volatility, lambda window=252: window + 1),
+}
+
+
+def close_panel(price_data: Dict[str, pd.DataFrame], column: str = "Close") -> pd.DataFrame:
+    """{ticker: DataFrame} -> wyrównany panel [data x ticker] z kolumny `column`."""
+    if not price_data:
+        return pd.DataFrame()
+    panel = pd.DataFrame({t: df[column] for t, df in price_data.items() if df is not None and not df.empty})
+    panel = panel.sort_index()
+    return panel.ffill(limit=FFILL_LIMIT)
+
+
+# -------------------------------------------------------------
+# Odcisk źródła: czy zapisany wynik liczono z tej samej historii
+# -------------------------------------------------------------
+def _block_sums(values: np.ndarray, starts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    nan = np.isnan(values)
+    return (np.add.reduceat(np.where(nan, 0.0, values), starts, axis=0),
+            np.add.reduceat(nan.astype(np.int64), starts, axis=0))
+
+
+def _fingerprint(source: pd.DataFrame) -> dict:
+    """Suma i liczba NaN per ticker w blokach po FINGERPRINT_ROWS wierszy całego źródła."""
+    n = len(source.index)
+    starts = np.arange(0, n, FINGERPRINT_ROWS)
+    k = len(source.columns)
+    if n:
+        sums, nans = _block_sums(source.to_numpy(dtype=float), starts)
+    else:
+        sums, nans = np.zeros((0, k)), np.zeros((0, k), dtype=np.int64)
+    return {
+        "columns": list(source.columns),
+        "start": source.index[starts],
+        "end": source.index[np.minimum(starts + FINGERPRINT_ROWS, n) - 1],
+        "sum": sums,
+        "nan": nans,
+    }
+
+
+def _unchanged(fingerprint: dict | None, panel: pd.DataFrame, tickers: list) -> np.ndarray:
+    """
+    Maska [ticker]: bloki odcisku leżące w całości w panelu zgadzają się
+    z panelem. Bloki sprzed początku panelu (okno się przesunęło) pomijamy –
+    tak jak same wiersze cache sprzed okna.
+    """
+    if fingerprint is None or not len(panel.index):
+        return np.zeros(len(tickers), dtype=bool)
+    pos = {t: j for j, t in enumerate(fingerprint["columns"])}
+    known = np.array([t in pos for t in tickers], dtype=bool)
+    cols = [pos.get(t, 0) for t in tickers]
+
+    inside = (fingerprint["start"] >= panel.index[0]) & (fingerprint["end"] <= panel.index[-1])
+    if not inside.any():
+        return known
+    lo = panel.index.searchsorted(fingerprint["start"][inside])
+    hi = panel.index.searchsorted(fingerprint["end"][inside][-1], side="right")
+    sums, nans = _block_sums(panel[tickers].to_numpy(dtype=float)[:hi], lo)
+    same = (np.isclose(sums, fingerprint["sum"][inside][:, cols], rtol=1e-10).all(axis=0)
+            & (nans == fingerprint["nan"][inside][:, cols]).all(axis=0))
+    return known & same
+
+
+# -------------------------------------------------------------
+# Cache
+# -------------------------------------------------------------
+class IndicatorCache:
+    def __init__(self, panel: pd.DataFrame, store_dir: str | Path | None = None):
+        self.panel = panel
+        self.store_dir = Path(store_dir) if store_dir is not None else None
+        self._cache: Dict[tuple, pd.DataFrame] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_price_data(
+        cls,
+        price_data: Dict[str, pd.DataFrame],
+        column: str = "Close",
+        store_dir: str | Path | None = None,
+    ) -> "IndicatorCache":
+        return cls(close_panel(price_data, column), store_dir=store_dir)
+
+    @staticmethod
+    def _key(indicator: str, params: dict) -> tuple:
+        return (indicator, tuple(sorted(params.items())))
+
+    def _path(self, key: tuple) -> Path:
+        indicator, params = key
+        suffix = "_".join(f"{k}={v}" for k, v in params)
+        return self.store_dir / (f"{indicator}_{suffix}.pkl" if suffix else f"{indicator}.pkl")
+
+    # ---------------------------------------------------------
+    # Liczenie: pełne / przyrostowe
+    # ---------------------------------------------------------
+    def _compute(self, key: tuple, panel: pd.DataFrame) -> pd.DataFrame:
+        fn, _ = INDICATORS[key[0]]
+        return fn(panel, **dict(key[1]))
+
+    def _extend(self, key: tuple, stored: dict) -> pd.DataFrame:
+        """
+        Uzupełnia zapisany wynik o nowe wiersze panelu i nowe tickery.
+        Zwraca pełny panel wskaźnika dopasowany do self.panel.
+        """
+        panel = self.panel
+        cached: pd.DataFrame = stored["values"]
+        source_tail: pd.DataFrame = stored["source_tail"]
+        _, lookback_fn = INDICATORS[key[0]]
+        lookback = lookback_fn(**dict(key[1]))
+
+        # 1. historia musi być prefiksem panelu, a źródło bez zmian: ogon dokładnie,
+        #    cała kolumna przez odcisk (okno silnika przesuwa się co dzień – starsze
+        #    wiersze cache pomijamy, ich wartości na początku okna są nawet
+        #    pełniejsze niż liczone od zera)
+        if len(panel.index):
+            cached = cached.loc[cached.index >= panel.index[0]]
+        n_old = len(cached.index)
+        if n_old == 0 or n_old > len(panel.index) or not panel.index[:n_old].equals(cached.index):
+            count("indicator_cache.miss")
+            return self._compute(key, panel)
+
+        common = [t for t in cached.columns if t in panel.columns]
+        old_src = source_tail[common]
+        new_src = panel.loc[old_src.index, common]
+        same = np.isclose(old_src.to_numpy(), new_src.to_numpy(), rtol=1e-10, equal_nan=True).all(axis=0)
+        same &= _unchanged(stored.get("fingerprint"), panel, common)
+        valid = [t for t, ok in zip(common, same) if ok]
+        stale = [t for t in panel.columns if t not in valid]
+
+        # 2. nowe wiersze dla poprawnych tickerów – tylko ogon panelu
+        out = cached[valid]
+        n_new = len(panel.index) - n_old
+        if n_new > 0 and valid:
+            tail = panel[valid].iloc[max(0, n_old - lookback):]
+            out = pd.concat([out, self._compute(key, tail).iloc[-n_new:]])
+            count("indicator_cache.extend")
+        elif valid:
+            count("indicator_cache.hit")
+
+        # 3. nowe / zmienione tickery – od zera
+        if stale:
+            count("indicator_cache.miss")
+            out = pd.concat([out, self._compute(key, panel[stale])], axis=1)
+
+        return out.reindex(index=panel.index, columns=panel.columns)
+
+    def _load_or_compute(self, key: tuple) -> pd.DataFrame:
+        if self.store_dir is None:
+            count("indicator_cache.miss")
+            return self._compute(key, self.panel)
+
+        path = self._path(key)
+        if path.exists():
+            try:
+                out = self._extend(key, pd.read_pickle(path))
+            except Exception as exc:
+                print(f"[indicators] Nie udało się wczytać {path.name}: {exc} – liczę od zera.")
+                count("indicator_cache.miss")
+                out = self._compute(key, self.panel)
+        else:
+            count("indicator_cache.miss")
+            out = self._compute(key, self.panel)
+
+        self._save(key, out)
+        return out
+
+    def _save(self, key: tuple, values: pd.DataFrame) -> None:
+        _, lookback_fn = INDICATORS[key[0]]
+        lookback = lookback_fn(**dict(key[1]))
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp = path.with_suffix(".tmp")
+        pd.to_pickle(
+            {"values": values, "source_tail": self.panel.iloc[-lookback:],
+             "fingerprint": _fingerprint(self.panel)},
+            tmp,
+        )
+        os.replace(tmp, path)
+
+    def extended(self, panel: pd.DataFrame) -> "IndicatorCache":
+        """
+        Cache dla nowego panelu (te same tickery + dopisane sesje): wskaźniki
+        policzone już w pamięci są przedłużane o ogon jak przy odczycie
+        z dysku (_extend), reszta liczy się przy pierwszym get().
+        """
+        out = IndicatorCache(panel, store_dir=self.store_dir)
+        with self._lock:
+            cached = dict(self._cache)
+        fingerprint = _fingerprint(self.panel) if cached else None
+        for key, values in cached.items():
+            _, lookback_fn = INDICATORS[key[0]]
+            stored = {"values": values, "source_tail": self.panel.iloc[-lookback_fn(**dict(key[1])):],
+                      "fingerprint": fingerprint}
+            out._cache[key] = out._extend(key, stored)
+            if out.store_dir is not None:
+                out._save(key, out._cache[key])
+        return out
+
+    # ---------------------------------------------------------
+    # Publiczne API
+    # ---------------------------------------------------------
+    def get(self, indicator: str, **params) -> pd.DataFrame:
+        """Cały panel wskaźnika [data x ticker] (liczony raz na parametry)."""
+        if indicator not in INDICATORS:
+            raise ValueError(f"Nieznany wskaźnik '{indicator}'. Dostępne: {sorted(INDICATORS)}")
+        key = self._key(indicator, params)
+        with self._lock:
+            out = self._cache.get(key)
+            if out is None:
+                out = self._load_or_compute(key)
+                self._cache[key] = out
+        return out
+
+    def series(self, ticker: str, indicator: str, **params) -> pd.Series:
+        """Szereg wskaźnika dla jednego tickera."""
+        return self.get(indicator, **params)[ticker]
+
+    def at(
+        self,
+        indicator: str,
+        as_of: pd.Timestamp | str | None = None,
+        tickers: Iterable[str] | None = None,
+        **params,
+    ) -> pd.Series:
+        """
+        Wartości wskaźnika na dzień `as_of` (ostatni wiersz <= as_of;
+        domyślnie ostatni wiersz panelu) jako Series [ticker].
+        Tickery spoza panelu dostają NaN.
+        """
+        df = self.get(indicator, **params)
+        if df.empty:
+            row = pd.Series(dtype=float)
+        elif as_of is None:
+            row = df.iloc[-1]
+        else:
+            pos = df.index.searchsorted(pd.to_datetime(as_of), side="right") - 1
+            row = df.iloc[pos] if pos >= 0 else pd.Series(np.nan, index=df.columns)
+        if tickers is not None:
+            row = row.reindex(list(tickers))
+        return row
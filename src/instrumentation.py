@@ -0,0 +1,325 @@
+# src/instrumentation.py
+
+"""
+Lekka instrumentacja silnika: spany (czas ściany, CPU, pamięć),
+liczniki (np. trafienia cache) i raport JSON z przebiegu.
+
+Użycie:
+    from instrumentation import span, timed, count
+
+    with span("regime") as s:
+        spy_df = load_price_history("SPY")
+        s.rows = len(spy_df)
+
+    @timed("momentum")
+    def compute(...): ...
+
+    count("price_store.hit")
+
+Bez wywołania start_run() spany i tak się liczą (koszt: kilka
+wywołań time.*), ale raport trzeba zapisać ręcznie: write_report().
+
+Tryby opcjonalne (start_run):
+  - trace_memory=True → tracemalloc, szczytowa pamięć Pythona per span,
+  - profile=True      → cProfile całego przebiegu (plik .prof + top funkcji).
+
+Etapy równoległe (stage_graph, max_workers > 1):
+  - liczniki span zbiera przez stos spanów własnego wątku, więc zliczenia
+    z równoległych etapów nie mieszają się; zliczenia z wątków bez
+    otwartego spanu (np. pula RunDataContext) trafiają tylko do sumy przebiegu,
+  - tracemalloc mierzy cały proces: span, który nakładał się na span innego
+    wątku, ma peak_mem_scope="process" (szczyt procesu w czasie trwania
+    spanu), a nie "span".
+
+Bez tracemalloc raportujemy tylko szczytowe RSS procesu (ru_maxrss).
+Tylko biblioteka standardowa – moduł można importować wszędzie.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import functools
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPORTS_DIR = Path(__file__).resolve().parent.parent / "reports"
+
+
+class Span:
+    """Pojedynczy pomiar. Pola rows / attrs można ustawiać wewnątrz `with`."""
+
+    __slots__ = (
+        "name", "parent", "depth", "thread", "start_offset_s", "wall_s", "cpu_s",
+        "peak_mem_kb", "peak_mem_scope", "rss_peak_kb", "rows", "attrs", "counters",
+        "_t0", "_c0", "_peak", "_shared",
+    )
+
+    def __init__(self, name: str, parent: str | None, depth: int, attrs: dict):
+        self.name = name
+        self.parent = parent
+        self.depth = depth
+        self.thread = threading.current_thread().name
+        self.rows = None
+        self.attrs = dict(attrs)
+        self.counters: dict = {}
+        self.wall_s = self.cpu_s = None
+        self.peak_mem_kb = self.rss_peak_kb = self.peak_mem_scope = None
+        self.start_offset_s = None
+        self._peak = 0
+        self._shared = False
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "parent": self.parent,
+            "depth": self.depth,
+            "thread": self.thread,
+            "start_offset_s": _r(self.start_offset_s),
+            "wall_s": _r(self.wall_s),
+            "cpu_s": _r(self.cpu_s),
+            "peak_mem_kb": self.peak_mem_kb,
+            "peak_mem_scope": self.peak_mem_scope,
+            "rss_peak_kb": self.rss_peak_kb,
+            "rows": self.rows,
+            "counters": self.counters,
+            "attrs": self.attrs,
+        }
+
+
+def _r(x):
+    return None if x is None else round(x, 6)
+
+
+class RunRecorder:
+    """Zbiera spany i liczniki jednego przebiegu (bezpieczne wątkowo)."""
+
+    def __init__(self, name: str = "run"):
+        self.name = name
+        self.started = datetime.now()
+        self._t0 = time.perf_counter()
+        self._c0 = time.process_time()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.spans: list[Span] = []
+        self._open: list[Span] = []  # otwarte spany wszystkich wątków
+        self.counters: Counter = Counter()
+        self.trace_memory = False
+        self.peak_mem = 0
+        self.profiler: cProfile.Profile | None = None
+
+    # --- stos spanów per wątek ---
+    def _stack(self) -> list:
+        st = getattr(self._local, "stack", None)
+        if st is None:
+            st = self._local.stack = []
+        return st
+
+    def open(self, name: str, attrs: dict) -> Span:
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        s = Span(name, parent.name if parent else None, len(stack), attrs)
+
+        with self._lock:
+            self._open.append(s)
+            if len({o.thread for o in self._open}) > 1:
+                for o in self._open:
+                    o._shared = True
+            if self.trace_memory and tracemalloc.is_tracing():
+                # reset_peak jest globalny: dotychczasowy szczyt należy do WSZYSTKICH
+                # otwartych spanów (nadrzędnych i z innych wątków)
+                peak = tracemalloc.get_traced_memory()[1]
+                for o in self._open:
+                    o._peak = max(o._peak, peak)
+                s._peak = 0
+                tracemalloc.reset_peak()
+        s.start_offset_s = time.perf_counter() - self._t0
+        s._t0 = time.perf_counter()
+        s._c0 = time.thread_time()
+        stack.append(s)
+        return s
+
+    def close(self, s: Span) -> None:
+        s.wall_s = time.perf_counter() - s._t0
+        s.cpu_s = time.thread_time() - s._c0
+
+        stack = self._stack()
+        if stack and stack[-1] is s:
+            stack.pop()
+
+        with self._lock:
+            self._open.remove(s)
+            if self.trace_memory and tracemalloc.is_tracing():
+                peak = max(s._peak, tracemalloc.get_traced_memory()[1])
+                s.peak_mem_kb = round(peak / 1024, 1)
+                s.peak_mem_scope = "process" if s._shared else "span"
+                self.peak_mem = max(self.peak_mem, peak)
+                if stack:
+                    stack[-1]._peak = max(stack[-1]._peak, peak)
+            self.spans.append(s)
+        if resource is not None:
+            s.rss_peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    def count(self, key: str, n: int = 1) -> None:
+        """Licznik przebiegu + liczniki otwartych spanów bieżącego wątku."""
+        stack = self._stack()
+        with self._lock:
+            self.counters[key] += n
+            for s in stack:
+                s.counters[key] = s.counters.get(key, 0) + n
+
+    # --- raport ---
+    def cache_hit_rates(self) -> dict:
+        """Dla liczników '<prefix>.hit' / '<prefix>.miss' zwraca hit rate."""
+        rates = {}
+        prefixes = {k.rsplit(".", 1)[0] for k in self.counters if k.endswith((".hit", ".miss"))}
+        for p in sorted(prefixes):
+            hit, miss = self.counters.get(f"{p}.hit", 0), self.counters.get(f"{p}.miss", 0)
+            rates[p] = {"hit": hit, "miss": miss, "hit_rate": round(hit / (hit + miss), 4) if hit + miss else None}
+        return rates
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start_offset_s)
+            return {
+                "run": self.name,
+                "started": self.started.isoformat(timespec="seconds"),
+                "wall_s": _r(time.perf_counter() - self._t0),
+                "cpu_s": _r(time.process_time() - self._c0),
+                "trace_memory": self.trace_memory,
+                "spans": [s.to_dict() for s in spans],
+                "counters": dict(self.counters),
+                "cache_hit_rates": self.cache_hit_rates(),
+            }
+
+
+_RECORDER = RunRecorder()
+
+
+# -------------------------------------------------------------
+# Publiczne API
+# -------------------------------------------------------------
+def start_run(name: str = "run", profile: bool = False, trace_memory: bool = False) -> RunRecorder:
+    """Rozpoczyna nowy przebieg (czyści spany i liczniki)."""
+    global _RECORDER
+    _RECORDER = RunRecorder(name)
+
+    if trace_memory:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _RECORDER.trace_memory = True
+
+    if profile:
+        _RECORDER.profiler = cProfile.Profile()
+        _RECORDER.profiler.enable()
+
+    return _RECORDER
+
+
+def current_run() -> RunRecorder:
+    return _RECORDER
+
+
+def current_span() -> Span | None:
+    """Najgłębszy otwarty span w bieżącym wątku (np. żeby ustawić rows)."""
+    stack = _RECORDER._stack()
+    return stack[-1] if stack else None
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Mierzy blok kodu. Zwraca Span – można ustawić s.rows / s.attrs[...]."""
+    s = _RECORDER.open(name, attrs)
+    try:
+        yield s
+    finally:
+        _RECORDER.close(s)
+
+
+def timed(name: str | None = None):
+    """Dekorator: każde wywołanie funkcji to osobny span."""
+    def deco(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def count(key: str, n: int = 1) -> None:
+    """Zwiększa licznik (np. 'price_store.hit', 'price_store.miss')."""
+    _RECORDER.count(key, n)
+
+
+def write_report(path: str | Path | None = None, top_n: int = 30) -> Path:
+    """
+    Kończy przebieg i zapisuje raport JSON (domyślnie reports/run_<ts>.json).
+    W trybie profile obok zapisuje plik .prof, a top funkcji trafia do JSON.
+    """
+    rec = _RECORDER
+    report = rec.to_dict()
+
+    if path is None:
+        path = REPORTS_DIR / f"{rec.name}_{rec.started:%Y%m%d_%H%M%S}.json"
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    if rec.profiler is not None:
+        rec.profiler.disable()
+        prof_path = path.with_suffix(".prof")
+        rec.profiler.dump_stats(str(prof_path))
+        buf = io.StringIO()
+        pstats.Stats(rec.profiler, stream=buf).sort_stats("cumulative").print_stats(top_n)
+        report["profile"] = {"file": str(prof_path), "top_cumulative": buf.getvalue()}
+        rec.profiler = None
+
+    if rec.trace_memory and tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        peak = max(peak, rec.peak_mem)
+        report["tracemalloc"] = {"current_kb": round(current / 1024, 1), "peak_kb": round(peak / 1024, 1)}
+        tracemalloc.stop()
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=str)
+
+    return path
+
+
+def format_summary(report: dict | None = None) -> str:
+    """Krótka tabelka spanów najwyższego poziomu do wypisania na konsolę."""
+    report = report or _RECORDER.to_dict()
+    mem = report.get("trace_memory", False)
+    lines = [f"{'stage':<24} {'wall[s]':>9} {'cpu[s]':>9} {'rows':>9}" + (f" {'peak[MB]':>10}" if mem else "")]
+    shared = False
+    for s in report["spans"]:
+        if s["depth"] != 0:
+            continue
+        rows = "" if s["rows"] is None else s["rows"]
+        line = f"{s['name']:<24} {s['wall_s']:>9.3f} {s['cpu_s']:>9.3f} {rows:>9}"
+        if mem and s.get("peak_mem_kb") is not None:
+            process = s.get("peak_mem_scope") == "process"
+            shared |= process
+            line += f" {s['peak_mem_kb'] / 1024:>9.1f}{'*' if process else ' '}"
+        lines.append(line)
+    lines.append(f"{'TOTAL':<24} {report['wall_s']:>9.3f} {report['cpu_s']:>9.3f}")
+    if shared:
+        lines.append("* szczyt pamięci procesu w czasie trwania etapu (etapy równoległe)")
+    for p, r in report["cache_hit_rates"].items():
+        if r["hit_rate"] is not None:
+            lines.append(f"[cache] {p}: hit_rate={r['hit_rate']:.0%} ({r['hit']}/{r['hit'] + r['miss']})")
+    return "\n".join(lines)
@@ -0,0 +1,238 @@
+# src/ledger.py
+
+"""
+Ledger portfela (event sourcing) z okresowymi snapshotami pozycji.
+
+Zdarzenia to tabele `transactions` (BUY / SELL) oraz wpłaty / wypłaty
+(`contributions` + `cash_flows`, widok `external_flows`) – tylko
+dopisywane, nigdy nadpisywane. `portfolio_positions` jest jedynie
+bieżącą projekcją ledgera (stan "na teraz").
+
+Stan na dowolną datę historyczną:
+  1. najbliższy snapshot <= data (ledger_snapshots + position_snapshots),
+  2. odtworzenie TYLKO zdarzeń po snapshocie (snapshot_date < dzień <= data).
+
+Snapshoty materializujemy na koniec każdego okresu (SNAPSHOT_FREQ,
+domyślnie miesiąc), więc zapytanie historyczne odtwarza najwyżej jeden
+okres zdarzeń – koszt nie rośnie razem z logiem transakcji.
+Zapis zdarzenia z datą wsteczną usuwa snapshoty od tej daty
+(db.invalidate_snapshots), a ensure_snapshots() odbudowuje je przyrostowo.
+
+    ensure_snapshots()                      # po zapisie zleceń (main: etap "ledger")
+    pos = positions_as_of("2024-06-15")     # ticker | quantity | currency | avg_price_*
+    cash = cash_as_of("2024-06-15")
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+from db import get_connection
+from instrumentation import count
+
+SNAPSHOT_FREQ = "ME"
+
+QTY_DECIMALS = 4
+
+POSITION_COLUMNS = ["ticker", "quantity", "currency", "avg_price_ccy", "avg_price_pln"]
+
+
+def _day(value) -> str:
+    return pd.Timestamp(value).strftime("%Y-%m-%d")
+
+
+def _next_day(day: str) -> str:
+    return (pd.Timestamp(day) + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+# -------------------------------------------------------------
+# Odczyt: snapshot + zdarzenia po nim
+# -------------------------------------------------------------
+def _load_snapshot(conn, as_of: str) -> Tuple[str | None, int, pd.DataFrame, float]:
+    """Najbliższy snapshot <= as_of → (data, last_txn_id, pozycje, gotówka)."""
+    row = conn.execute(
+        """
+        SELECT snapshot_date, last_txn_id, cash_pln FROM ledger_snapshots
+        WHERE snapshot_date <= ? ORDER BY snapshot_date DESC LIMIT 1
+        """,
+        (as_of,),
+    ).fetchone()
+    if row is None:
+        return None, 0, pd.DataFrame(columns=POSITION_COLUMNS), 0.0
+
+    snap_date, last_id, cash = row
+    positions = pd.read_sql(
+        f"SELECT {', '.join(POSITION_COLUMNS)} FROM position_snapshots WHERE snapshot_date = ?",
+        conn, params=(snap_date,),
+    )
+    return snap_date, last_id or 0, positions, float(cash or 0.0)
+
+
+def _events(conn, after: str | None, until: str) -> pd.DataFrame:
+    """Transakcje z dniem w (after, until], w kolejności zapisu."""
+    lo = _next_day(after) if after else ""
+    return pd.read_sql(
+        """
+        SELECT id, timestamp, ticker, side, quantity, currency, price_ccy, price_pln
+        FROM transactions
+        WHERE timestamp >= ? AND timestamp < ?
+        ORDER BY timestamp, id
+        """,
+        conn, params=(lo, _next_day(until)),
+    )
+
+
+def _contributed(conn, after: str | None, until: str) -> float:
+    lo = _next_day(after) if after else ""
+    return float(conn.execute(
+        "SELECT COALESCE(SUM(amount_pln), 0) FROM external_flows WHERE timestamp >= ? AND timestamp < ?",
+        (lo, _next_day(until)),
+    ).fetchone()[0])
+
+
+# -------------------------------------------------------------
+# Odtwarzanie zdarzeń
+# -------------------------------------------------------------
+def replay(positions: pd.DataFrame, events: pd.DataFrame, cash_pln: float = 0.0) -> Tuple[pd.DataFrame, float]:
+    """
+    Nakłada zdarzenia (BUY / SELL) na stan `positions` – tą samą logiką co
+    trade_engine: średnia cena ważona przy BUY, bez zmian przy SELL,
+    pozycja z ilością <= 0 znika. Zwraca (pozycje, gotówka po transakcjach).
+    """
+    state: Dict[str, dict] = {r["ticker"]: dict(r) for r in positions.to_dict("records")}
+
+    for ev in events.itertuples(index=False):
+        qty = float(ev.quantity)
+        pos = state.get(ev.ticker)
+        if ev.side == "BUY":
+            cash_pln -= qty * ev.price_pln
+            if pos is None:
+                state[ev.ticker] = {
+                    "ticker": ev.ticker, "quantity": qty, "currency": ev.currency,
+                    "avg_price_ccy": ev.price_ccy, "avg_price_pln": ev.price_pln,
+                }
+                continue
+            new_qty = pos["quantity"] + qty
+            pos["avg_price_ccy"] = (pos["quantity"] * pos["avg_price_ccy"] + qty * ev.price_ccy) / new_qty
+            pos["avg_price_pln"] = (pos["quantity"] * pos["avg_price_pln"] + qty * ev.price_pln) / new_qty
+            pos["quantity"] = round(new_qty, QTY_DECIMALS)
+        else:
+            cash_pln += qty * ev.price_pln
+            if pos is None:
+                continue
+            pos["quantity"] = round(pos["quantity"] - qty, QTY_DECIMALS)
+            if pos["quantity"] <= 0:
+                del state[ev.ticker]
+
+    out = pd.DataFrame(list(state.values()), columns=POSITION_COLUMNS)
+    return out.sort_values("ticker").reset_index(drop=True), cash_pln
+
+
+def state_as_of(as_of=None) -> Tuple[pd.DataFrame, float]:
+    """(pozycje, gotówka PLN) na koniec dnia `as_of` (domyślnie dziś)."""
+    day = _day(as_of if as_of is not None else datetime.now())
+    conn = get_connection()
+    try:
+        snap_date, _, positions, cash = _load_snapshot(conn, day)
+        count("ledger.snapshot.hit" if snap_date else "ledger.snapshot.miss")
+        events = _events(conn, snap_date, day)
+        cash += _contributed(conn, snap_date, day)
+    finally:
+        conn.close()
+
+    count("ledger.replayed_events", len(events))
+    positions, cash = replay(positions, events, cash)
+    return positions, round(cash, 2)
+
+
+def positions_as_of(as_of=None) -> pd.DataFrame:
+    """Pozycje na koniec dnia `as_of`: ticker | quantity | currency | avg_price_ccy | avg_price_pln."""
+    return state_as_of(as_of)[0]
+
+
+def cash_as_of(as_of=None) -> float:
+    """Gotówka PLN (wpłaty/wypłaty - zakupy + sprzedaże) na koniec dnia `as_of`."""
+    return state_as_of(as_of)[1]
+
+
+# -------------------------------------------------------------
+# Materializacja snapshotów
+# -------------------------------------------------------------
+def ensure_snapshots(until=None, freq: str = SNAPSHOT_FREQ) -> List[str]:
+    """
+    Dopisuje brakujące snapshoty na końce okresów <= until (domyślnie dziś).
+    Każdy kolejny snapshot powstaje z poprzedniego + zdarzeń z jednego okresu,
+    więc po przerwie (albo invalidacji) całość jest odbudowywana jednym przejściem.
+    Zwraca listę dat utworzonych snapshotów.
+    """
+    until = _day(until if until is not None else datetime.now())
+    conn = get_connection()
+    created: List[str] = []
+    try:
+        last = conn.execute("SELECT MAX(snapshot_date) FROM ledger_snapshots").fetchone()[0]
+        if last is None:
+            first = conn.execute(
+                """
+                SELECT MIN(ts) FROM (
+                    SELECT MIN(timestamp) AS ts FROM transactions
+                    UNION ALL SELECT MIN(timestamp) FROM external_flows
+                )
+                """
+            ).fetchone()[0]
+            if first is None:
+                return created
+            start = _day(str(first)[:10])
+        else:
+            start = _next_day(last)
+
+        period_ends = [_day(d) for d in pd.date_range(start, until, freq=freq)]
+        if not period_ends:
+            return created
+
+        snap_date, _, positions, cash = _load_snapshot(conn, last) if last else (None, 0, None, 0.0)
+        if positions is None:
+            positions = pd.DataFrame(columns=POSITION_COLUMNS)
+
+        with conn:
+            for end in period_ends:
+                events = _events(conn, snap_date, end)
+                cash += _contributed(conn, snap_date, end)
+                positions, cash = replay(positions, events, cash)
+                last_id = conn.execute(
+                    "SELECT COALESCE(MAX(id), 0) FROM transactions WHERE timestamp < ?", (_next_day(end),)
+                ).fetchone()[0]
+
+                conn.execute(
+                    "INSERT OR REPLACE INTO ledger_snapshots (snapshot_date, last_txn_id, cash_pln, created_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (end, last_id, round(cash, 2), datetime.now().isoformat(timespec="seconds")),
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO position_snapshots "
+                    "(snapshot_date, ticker, quantity, currency, avg_price_ccy, avg_price_pln) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(end, *r) for r in positions[POSITION_COLUMNS].itertuples(index=False)],
+                )
+                snap_date = end
+                created.append(end)
+    finally:
+        conn.close()
+
+    if created:
+        print(f"[LEDGER] Snapshoty: +{len(created)} ({created[0]} … {created[-1]})")
+    return created
+
+
+def rebuild_snapshots(until=None, freq: str = SNAPSHOT_FREQ) -> List[str]:
+    """Usuwa wszystkie snapshoty i odtwarza je z pełnego ledgera."""
+    conn = get_connection()
+    try:
+        with conn:
+            conn.execute("DELETE FROM position_snapshots")
+            conn.execute("DELETE FROM ledger_snapshots")
+    finally:
+        conn.close()
+    return ensure_snapshots(until=until, freq=freq)
@@ -1,16 +1,21 @@
 from datetime import datetime
+import argparse
 import traceback
 
-from data_loader import load_price_history
-from fx import load_fx_row
-from strategy_a import compute_regime
-from momentum import compute_top5_momentum
+from run_context import RunDataContext
+from indicators import IndicatorCache, INDICATOR_DIR, close_panel
+from fx import extend_fx_history, load_fx_history
+from daily_state import market_regime, momentum_ranking
+from momentum import top_tickers
 from universe import load_universe
-from db import init_db
+from db import init_db, use_database
+from ledger import ensure_snapshots
+from equity_history import update_equity_history
 
 from portfolio_storage import (
     load_positions,
     estimate_total_equity,
+    estimate_cash_pln,
     record_contribution,
 )
 
@@ -23,158 +28,379 @@ from portfolio import (
 from trade_engine import buy_according_to_allocation
 
 from contribution import check_contribution_day
+# dzień rebalancingu: 10-ty albo najbliższa kolejna sesja NYSE (święta też)
+from trading_calendar import is_rebalance_day
 
-
-# ============================================================
-# Helper – czy dziś dzień rebalancingu?
-# 10-ty dzień miesiąca, jeśli to dzień roboczy
-# ============================================================
-def is_rebalance_day(today: datetime) -> bool:
-    if today.day != 10:
-        return False
-    # weekend (5 = sobota, 6 = niedziela)
-    if today.weekday() >= 5:
-        return False
-    return True
+from instrumentation import current_span, span, start_run, write_report, format_summary
+from stage_graph import StageGraph
+from portfolio_config import PortfolioSpec, load_portfolios
 
 
 # ============================================================
 # MAIN ENGINE
 # ============================================================
-def main():
-    print("\n=== Momentum Portfolio Engine v2 (synchronizacja DB) ===\n")
-
-    today_dt = datetime.now()
-    today = today_dt.strftime("%Y-%m-%d")
-    print(f"[INFO] Today: {today}\n")
-
-    # inicjalizacja bazy (tabele, jeśli brak)
-    init_db()
-    print("[DB] SQLite portfolio database initialized.\n")
+def main(profile: bool = False, trace_memory: bool = False, max_workers: int = 4,
+         portfolios_config: str | None = None):
+    """
+    Uruchamia silnik. Każdy etap raportuje do instrumentation
+    (czas, CPU, pamięć, liczba wierszy, trafienia cache), a na końcu
+    zapisujemy raport JSON do reports/engine_<ts>.json.
+
+    profile=True      → dodatkowo cProfile (plik .prof obok raportu)
+    trace_memory=True → tracemalloc (szczytowa pamięć per etap)
+    max_workers       → ile etapów może biec równolegle (1 = sekwencyjnie)
+    portfolios_config → plik JSON z wieloma portfelami (portfolio_config.py):
+                        dane rynkowe raz, sell/buy osobno dla każdej księgi
+    """
+    start_run("engine", profile=profile, trace_memory=trace_memory)
+    try:
+        print("\n=== Momentum Portfolio Engine v2 (synchronizacja DB) ===\n")
+
+        today_dt = datetime.now()
+        print(f"[INFO] Today: {today_dt:%Y-%m-%d}\n")
+
+        with RunDataContext(as_of=today_dt) as ctx:
+            if portfolios_config:
+                run_portfolios(today_dt, ctx, load_portfolios(portfolios_config), max_workers=max_workers)
+            else:
+                build_engine_graph(today_dt, ctx).run(max_workers=max_workers)
+        print("\n=== ENGINE COMPLETE ===\n")
+    finally:
+        report_path = write_report()
+        print("\n[PERF] Podsumowanie etapów:")
+        print(format_summary())
+        print(f"[PERF] Raport → {report_path}\n")
+
+
+def run_portfolios(today_dt: datetime, ctx: RunDataContext, specs, max_workers: int = 4,
+                   warm: dict | None = None) -> dict:
+    """
+    Tryb wielu portfeli: regime, ceny, ranking momentum, wskaźniki i FX
+    liczone RAZ (build_market_graph), potem dla każdego portfela osobny
+    graf sell → buy → ledger → equity_history na jego własnej księdze.
+
+    Portfele idą po kolei (use_database przełącza globalną ścieżkę DB);
+    równolegle biegną tylko wspólne pobrania. Zwraca {nazwa: wyniki etapów}.
+    """
+    for spec in specs:
+        print(f"[PORTFOLIOS] {spec}")
+    print()
+
+    market = build_market_graph(today_dt, ctx, specs, warm=warm).run(max_workers=max_workers)
+
+    results = {}
+    for spec in specs:
+        print(f"\n=== PORTFEL {spec.name} ({spec.db}) ===\n")
+        with use_database(spec.db), span(f"portfolio:{spec.name}"):
+            results[spec.name] = build_portfolio_graph(today_dt, ctx, spec).run(max_workers=1, inputs=market)
+    return results
+
+
+def build_engine_graph(today_dt: datetime, ctx: RunDataContext, spec: PortfolioSpec | None = None,
+                       warm: dict | None = None) -> StageGraph:
+    """
+    Graf etapów silnika (jeden portfel):
+
+        init_db ──► positions ──► held ──► universe_prices ──┬──► equity ──┐
+        fx_history ──► fx ───────────────────────────────────┘             │
+                                           universe_prices ──► momentum ───┼──► sell ──► buy ──► ledger ──► equity_history
+                                           universe_prices ──► indicators ─┤
+        regime ────────────────────────────────────────────────────────────┘
+
+    regime (SPY), universe_prices i fx to niezależne pobrania –
+    startują razem, łączymy je dopiero w equity / sell / buy.
+
+    Wszystkie ceny idą przez `ctx` (RunDataContext): każdy ticker
+    (uniwersum + trzymane pozycje + SPY) ładowany jest raz, w oknie 20 lat,
+    a etapy dostają jego widoki – jeden snapshot cen na cały przebieg.
+
+    Graf = build_portfolio_graph (księga) + build_market_graph (dane wspólne);
+    run_portfolios składa te same części dla wielu portfeli.
+    """
+    spec = spec or PortfolioSpec()
+    graph = build_portfolio_graph(today_dt, ctx, spec)
+
+    @graph.stage("held", deps=["positions"])
+    def _held(positions):
+        return positions["ticker"].tolist() if not positions.empty else []
+
+    return build_market_graph(today_dt, ctx, [spec], graph=graph, warm=warm)
+
+
+def _held_tickers(specs) -> list:
+    """Tickery trzymane we wszystkich portfelach (czyta każdą księgę)."""
+    held = []
+    for spec in specs:
+        with use_database(spec.db):
+            positions = load_positions()
+        held += positions["ticker"].tolist() if not positions.empty else []
+    return list(dict.fromkeys(held))
+
+
+def build_market_graph(today_dt: datetime, ctx: RunDataContext, specs, graph: StageGraph | None = None,
+                       warm: dict | None = None) -> StageGraph:
+    """
+    Etapy wspólne dla wszystkich portfeli: regime, universe_prices,
+    momentum (ranking TOP max(top_n)), indicators, fx_history, fx.
+
+    Tickery trzymanych pozycji daje etap "held" – jeśli graf go nie ma
+    (tryb wielu portfeli), czytamy pozycje ze wszystkich ksiąg `specs`.
+
+    warm = wyniki "indicators" / "fx_history" z poprzedniego przebiegu
+    w tym samym procesie (daemon.py): wskaźniki są tylko przedłużane
+    o nowe sesje, a FX dociąga ostatni miesiąc zamiast 10 lat.
+    """
+    graph = graph or StageGraph()
+    warm = warm or {}
+    max_top_n = max(spec.top_n for spec in specs)
+
+    if "held" not in graph:
+        @graph.stage("held")
+        def _held():
+            return _held_tickers(specs)
 
     # ========================================================
     # 1. STRATEGIA A — MARKET REGIME (SP500)
     # ========================================================
-    print("[A] Ładuję historię SPY...")
-    spy_df = load_price_history("SPY", period="15y")
+    @graph.stage("regime")
+    def _regime():
+        print("[A] Ładuję historię SPY...")
+        spy_df = ctx.history("SPY", period="15y")
+
+        print("[A] Obliczam tryb rynku SP500...")
+        # kluczowa zmiana: używamy kolumny 'Close', a nie nieistniejącej 'SPY'
+        # SMA200 przyrostowo (daily_state) – tylko nowe słupki od poprzedniego przebiegu
+        regime = market_regime(spy_df["Close"])
+        print(f"[A] Dzisiejszy tryb rynku = {regime}\n")
 
-    print("[A] Obliczam tryb rynku SP500...")
-    # kluczowa zmiana: używamy kolumny 'Close', a nie nieistniejącej 'SPY'
-    regime = compute_regime(spy_df["Close"])
-    print(f"[A] Dzisiejszy tryb rynku = {regime}\n")
+        current_span().rows = len(spy_df)
+        current_span().attrs["regime"] = regime
+        return regime
 
     # ========================================================
     # 2. STRATEGIA B — MOMENTUM TOP 5
     # ========================================================
-    print("\n[B] Obliczam ranking momentum dla US...")
+    @graph.stage("universe_prices", deps=["held"])
+    def _universe_prices(held):
+        # Ładuję dane dla wszystkich tickerów w universe (strict – jak dotąd)
+        universe = load_universe()
+        price_data = ctx.load(universe)
+
+        # ...oraz dla trzymanych pozycji spoza uniwersum (bez strict)
+        ctx.load(held, strict=False)
+
+        current_span().rows = sum(len(df) for df in price_data.values())
+        current_span().attrs["tickers"] = len(ctx.tickers)
+        return price_data
+
+    @graph.stage("momentum", deps=["universe_prices"])
+    def _momentum(universe_prices):
+        print("\n[B] Obliczam ranking momentum dla US...")
+        # ROC3/6/12 ze stanu przyrostowego (daily_state), nie z całej historii
+        top5 = top_tickers(momentum_ranking(universe_prices), top_n=max_top_n)
+        print(f"[B] TOP{max_top_n} momentum:", top5)
+
+        current_span().rows = len(universe_prices)
+        return top5
+
+    # wskaźniki (Close / SMA200 / ROC12) raz dla całego panelu –
+    # dla uniwersum i trzymanych pozycji
+    @graph.stage("indicators", deps=["universe_prices"])
+    def _indicators(universe_prices):
+        if "indicators" in warm:
+            indicators = warm["indicators"].extended(close_panel(ctx.histories(ctx.tickers)))
+        else:
+            indicators = IndicatorCache.from_price_data(ctx.histories(ctx.tickers), store_dir=INDICATOR_DIR)
+        current_span().rows = indicators.panel.size
+        return indicators
 
-    # 1. Ładuję dane dla wszystkich tickerów w universe
-    universe = load_universe()
-    price_data = load_price_history(universe, today)
-
-    # 2. Momentum ranking
-    top5 = compute_top5_momentum(price_data)
-
-    print("[B] TOP5 momentum:", top5)
-    
     # ========================================================
     # 3. FX RATES
     # ========================================================
-    fx_row = load_fx_row()
-    print("[FX] Dzisiejsze kursy:")
-    print(fx_row, "\n")
-    
+    @graph.stage("fx_history")
+    def _fx_history():
+        fx_history = extend_fx_history(warm["fx_history"]) if "fx_history" in warm else load_fx_history("10y")
+        current_span().rows = len(fx_history)
+        return fx_history
+
+    @graph.stage("fx", deps=["fx_history"])
+    def _fx(fx_history):
+        fx_row = fx_history.iloc[-1]
+        fx_row.name = "FX_TODAY"
+        print("[FX] Dzisiejsze kursy:")
+        print(fx_row, "\n")
+
+        current_span().rows = len(fx_row)
+        return fx_row
+
+    return graph
+
+
+def build_portfolio_graph(today_dt: datetime, ctx: RunDataContext, spec: PortfolioSpec) -> StageGraph:
+    """
+    Etapy jednego portfela (na bieżącej księdze, db.DB_PATH):
+    init_db, positions, equity, sell, buy, ledger, equity_history.
+
+    Zależą od etapów rynkowych (regime, momentum, indicators, fx,
+    fx_history, universe_prices) – z tego samego grafu albo jako
+    gotowe wejścia StageGraph.run(inputs=...).
+    """
+    today = today_dt.strftime("%Y-%m-%d")
+    graph = StageGraph()
+
+    # inicjalizacja bazy (tabele, jeśli brak)
+    @graph.stage("init_db")
+    def _init_db():
+        init_db()
+        print("[DB] SQLite portfolio database initialized.\n")
+
     # ========================================================
     # 4. LOAD PORTFOLIO STATE
     # ========================================================
-    positions = load_positions()
-    print("[PORTFOLIO] Obecne pozycje:")
-    print(positions if not positions.empty else "(brak pozycji)", "\n")
+    @graph.stage("positions", deps=["init_db"])
+    def _positions(init_db):
+        positions = load_positions()
+        print("[PORTFOLIO] Obecne pozycje:")
+        print(positions if not positions.empty else "(brak pozycji)", "\n")
+
+        current_span().rows = len(positions)
+        return positions
+
+    @graph.stage("equity", deps=["universe_prices", "fx", "positions"])
+    def _equity(universe_prices, fx, positions):
+        held = positions["ticker"].tolist() if not positions.empty else []
+        equity = estimate_total_equity(ctx.histories(held), fx)
+        print(f"[PORTFOLIO] Łączne equity portfela: {equity:,.2f} PLN\n")
+        return equity
 
-    # Uwaga: teraz price_data istnieje i equity się policzy!
-    equity = estimate_total_equity(price_data, fx_row)
-    print(f"[PORTFOLIO] Łączne equity portfela: {equity:,.2f} PLN\n")
-    
-    
     # ========================================================
     # 5. SELL SIGNALS (natychmiastowe)
     # ========================================================
-    print("[SELL] Sprawdzam sygnały sprzedaży...\n")
-
-    price_data = {}
-    tickers_to_check = set(top5) | set(positions["ticker"].tolist()) if not positions.empty else set(top5)
+    @graph.stage("sell", deps=["regime", "momentum", "indicators", "fx", "positions", "equity"])
+    def _sell(regime, momentum, indicators, fx, positions, equity):
+        print("[SELL] Sprawdzam sygnały sprzedaży...\n")
 
-    for t in tickers_to_check:
-        try:
-            df = load_price_history(t, period="2y")
-            price_data[t] = df
-        except Exception as e:
-            print(f"[WARN] [SELL] Brak danych dla {t}: {e}")
+        top = momentum[:spec.top_n]
+        held = positions["ticker"].tolist() if not positions.empty else []
+        tickers_to_check = list(dict.fromkeys(top + held))
 
-    sell_list = process_sell_signals(
-        today=today,
-        regime_a=regime,
-        top5_tickers=top5,
-        price_data=price_data,
-        fx_row=fx_row,
-    )
+        # widoki 2y z kontekstu – bez ponownego ładowania
+        price_data = ctx.histories(tickers_to_check, period="2y")
+        for t in set(tickers_to_check) - set(price_data):
+            print(f"[WARN] [SELL] Brak danych dla {t}")
 
-    execute_sell_orders(
-        today=today,
-        sell_list=sell_list,
-        price_data=price_data,
-        fx_row=fx_row,
-        regime=regime,
-    )
+        sell_list = process_sell_signals(
+            today=today,
+            regime_a=regime,
+            top5_tickers=top,
+            price_data=price_data,
+            fx_row=fx,
+            indicators=indicators,
+        )
 
-    # reload portfolio after sells
-    positions = load_positions()
+        # w dzień rebalancingu sprzedaże idą razem z zakupami jako zlecenia netto
+        if is_rebalance_day(today_dt):
+            print("[SELL] Dzień rebalancingu – sprzedaże zostaną zneutralizowane z rebalancingiem.\n")
+        else:
+            execute_sell_orders(
+                today=today,
+                sell_list=sell_list,
+                price_data=price_data,
+                fx_row=fx,
+                regime=regime,
+                costs=spec.broker,
+            )
+
+        current_span().rows = len(sell_list)
+        return price_data, sell_list
 
     # ========================================================
     # 6. BUY / REBALANCE — ONLY MONTHLY (10th)
     # ========================================================
-    if is_rebalance_day(today_dt):
+    @graph.stage("buy", deps=["sell", "regime", "momentum", "fx"])
+    def _buy(sell, regime, momentum, fx):
+        price_data, sell_list = sell
+
+        if not is_rebalance_day(today_dt):
+            print("[BUY] Dziś NIE jest dzień rebalancingu.\n")
+            return None
+
         print("[BUY] Dzisiaj dzień miesięcznego rebalancingu.")
 
-        # Stała wpłata 2000 PLN (dla testów wstecznych)
-        contribution = 2000
-        print(f"[BUY] Dodaję miesięczną wpłatę: {contribution} PLN")
+        # Stała miesięczna wpłata portfela (domyślnie 2000 PLN), w PLN po kursie z dnia
+        contribution = spec.contribution_pln(fx)
+        print(f"[BUY] Dodaję miesięczną wpłatę: {contribution:,.2f} PLN")
         record_contribution(today, contribution)
 
         positions = load_positions()
-        equity = estimate_total_equity(positions, fx_row)
-        print(f"[BUY] Equity po wpłacie = {equity:,.2f} PLN")
-
-        # Budujemy target allocation
-        alloc_df = build_target_allocation(
-            tickers=top5,
-            weights=None,   # equal weight
-            equity_pln=equity,
-            fx_row=fx_row,
-        )
+        held = positions["ticker"].tolist() if not positions.empty else []
+        cash = estimate_cash_pln()
+        equity = estimate_total_equity(ctx.histories(held), fx) + cash
+        print(f"[BUY] Equity po wpłacie = {equity:,.2f} PLN (w tym gotówka {cash:,.2f} PLN)")
+
+        # Budujemy target allocation (BEAR → brak celów = wyjście ze wszystkiego)
+        if regime == "BEAR":
+            alloc_df = build_target_allocation(equity_pln=equity, top5=[], fx_row=fx)
+        else:
+            alloc_df = build_target_allocation(equity_pln=equity, top5=momentum[:spec.top_n], fx_row=fx)
 
         print("\n[BUY] Target allocation:")
         print(alloc_df)
 
-        # wykonujemy zakupy
+        # zlecenia netto: pozycje vs target, sygnały sprzedaży wymuszają target 0
         buy_according_to_allocation(
             today=today,
             alloc_df=alloc_df,
-            fx_row=fx_row,
-            price_data=price_data
+            fx_row=fx,
+            price_data=price_data,
+            regime=regime,
+            exits=sell_list,
+            costs=spec.broker,
         )
-    else:
-        print("[BUY] Dziś NIE jest dzień rebalancingu.\n")
 
-    print("\n=== ENGINE COMPLETE ===\n")
+        current_span().rows = len(alloc_df)
+        return alloc_df
+
+    # ========================================================
+    # 7. LEDGER — snapshoty pozycji na koniec miesiąca
+    # ========================================================
+    @graph.stage("ledger", deps=["buy"])
+    def _ledger(buy):
+        created = ensure_snapshots(until=today)
+        current_span().rows = len(created)
+        return created
+
+    # ========================================================
+    # 8. EQUITY HISTORY — dzienna wycena portfela (przyrostowo)
+    # ========================================================
+    @graph.stage("equity_history", deps=["ledger", "fx_history"])
+    def _equity_history(ledger, fx_history):
+        new = update_equity_history(
+            as_of=today,
+            price_data=ctx.histories(ctx.tickers, raw=True),
+            fx_history=fx_history,
+        )
+        current_span().rows = len(new)
+        return new
+
+    return graph
 
 
 # ============================================================
 # RUN
 # ============================================================
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Momentum Portfolio Engine")
+    parser.add_argument("--profile", action="store_true", help="cProfile całego przebiegu")
+    parser.add_argument("--trace-memory", action="store_true", help="tracemalloc: szczytowa pamięć per etap")
+    parser.add_argument("--workers", type=int, default=4, help="liczba równoległych etapów (1 = sekwencyjnie)")
+    parser.add_argument("--portfolios", default=None,
+                        help="plik JSON z wieloma portfelami (np. src/config/portfolios.example.json)")
+    args = parser.parse_args()
+
     try:
-        main()
+        main(profile=args.profile, trace_memory=args.trace_memory, max_workers=args.workers,
+             portfolios_config=args.portfolios)
     except Exception:
         print("\n[ERROR] Wystąpił błąd w engine:")
         print(traceback.format_exc())
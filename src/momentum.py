@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
 
+from indicators import roc
+
 
 def compute_momentum(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -9,22 +11,23 @@ def compute_momentum(df: pd.DataFrame) -> pd.DataFrame:
     """
     df = df.copy()
 
-    df["ROC3"] = df["Close"].pct_change(63) * 100     # 3 months
-    df["ROC6"] = df["Close"].pct_change(126) * 100    # 6 months
-    df["ROC12"] = df["Close"].pct_change(252) * 100   # 12 months
+    df["ROC3"] = roc(df["Close"], 63) * 100     # 3 months
+    df["ROC6"] = roc(df["Close"], 126) * 100    # 6 months
+    df["ROC12"] = roc(df["Close"], 252) * 100   # 12 months
 
     df["score"] = df["ROC3"] * 0.2 + df["ROC6"] * 0.3 + df["ROC12"] * 0.5
 
     return df
 
 
-def compute_top5_momentum(price_data: dict) -> list:
+def compute_momentum_ranking(price_data: dict) -> pd.DataFrame:
     """
     Przyjmuje:
        price_data: dict[ticker] = DataFrame z kolumną 'Close'
 
     Zwraca:
-        list TOP5 tickerów na podstawie score
+        DataFrame ticker | score | roc3 | roc6 | roc12, od najlepszego score
+        (jeden ranking dla wielu portfeli – każdy bierze swoje TOP N)
     """
 
     results = []
@@ -45,12 +48,31 @@ def compute_top5_momentum(price_data: dict) -> list:
         })
 
     mom_df = pd.DataFrame(results)
-    mom_df = mom_df.sort_values("score", ascending=False).reset_index(drop=True)
+    return mom_df.sort_values("score", ascending=False).reset_index(drop=True)
+
+
+def compute_top5_momentum(price_data: dict, top_n: int = 5) -> list:
+    """
+    Przyjmuje:
+       price_data: dict[ticker] = DataFrame z kolumną 'Close'
+
+    Zwraca:
+        list TOP5 (top_n) tickerów na podstawie score
+    """
+
+    return top_tickers(compute_momentum_ranking(price_data), top_n)
+
+
+def top_tickers(mom_df: pd.DataFrame, top_n: int = 5) -> list:
+    """
+    TOP N tickerów z gotowego rankingu (compute_momentum_ranking albo
+    przyrostowego daily_state.momentum_ranking) z wypisem kontrolnym.
+    """
 
-    # Debug wypis TOP5
-    print("\n[Strategy B] TOP 5 momentum today:")
-    for i, row in mom_df.head(5).iterrows():
+    # Debug wypis TOP N
+    print(f"\n[Strategy B] TOP {top_n} momentum today:")
+    for i, row in mom_df.head(top_n).iterrows():
         print(f"{i+1}. {row['ticker']}: score={row['score']:.2f}, "
               f"roc3={row['roc3']:.1f}%, roc6={row['roc6']:.1f}%, roc12={row['roc12']:.1f}%")
 
-    return mom_df["ticker"].head(5).tolist()
+    return mom_df["ticker"].head(top_n).tolist()
@@ -0,0 +1,312 @@
+# src/monte_carlo.py
+
+"""
+Odporność strategii momentum: tysiące ścieżek naraz (Monte Carlo).
+
+Dwa źródła losowości (można łączyć):
+  - bootstrap blokowy: ścieżka to sklejone losowe bloki `block_len` sesji
+    historycznych zwrotów CAŁEGO panelu (blok zachowuje korelacje między
+    tickerami i krótką autokorelację),
+  - przesunięcia rebalansu: każdy rebalans ścieżki przesunięty o losowe
+    -max_offset … +max_offset sesji względem REBALANCE_DAY.
+
+Ścieżki nie są materializowane jako panele cen [ścieżka x dzień x ticker].
+Ścieżka to tylko tablica początków bloków, a log-cena dowolnej ścieżki
+w dowolnym dniu to odczyt ze wspólnej skumulowanej log-ceny źródła:
+
+    C[b, t] = base[b, blok(t)] + S[start(b, blok(t)) + o(t)] - S[start(b, blok(t))]
+
+Strategia liczona jest wsadowo (`batch_size` ścieżek naraz), bez pętli po
+dniach i ścieżkach: score ROC we wszystkich rebalansach jednym gatherem
+[B x M x K], wybór top_n przez argpartition, dzienne equity tylko dla
+wybranych tickerów [B x T x top_n].
+
+Uproszczenia względem backtest_simple.simulate: pełny rebalans do równych
+wag, bez wpłat (krzywa TWR, start = 1.0), uniwersum = tickery z pełną
+historią w oknie (bez luk po ffill). Koszty (costs.py) jako proporcjonalna
+stawka brokera od obrotu: wymiana k z top_n tickerów = 2k/top_n wartości.
+
+    python src/monte_carlo.py --paths 10000 --mode both
+    res = run_monte_carlo(prices, n_paths=10_000, mode="bootstrap")
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from analytics import PERIODS_PER_YEAR, max_drawdown
+from backtest_simple import REBALANCE_DAY, ROC_PERIODS, TOP_N
+from instrumentation import count
+from costs import get_cost_model
+from report_sink import ReportSink
+from trading_calendar import rebalance_rows
+
+MODES = ("bootstrap", "offsets", "both")
+
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+REPORT_DIR = "reports/monte_carlo"
+
+
+# -------------------------------------------------------------
+# Dane wejściowe
+# -------------------------------------------------------------
+def prepare_panel(prices: pd.DataFrame) -> pd.DataFrame:
+    """Panel Close bez pustych dni, luki ffill; tylko tickery z pełną historią."""
+    panel = prices[prices.notna().any(axis=1)].ffill()
+    complete = panel.columns[panel.notna().all()]
+    dropped = panel.shape[1] - len(complete)
+    if dropped:
+        print(f"[MC] Pomijam {dropped} tickerów bez pełnej historii w oknie")
+    return panel[complete]
+
+
+# -------------------------------------------------------------
+# Ścieżki
+# -------------------------------------------------------------
+def _blocks(S, n_paths, block_len, bootstrap, rng):
+    """
+    Ścieżki jako bloki: początki bloków [B x nb] i przesunięcie log-ceny
+    każdego bloku D [B x nb x K] tak, że log-cena ścieżki to
+    C[b, t] = D[b, blok(t)] + S[start(b, blok(t)) + o(t)].
+    """
+    n, k = S.shape[0] - 1, S.shape[1]
+    if not bootstrap:
+        # ścieżka historyczna = jeden blok od dnia 0
+        return np.zeros((n_paths, 1), dtype=np.int32), np.zeros((n_paths, 1, k), dtype=S.dtype), n
+
+    n_blocks = -(-n // block_len)
+    starts = rng.integers(0, n - block_len + 1, size=(n_paths, n_blocks), dtype=np.int32)
+    first, last = S[starts], S[starts + block_len]                         # [B x nb x K]
+    base = np.cumsum(last - first, axis=1) - (last - first)                # suma poprzednich bloków
+    return starts, base - first, block_len
+
+
+def _day_index(t, block_len):
+    """Dzień ścieżki t → (blok, przesunięcie w bloku); dzień 0 = początek 1. bloku."""
+    j = np.maximum(t - 1, 0) // block_len
+    return j, t - j * block_len
+
+
+def _log_price(S, D, starts, block_len, t, cols=None):
+    """
+    Log-cena ścieżek w dniach `t` [B x ...] (0 = start ścieżki).
+    cols=None → wszystkie tickery [B x ... x K]; cols [B x ... x n] → tylko te.
+    Odczyty przez płaskie indeksy (np.take) – wielowymiarowy fancy indexing
+    na [B x T x n] jest kilka razy wolniejszy.
+    """
+    n_blocks, k = starts.shape[1], S.shape[1]
+    j, o = _day_index(t, block_len)
+    row = np.arange(t.shape[0], dtype=np.int32).reshape((-1,) + (1,) * (t.ndim - 1)) * n_blocks + j
+    src = np.take(starts, row) + o
+    if cols is None:
+        return D.reshape(-1, k)[row] + S[src]
+    return np.take(D, row[..., None] * k + cols) + np.take(S, src[..., None] * k + cols)
+
+
+def _per_day(a, seg):
+    """a [B x M x ...] wg segmentu każdego dnia seg [B x T] → [B x T x ...]."""
+    b, m = a.shape[:2]
+    return a.reshape(b * m, *a.shape[2:])[np.arange(b, dtype=np.int32)[:, None] * m + seg]
+
+
+def _rebalance_schedule(rows, n_paths, max_offset, warmup, n, rng):
+    """
+    Wiersze rebalansu per ścieżka [B x M] (z losowym przesunięciem), rosnąco.
+    max_offset musi być < połowy najmniejszego odstępu między rebalansami –
+    inaczej przesunięcia zamieniałyby kolejność sąsiednich terminów.
+    """
+    rows = rows[rows >= warmup].astype(np.int32)
+    if max_offset and len(rows) > 1 and 2 * max_offset >= np.diff(rows).min():
+        raise ValueError(
+            f"max_offset={max_offset} >= połowy najmniejszego odstępu między rebalansami "
+            f"({np.diff(rows).min()} sesji)."
+        )
+    sched = np.broadcast_to(rows, (n_paths, len(rows))).copy()
+    if max_offset:
+        sched += rng.integers(-max_offset, max_offset + 1, size=sched.shape, dtype=np.int32)
+        np.clip(sched, warmup, n, out=sched)
+        sched.sort(axis=1)  # clip do warmup / n może zrównać sąsiednie terminy
+    return sched
+
+
+def simulate_paths(
+    S: np.ndarray,
+    rows: np.ndarray,
+    n_paths: int,
+    bootstrap: bool = True,
+    max_offset: int = 0,
+    block_len: int = 21,
+    top_n: int = TOP_N,
+    roc_periods=ROC_PERIODS,
+    rng: np.random.Generator | None = None,
+    cost_rate: float = 0.0,
+) -> np.ndarray:
+    """
+    Jedna partia ścieżek → dzienny indeks wartości [B x T] (T = wiersze S).
+
+    S         : skumulowana log-cena źródła [T x K] (S[0] = 0)
+    rows      : bazowe wiersze rebalansu (trading_calendar.rebalance_rows)
+    cost_rate : koszt jednej strony transakcji jako ułamek wartości
+    """
+    rng = rng or np.random.default_rng()
+    n = S.shape[0] - 1
+    warmup = max(roc_periods)
+    starts, D, block_len = _blocks(S, n_paths, block_len, bootstrap, rng)
+    sched = _rebalance_schedule(rows, n_paths, max_offset, warmup, n, rng)      # [B x M]
+
+    # --- score ROC we wszystkich rebalansach naraz: [B x M x K] ---
+    now = _log_price(S, D, starts, block_len, sched)
+    score = sum(now - _log_price(S, D, starts, block_len, sched - p) for p in roc_periods)
+    sel = np.argpartition(-score, top_n - 1, axis=2)[..., :top_n].astype(np.int32)   # [B x M x n]
+
+    # --- wzrost w każdym segmencie między rebalansami (równe wagi) ---
+    anchor = _log_price(S, D, starts, block_len, sched, cols=sel)
+    nxt = np.concatenate([sched[:, 1:], np.full_like(sched[:, :1], n)], axis=1)
+    seg_growth = np.exp(_log_price(S, D, starts, block_len, nxt, cols=sel) - anchor).mean(axis=2)
+
+    # koszt wejścia w segment: 1. rebalans kupuje całość, kolejne wymieniają
+    # tickery spoza poprzedniego wyboru (sprzedaż + zakup)
+    stay = (sel[:, 1:, :, None] == sel[:, :-1, None, :]).any(axis=3).sum(axis=2)
+    traded = np.concatenate([np.ones_like(sel[:, :1, 0], dtype=float), 2.0 * (top_n - stay) / top_n], axis=1)
+    keep = 1.0 - cost_rate * traded
+    seg_growth = seg_growth * keep
+    start_wealth = np.cumprod(
+        np.concatenate([np.ones_like(seg_growth[:, :1]), seg_growth[:, :-1]], axis=1), axis=1
+    )
+
+    # --- dzienne equity: segment każdego dnia z kumulacji znaczników rebalansu ---
+    marks = np.zeros((n_paths, n + 1), dtype=np.int32)
+    marks[np.arange(n_paths)[:, None], sched] = 1
+    seg = np.cumsum(marks, axis=1, dtype=np.int32) - 1                          # -1 = gotówka przed 1. rebalansem
+    segc = np.maximum(seg, 0)
+
+    # dzień -> (blok, przesunięcie) jest wspólny dla wszystkich ścieżek
+    j, o = _day_index(np.arange(n + 1, dtype=np.int32), block_len)
+    k = S.shape[1]
+    cols = _per_day(sel, segc)                                                  # [B x T x n]
+    row = (np.arange(n_paths, dtype=np.int32)[:, None] * starts.shape[1] + j) * k
+    src = (starts[:, j] + o) * k
+    log_px = np.take(D, row[..., None] + cols) + np.take(S, src[..., None] + cols)
+    log_px -= _per_day(anchor, segc)
+    growth = np.exp(log_px, out=log_px).mean(axis=2)
+    wealth = _per_day(start_wealth * keep, segc) * growth
+    wealth[seg < 0] = 1.0
+    return wealth
+
+
+# -------------------------------------------------------------
+# Silnik
+# -------------------------------------------------------------
+def run_monte_carlo(
+    prices: pd.DataFrame,
+    n_paths: int = 10_000,
+    mode: str = "both",
+    block_len: int = 21,
+    max_offset: int = 3,
+    top_n: int = TOP_N,
+    roc_periods=ROC_PERIODS,
+    rebalance_day: int = REBALANCE_DAY,
+    batch_size: int = 500,
+    seed: int | None = 42,
+    costs=None,
+) -> dict:
+    """
+    Zwraca dict:
+      paths      – DataFrame [ścieżka] x (cagr, max_drawdown, final_wealth),
+      historical – te same metryki dla ścieżki historycznej (bez losowania),
+      summary    – kwantyle / średnia / P(CAGR < 0) dla CAGR i max DD.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Nieznany tryb {mode!r}. Dostępne: {MODES}")
+
+    panel = prepare_panel(prices)
+    warmup = max(roc_periods)
+    if panel.shape[1] < top_n or len(panel) <= warmup + block_len:
+        raise ValueError("Za mało danych na symulację (tickery z pełną historią / długość okna).")
+
+    # float32: ~7 cyfr znaczących log-ceny wystarcza na rozkłady CAGR / DD,
+    # a gathery [B x T x n] są dwa razy tańsze niż na float64
+    values = panel.to_numpy(dtype=float)
+    S = np.log(values / values[0]).astype(np.float32)
+    rows = rebalance_rows(panel.index, rebalance_day)
+    years = (len(panel) - 1 - warmup) / PERIODS_PER_YEAR
+    bootstrap = mode in ("bootstrap", "both")
+    offset = max_offset if mode in ("offsets", "both") else 0
+    rng = np.random.default_rng(seed)
+    cost_rate = float(get_cost_model(costs).proportional_rate())
+
+    def metrics(wealth):
+        w = wealth[:, warmup:]
+        return pd.DataFrame({
+            "cagr": w[:, -1] ** (1.0 / years) - 1.0,
+            "max_drawdown": max_drawdown(w.T),
+            "final_wealth": w[:, -1],
+        })
+
+    historical = metrics(simulate_paths(S, rows, 1, bootstrap=False, top_n=top_n, roc_periods=roc_periods,
+                                        cost_rate=cost_rate))
+
+    parts = []
+    for done in range(0, n_paths, batch_size):
+        b = min(batch_size, n_paths - done)
+        parts.append(metrics(simulate_paths(
+            S, rows, b, bootstrap=bootstrap, max_offset=offset, block_len=block_len,
+            top_n=top_n, roc_periods=roc_periods, rng=rng, cost_rate=cost_rate,
+        )))
+        count("monte_carlo.paths", b)
+    paths = pd.concat(parts, ignore_index=True)
+    paths.index.name = "path"
+
+    summary = paths[["cagr", "max_drawdown"]].quantile(QUANTILES)
+    summary.index = [f"p{int(q * 100)}" for q in QUANTILES]
+    summary.loc["mean"] = paths[["cagr", "max_drawdown"]].mean()
+    summary.loc["historical"] = historical.iloc[0][["cagr", "max_drawdown"]]
+    summary.loc["p_loss"] = [(paths["cagr"] < 0).mean(), np.nan]
+    return {"paths": paths, "historical": historical.iloc[0], "summary": summary}
+
+
+def write_reports(result: dict, root: str = REPORT_DIR) -> None:
+    """Metryki wszystkich ścieżek (format kolumnowy + CSV) i podsumowanie (CSV)."""
+    with ReportSink(root, export_csv=True) as sink:
+        table = sink.table("paths", {"path": "i8", "cagr": "f8", "max_drawdown": "f8", "final_wealth": "f8"})
+        table.extend(result["paths"].reset_index())
+    result["summary"].to_csv(f"{root}/summary.csv")
+
+
+# -------------------------------------------------------------
+# CLI
+# -------------------------------------------------------------
+if __name__ == "__main__":
+    import backtest_simple
+    from universe import load_universe
+
+    parser = argparse.ArgumentParser(description="Monte Carlo / bootstrap strategii momentum")
+    parser.add_argument("--paths", type=int, default=10_000)
+    parser.add_argument("--mode", choices=MODES, default="both")
+    parser.add_argument("--block-len", type=int, default=21, help="długość bloku bootstrapu (sesje)")
+    parser.add_argument("--max-offset", type=int, default=3, help="maks. przesunięcie rebalansu (sesje)")
+    parser.add_argument("--top-n", type=int, default=TOP_N)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--broker", default=None, help="model kosztów z costs.BROKERS (np. xtb, ibkr)")
+    parser.add_argument("--out", default=REPORT_DIR)
+    args = parser.parse_args()
+
+    prices = backtest_simple.download_price_history(load_universe())
+    t0 = time.perf_counter()
+    result = run_monte_carlo(
+        prices, n_paths=args.paths, mode=args.mode, block_len=args.block_len,
+        max_offset=args.max_offset, top_n=args.top_n, batch_size=args.batch_size, seed=args.seed,
+        costs=args.broker,
+    )
+    elapsed = time.perf_counter() - t0
+    write_reports(result, args.out)
+
+    print(f"\n=== MONTE CARLO: {args.paths} ścieżek ({args.mode}) w {elapsed:.1f}s ===\n")
+    print(result["summary"].to_string(float_format=lambda v: f"{v:.2%}"))
+    print(f"\nRaporty: {args.out}/paths.cols / .csv, {args.out}/summary.csv")
@@ -0,0 +1,538 @@
+# src/panel_server.py
+
+"""
+Serwer panelu cen w pamięci współdzielonej dla równoległych zadań.
+
+Screener, backtesty, walk-forward i silnik chodzą na tej samej maszynie
+naraz, a każdy proces czytał własną kopię magazynu (data_loader) – pamięć
+rosła liniowo z liczbą zadań. Serwer wczytuje magazyn RAZ jako
+compact_store.CompactPanel i wystawia tablice w blokach shared_memory:
+
+    meta     int64[4]        generacja, liczba wierszy, pojemność, wycofany
+    dates    [C]             datetime64[D]
+    prices   [F x C x K]     float32
+    volume   [C x K]         uint (jak w CompactPanel)
+    present  [C x K]         bool
+
+C (pojemność) = liczba dat + RESERVE_ROWS wolnych wierszy na nowe słupki.
+Klient łączy się przez gniazdo (multiprocessing.connection, AF_UNIX),
+dostaje nazwy bloków i buduje CompactPanel na widokach numpy tylko do
+odczytu – bez kopiowania; pamięć zajmuje jedna kopia niezależnie od
+liczby klientów.
+
+Protokół odświeżania (refresh):
+  1. serwer dociąga słupki nowsze od ostatniej daty panelu
+     (data_loader.load_new_bars – ogon CSV, opcjonalnie Yahoo),
+  2. zapisuje je w wolnych wierszach [n, n + m) – opublikowanych wierszy
+     nie zmienia nigdy,
+  3. na końcu podbija meta[N_ROWS]; klient przy każdym panel() czyta
+     liczbę wierszy, więc widzi nowe dane bez ponownego dołączania,
+     a już pobrany panel() zostaje spójną migawką.
+  Gdy zabraknie pojemności (albo wolumen przestanie mieścić się w typie),
+  serwer tworzy nową generację bloków, kopiuje panel, w starym meta
+  ustawia RETIRED i zwalnia stare bloki (zmapowane widoki klientów żyją
+  dalej). Klient widzi RETIRED i przy następnym panel() dołącza od nowa.
+  Spóźnione słupki (z datą <= ostatniej daty panelu, np. ticker dociągnięty
+  dzień później) też dają nową generację: panel + słupki scalone na wspólnej
+  osi dat, bez zmieniania opublikowanych wierszy. Nowe tickery – rebuild
+  (pełne wczytanie magazynu, nowa generacja).
+
+    python src/panel_server.py                        # serwer (cały magazyn CSV)
+    python src/panel_server.py --panel data/panels/prices.npz
+    python src/panel_server.py --status | --refresh [--download] | --stop
+
+Dostęp: multiprocessing.connection odpakowuje (pickle) każdą wiadomość,
+więc klucz nie może być publiczny. Serwer przy starcie losuje klucz
+i zapisuje go obok gniazda (<adres>.key, tryb 0600; gniazdo też 0600) –
+połączyć się może tylko ten sam użytkownik. MOMENTUM_PANEL_AUTHKEY
+podaje klucz wprost (serwer i klienci), np. dla innego katalogu gniazda.
+
+    with PanelClient() as client:
+        panel = client.panel()                        # CompactPanel na pamięci serwera
+        prices = panel.close_panel("Adj Close")
+    panel = open_panel()                              # serwer, a bez niego lokalny panel
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import secrets
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+import data_loader
+from compact_store import PANEL_DIR, CompactPanel, _volume_dtype, _volume_missing, build_panel, load_or_build
+from instrumentation import count
+
+PANEL_ADDRESS = os.environ.get("MOMENTUM_PANEL_ADDRESS", str(PANEL_DIR / "panel.sock"))
+AUTHKEY_ENV = "MOMENTUM_PANEL_AUTHKEY"
+ATTACH_RETRIES = 3      # spec → attach: generacja mogła zostać wycofana w międzyczasie
+
+RESERVE_ROWS = 64       # wolne wiersze na nowe słupki (~3 miesiące sesji) przed nową generacją
+
+GENERATION, N_ROWS, CAPACITY, RETIRED = range(4)
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Dołączenie do cudzego bloku – bez rejestracji w resource_tracker klienta."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13: tracker usunąłby blok serwera przy wyjściu klienta
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+def _key_path(address: str) -> Path:
+    return Path(f"{address}.key")
+
+
+def _new_authkey(address: str) -> bytes:
+    """Klucz serwera: z MOMENTUM_PANEL_AUTHKEY albo losowy, zapisany obok gniazda (0600)."""
+    if os.environ.get(AUTHKEY_ENV):
+        return os.environ[AUTHKEY_ENV].encode()
+    key = secrets.token_bytes(32)
+    path = _key_path(address)
+    if path.exists():
+        path.unlink()
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+def _read_authkey(address: str) -> bytes:
+    """Klucz klienta: MOMENTUM_PANEL_AUTHKEY albo plik serwera (brak = serwer nie działa)."""
+    if os.environ.get(AUTHKEY_ENV):
+        return os.environ[AUTHKEY_ENV].encode()
+    return _key_path(address).read_bytes()
+
+
+def _view(shm: shared_memory.SharedMemory, shape, dtype) -> np.ndarray:
+    return np.ndarray(tuple(shape), dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def _as_volume(volume: np.ndarray, dtype) -> np.ndarray:
+    """Wolumen w (szerszym) typie `dtype` – znacznik braku przechodzi na maksimum nowego typu."""
+    out = volume.astype(dtype)
+    out[volume == _volume_missing(volume.dtype)] = _volume_missing(dtype)
+    return out
+
+
+def _put_bars(prices, present, volume, dates, bars: Dict[str, pd.DataFrame], tickers, fields) -> None:
+    """Wpisuje słupki {ticker: DataFrame} w wiersze osi `dates` (wszystkie daty słupków muszą na niej być)."""
+    pos = {t: j for j, t in enumerate(tickers)}
+    for t, df in bars.items():
+        j = pos[t]
+        rows = np.searchsorted(dates, df.index.to_numpy().astype("datetime64[D]"))
+        present[rows, j] = True
+        for i, f in enumerate(fields):
+            if f in df:
+                prices[i, rows, j] = df[f].to_numpy(dtype=np.float32)
+        if volume is not None and "Volume" in df:
+            v = df["Volume"].to_numpy(dtype=float)
+            ok = np.isfinite(v)
+            volume[rows[ok], j] = np.rint(v[ok]).astype(volume.dtype)
+
+
+def _merge_bars(panel: CompactPanel, bars: Dict[str, pd.DataFrame], volume_dtype) -> CompactPanel:
+    """Nowy CompactPanel: `panel` + słupki, także spóźnione (w środku osi dat)."""
+    dates = np.union1d(panel.dates, np.concatenate(
+        [df.index.to_numpy().astype("datetime64[D]") for df in bars.values()]))
+    old = np.searchsorted(dates, panel.dates)
+    F, T, K = len(panel.fields), len(dates), len(panel.tickers)
+
+    prices = np.full((F, T, K), np.nan, dtype=np.float32)
+    prices[:, old] = panel.prices
+    present = np.zeros((T, K), dtype=bool)
+    present[old] = panel.present
+    volume = None
+    if panel.volume is not None:
+        volume = np.full((T, K), _volume_missing(volume_dtype), dtype=volume_dtype)
+        volume[old] = _as_volume(panel.volume, volume_dtype)
+    _put_bars(prices, present, volume, dates, bars, panel.tickers, panel.fields)
+    return CompactPanel(dates, panel.tickers, panel.fields, prices, volume, present)
+
+
+# -------------------------------------------------------------
+# Bloki jednej generacji
+# -------------------------------------------------------------
+class _Blocks:
+    """Zestaw bloków shared_memory jednej generacji panelu (+ widoki numpy)."""
+
+    def __init__(self, spec: dict, shms: Dict[str, shared_memory.SharedMemory], owner: bool):
+        self.spec = spec
+        self.shms = shms
+        self.owner = owner
+        self.arrays = {k: _view(shms[k], *spec["arrays"][k]) for k in spec["arrays"]}
+        if not owner:
+            for a in self.arrays.values():
+                a.flags.writeable = False
+
+    @classmethod
+    def create(cls, generation: int, panel: CompactPanel, capacity: int, volume_dtype) -> "_Blocks":
+        F, K = len(panel.fields), len(panel.tickers)
+        layout = {
+            "meta": ((4,), "int64"),
+            "dates": ((capacity,), "datetime64[D]"),
+            "prices": ((F, capacity, K), "float32"),
+            "present": ((capacity, K), "bool"),
+        }
+        if panel.volume is not None:
+            layout["volume"] = ((capacity, K), str(np.dtype(volume_dtype)))
+        prefix = f"mp{os.getpid()}g{generation}"
+        shms = {
+            k: shared_memory.SharedMemory(
+                name=f"{prefix}_{k}",
+                create=True,
+                size=max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1),
+            )
+            for k, (shape, dtype) in layout.items()
+        }
+        spec = {
+            "generation": generation,
+            "names": {k: s.name for k, s in shms.items()},
+            "arrays": layout,
+            "tickers": panel.tickers,
+            "fields": list(panel.fields),
+        }
+        blocks = cls(spec, shms, owner=True)
+
+        n = len(panel.dates)
+        a = blocks.arrays
+        a["dates"][:n] = panel.dates
+        a["prices"][:, :n] = panel.prices
+        a["prices"][:, n:] = np.nan
+        a["present"][:n] = panel.present
+        a["present"][n:] = False
+        if panel.volume is not None:
+            a["volume"][:n] = _as_volume(panel.volume, volume_dtype)
+            a["volume"][n:] = _volume_missing(volume_dtype)
+        a["meta"][:] = (generation, n, capacity, 0)
+        return blocks
+
+    @classmethod
+    def attach(cls, spec: dict) -> "_Blocks":
+        return cls(spec, {k: _attach(name) for k, name in spec["names"].items()}, owner=False)
+
+    def panel(self) -> CompactPanel:
+        """Migawka: CompactPanel na widokach pierwszych meta[N_ROWS] wierszy (bez kopii)."""
+        a = self.arrays
+        n = int(a["meta"][N_ROWS])
+        volume = a["volume"][:n] if "volume" in a else None
+        return CompactPanel(a["dates"][:n], self.spec["tickers"], self.spec["fields"],
+                            a["prices"][:, :n], volume, a["present"][:n])
+
+    def close(self) -> None:
+        self.arrays = {}
+        for shm in self.shms.values():
+            try:
+                shm.close()
+            except BufferError:
+                pass  # widoki wciąż w użyciu – blok zamknie się z procesem
+            if self.owner:
+                shm.unlink()
+
+
+# -------------------------------------------------------------
+# Serwer
+# -------------------------------------------------------------
+class PanelServer:
+    """Panel w shared_memory + obsługa klientów (spec / status / refresh / rebuild / stop)."""
+
+    def __init__(
+        self,
+        panel: CompactPanel,
+        address: str = PANEL_ADDRESS,
+        authkey: bytes | None = None,
+        reserve_rows: int = RESERVE_ROWS,
+        store_dir: str | Path | None = None,
+    ):
+        self.address = address
+        self.authkey = authkey
+        self.reserve_rows = reserve_rows
+        self.store_dir = store_dir
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._generation = 0
+        self.blocks = self._publish(panel)
+
+    def _publish(self, panel: CompactPanel, volume_dtype=None, extra_rows: int = 0) -> _Blocks:
+        """
+        Nowa generacja bloków z `panel` (+ miejsce na `extra_rows` czekających
+        słupków i RESERVE); poprzednia dostaje RETIRED i jest zwalniana.
+        """
+        if volume_dtype is None:
+            volume_dtype = panel.volume.dtype if panel.volume is not None else np.uint32
+        self._generation += 1
+        blocks = _Blocks.create(self._generation, panel, len(panel.dates) + extra_rows + self.reserve_rows,
+                                volume_dtype)
+        old = getattr(self, "blocks", None)
+        self.blocks = blocks
+        if old is not None:
+            old.arrays["meta"][RETIRED] = 1
+            old.close()
+        count("panel_server.publish")
+        return blocks
+
+    # ---------------------------------------------------------
+    def status(self) -> dict:
+        a = self.blocks.arrays
+        n = int(a["meta"][N_ROWS])
+        return {
+            "generation": int(a["meta"][GENERATION]),
+            "tickers": len(self.blocks.spec["tickers"]),
+            "rows": n,
+            "capacity": int(a["meta"][CAPACITY]),
+            "first": str(a["dates"][0]) if n else None,
+            "last": str(a["dates"][n - 1]) if n else None,
+            "nbytes": sum(s.size for s in self.blocks.shms.values()),
+        }
+
+    def refresh(self, allow_download: bool = False) -> dict:
+        """
+        Dociąga słupki nowsze od ostatniego słupka każdego tickera (protokół
+        w docstringu modułu): nowe daty – w wolne wiersze, spóźnione – nowa generacja.
+        """
+        with self._lock:
+            panel = self.blocks.panel()
+            n = len(panel.dates)
+            last = panel.dates[-1] if n else np.datetime64("1900-01-01", "D")
+            # ostatni słupek każdego tickera – od niego dociągamy (spóźnione też)
+            own_last = np.full(len(panel.tickers), last)
+            if n:
+                rows = n - 1 - np.argmax(panel.present[::-1], axis=0)
+                own_last = np.where(panel.present.any(axis=0), panel.dates[rows], last)
+            new, late = {}, 0
+            for t, after in zip(panel.tickers, own_last):
+                try:
+                    df = data_loader.load_new_bars(t, after=pd.Timestamp(after), allow_download=allow_download)
+                except Exception as exc:
+                    print(f"[PANEL] {t}: nie udało się dociągnąć słupków: {exc}")
+                    continue
+                if len(df):
+                    new[t] = df
+                    late += int((df.index <= pd.Timestamp(last)).sum())
+            if not new:
+                return {"appended": 0, "updated_tickers": 0, "late": late, **self.status()}
+
+            bar_dates = np.concatenate([df.index.to_numpy().astype("datetime64[D]") for df in new.values()])
+            grid = np.unique(bar_dates[bar_dates > last])
+            m = len(grid)
+            vmax = max((np.nanmax(df["Volume"].to_numpy(dtype=float)) for df in new.values()
+                        if "Volume" in df and df["Volume"].notna().any()), default=0.0)
+            a = self.blocks.arrays
+            vdtype = a["volume"].dtype if "volume" in a else None
+            wider = vdtype is not None and np.dtype(_volume_dtype(vmax)).itemsize > vdtype.itemsize
+            if wider:
+                vdtype = _volume_dtype(vmax)
+
+            if late:
+                # opublikowanych wierszy nie ruszamy – scalony panel jako nowa generacja
+                print(f"[PANEL] {late} spóźnionych słupków (data <= {last}) – publikuję nową generację.")
+                self._publish(_merge_bars(panel, new, vdtype))
+            else:
+                if n + m > int(a["meta"][CAPACITY]) or wider:
+                    self._publish(panel, volume_dtype=vdtype, extra_rows=m)
+                    a = self.blocks.arrays
+                # dane najpierw, liczba wierszy na końcu – klient nie zobaczy pustych wierszy
+                a["dates"][n:n + m] = grid
+                _put_bars(a["prices"][:, :n + m], a["present"][:n + m],
+                          a["volume"][:n + m] if "volume" in a else None,
+                          a["dates"][:n + m], new, panel.tickers, panel.fields)
+                a["meta"][N_ROWS] = n + m
+            count("panel_server.refresh")
+            return {"appended": m, "updated_tickers": len(new), "late": late, **self.status()}
+
+    def rebuild(self) -> dict:
+        """Pełne wczytanie magazynu (nowe tickery, poprawione historie) jako nowa generacja."""
+        panel = build_panel(store_dir=self.store_dir)
+        with self._lock:
+            self._publish(panel)
+        return self.status()
+
+    # ---------------------------------------------------------
+    def _handle(self, conn) -> None:
+        try:
+            while True:
+                msg = conn.recv()
+                op = msg.get("op")
+                try:
+                    if op == "spec":
+                        with self._lock:  # nie w trakcie _publish (stare bloki są zwalniane)
+                            reply = {"ok": True, "spec": self.blocks.spec}
+                    elif op == "status":
+                        reply = {"ok": True, "status": self.status()}
+                    elif op == "refresh":
+                        reply = {"ok": True, "status": self.refresh(bool(msg.get("allow_download")))}
+                    elif op == "rebuild":
+                        reply = {"ok": True, "status": self.rebuild()}
+                    elif op == "stop":
+                        self._stop.set()
+                        reply = {"ok": True}
+                    else:
+                        reply = {"ok": False, "error": f"nieznana operacja {op!r}"}
+                except Exception as exc:
+                    reply = {"ok": False, "error": f"{type(exc).__name__}: {exc}"}
+                conn.send(reply)
+                if op == "stop":
+                    return
+        except (EOFError, ConnectionResetError):
+            pass
+        finally:
+            conn.close()
+
+    def serve(self) -> None:
+        """Pętla accept do `stop` (klient) albo Ctrl+C; każdy klient we własnym wątku."""
+        Path(self.address).parent.mkdir(parents=True, exist_ok=True)
+        if os.path.exists(self.address):
+            os.unlink(self.address)  # gniazdo po poprzednim (zabitym) serwerze
+        own_key = self.authkey is None
+        if own_key:
+            self.authkey = _new_authkey(self.address)
+        listener = Listener(self.address, family="AF_UNIX", authkey=self.authkey)
+        os.chmod(self.address, 0o600)
+        threading.Thread(target=self._accept, args=(listener,), daemon=True).start()
+        st = self.status()
+        print(f"[PANEL] Serwer {self.address}: {st['tickers']} tickerów x {st['rows']} dat "
+              f"({st['first']} → {st['last']}), {st['nbytes'] / 2**20:.1f} MB w shared_memory")
+        try:
+            while not self._stop.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            listener.close()
+            self.blocks.close()
+            if os.path.exists(self.address):
+                os.unlink(self.address)
+            if own_key and not os.environ.get(AUTHKEY_ENV) and _key_path(self.address).exists():
+                _key_path(self.address).unlink()
+            print("[PANEL] Serwer zatrzymany.")
+
+    def _accept(self, listener: Listener) -> None:
+        while not self._stop.is_set():
+            try:
+                conn = listener.accept()
+            except OSError:
+                return  # listener zamknięty
+            except Exception as exc:  # np. zły authkey – serwer działa dalej
+                print(f"[PANEL] Odrzucone połączenie: {exc}")
+                continue
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+
+# -------------------------------------------------------------
+# Klient
+# -------------------------------------------------------------
+class PanelClient:
+    """Połączenie z serwerem; panel() = CompactPanel na pamięci serwera (tylko do odczytu)."""
+
+    def __init__(self, address: str = PANEL_ADDRESS, authkey: bytes | None = None):
+        self.conn = Client(address, family="AF_UNIX", authkey=authkey or _read_authkey(address))
+        self.blocks: _Blocks | None = None
+
+    def __enter__(self) -> "PanelClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _call(self, op: str, **kwargs) -> dict:
+        self.conn.send({"op": op, **kwargs})
+        reply = self.conn.recv()
+        if not reply.get("ok"):
+            raise RuntimeError(f"[PANEL] Serwer: {reply.get('error')}")
+        return reply
+
+    def panel(self) -> CompactPanel:
+        """Aktualna migawka; po refresh serwera wystarczy wywołać ponownie."""
+        if self.blocks is None or self.blocks.arrays["meta"][RETIRED]:
+            if self.blocks is not None:
+                self.blocks.close()
+                self.blocks = None
+            for attempt in range(ATTACH_RETRIES):
+                try:
+                    self.blocks = _Blocks.attach(self._call("spec")["spec"])
+                    break
+                except FileNotFoundError:  # serwer opublikował nową generację po wysłaniu spec
+                    if attempt == ATTACH_RETRIES - 1:
+                        raise
+            count("panel_server.attach")
+        return self.blocks.panel()
+
+    def status(self) -> dict:
+        return self._call("status")["status"]
+
+    def refresh(self, allow_download: bool = False) -> dict:
+        return self._call("refresh", allow_download=allow_download)["status"]
+
+    def rebuild(self) -> dict:
+        return self._call("rebuild")["status"]
+
+    def stop(self) -> None:
+        self._call("stop")
+
+    def close(self) -> None:
+        if self.blocks is not None:
+            self.blocks.close()
+            self.blocks = None
+        self.conn.close()
+
+
+def open_panel(address: str = PANEL_ADDRESS, fallback: bool = True) -> CompactPanel:
+    """
+    Panel z serwera, a gdy serwer nie działa (i fallback=True) – lokalny
+    compact_store.load_or_build(). Połączenie żyje tak długo jak panel.
+    """
+    try:
+        client = PanelClient(address)
+    except (FileNotFoundError, ConnectionRefusedError):
+        if not fallback:
+            raise
+        print(f"[PANEL] Brak serwera pod {address} – wczytuję panel lokalnie.")
+        return load_or_build()
+    panel = client.panel()
+    panel._client = client  # widoki wskazują na bloki klienta – trzymamy go przy życiu
+    return panel
+
+
+# -------------------------------------------------------------
+# CLI
+# -------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Panel cen w pamięci współdzielonej dla równoległych zadań")
+    parser.add_argument("--panel", default=None, help="plik compact_store (.npz); domyślnie cały magazyn CSV")
+    parser.add_argument("--reserve-rows", type=int, default=RESERVE_ROWS)
+    parser.add_argument("--address", default=PANEL_ADDRESS)
+    parser.add_argument("--status", action="store_true", help="stan działającego serwera")
+    parser.add_argument("--refresh", action="store_true", help="dociągnij nowe słupki w działającym serwerze")
+    parser.add_argument("--download", action="store_true", help="przy --refresh także z Yahoo")
+    parser.add_argument("--rebuild", action="store_true", help="pełne wczytanie magazynu w działającym serwerze")
+    parser.add_argument("--stop", action="store_true", help="zatrzymaj działający serwer")
+    args = parser.parse_args()
+
+    if args.status or args.refresh or args.rebuild or args.stop:
+        with PanelClient(args.address) as client:
+            if args.stop:
+                client.stop()
+                print("[PANEL] Wysłano stop.")
+            else:
+                t0 = time.perf_counter()
+                st = (client.refresh(args.download) if args.refresh
+                      else client.rebuild() if args.rebuild else client.status())
+                for k, v in st.items():
+                    print(f"  {k:<15} {v}")
+                print(f"[PANEL] {time.perf_counter() - t0:.2f}s")
+        raise SystemExit(0)
+
+    panel = CompactPanel.load(args.panel) if args.panel else build_panel()
+    PanelServer(panel, address=args.address, reserve_rows=args.reserve_rows).serve()
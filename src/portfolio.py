@@ -1,14 +1,10 @@
 import pandas as pd
 from datetime import datetime
-from db import (
-    update_position,
-    remove_position,
-    record_transaction,
-)
-import sqlite3
-from pathlib import Path
 
-DB_PATH = Path("data/portfolio.db")
+from db import get_connection
+from indicators import IndicatorCache
+from sell_rules import evaluate_exit_rules
+from trade_engine import build_rebalance_orders, execute_orders
 
 
 # ==============================================================
@@ -16,7 +12,7 @@ DB_PATH = Path("data/portfolio.db")
 # ==============================================================
 
 def load_positions():
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     df = pd.read_sql("SELECT * FROM portfolio_positions", conn)
     conn.close()
     return df
@@ -33,6 +29,7 @@ def process_sell_signals(
     price_data,
     fx_row,
     exit_threshold=-0.05,  # ROC12 < -5%
+    indicators=None,
 ):
     """
     Generates SELL signals based on:
@@ -45,9 +42,11 @@ def process_sell_signals(
       today: "YYYY-MM-DD"
       regime_a: "BULL" or "BEAR"
       top5_tickers: list of strings
-      price_data: dict[ticker] = DataFrame with columns:
-           Close, SMA200, ROC12
+      price_data: dict[ticker] = DataFrame with column Close
       fx_row: row with fx rates
+      indicators: optional IndicatorCache shared with other stages;
+           built from price_data when not given (Close, SMA200 and ROC12
+           are computed there, not expected as columns)
     """
 
     positions = load_positions()
@@ -55,8 +54,6 @@ def process_sell_signals(
         print("[SELL] No open positions → nothing to evaluate.")
         return []
 
-    sell_list = []  # list of tickers to sell today
-
     # =====================================================
     # 1. MARKET BEAR → SELL EVERYTHING
     # =====================================================
@@ -66,40 +63,39 @@ def process_sell_signals(
         return sell_list  # no further checks needed
 
     # =====================================================
-    # 2–4. Evaluate each stock individually
+    # 2–4. Evaluate all positions at once (vectorized rules)
     # =====================================================
-    for _, pos in positions.iterrows():
-        ticker = pos["ticker"]
-        currency = pos["currency"]
-        qty = pos["quantity"]
-
+    held = []
+    for ticker in positions["ticker"]:
         df = price_data.get(ticker)
         if df is None or df.empty:
             print(f"[SELL] No price data for {ticker}, skipping...")
             continue
-
-        close = df["Close"].iloc[-1]
-        sma200 = df["SMA200"].iloc[-1]
-        roc12 = df["ROC12"].iloc[-1]
-
-        # ---- Rule 2: not in TOP5 ----
-        if ticker not in top5_tickers:
+        held.append(ticker)
+
+    if indicators is None:
+        indicators = IndicatorCache.from_price_data({t: price_data[t] for t in held})
+
+    reasons = evaluate_exit_rules(
+        held,
+        regime_a,
+        top5_tickers,
+        indicators,
+        roc12_threshold=exit_threshold,
+    )
+
+    roc12 = indicators.at("roc", tickers=held, periods=252)
+    for ticker, rules in reasons.items():
+        first = rules[0]
+        if first == "NOT_IN_TOP":
             print(f"[SELL] {ticker} dropped out of TOP5 → SELL today.")
-            sell_list.append(ticker)
-            continue
-
-        # ---- Rule 3: momentum exit threshold ----
-        if roc12 < exit_threshold:
-            print(f"[SELL] {ticker} ROC12={roc12:.2%} < {exit_threshold:.2%} → SELL.")
-            sell_list.append(ticker)
-            continue
-
-        # ---- Rule 4: trend broken ----
-        if close < sma200:
+        elif first == "MOMENTUM":
+            print(f"[SELL] {ticker} ROC12={roc12[ticker]:.2%} < {exit_threshold:.2%} → SELL.")
+        elif first == "TREND":
             print(f"[SELL] {ticker} Close < SMA200 → SELL.")
-            sell_list.append(ticker)
-            continue
 
+    # kolejność jak w tabeli pozycji
+    sell_list = [t for t in held if t in reasons]
     return sell_list
 
 
@@ -107,66 +103,26 @@ def process_sell_signals(
 # Execute SELL orders and update DB
 # ==============================================================
 
-def execute_sell_orders(today, sell_list, price_data, fx_row, regime):
-    """Perform SELL transactions and update DB."""
+def execute_sell_orders(today, sell_list, price_data, fx_row, regime, costs=None):
+    """Perform SELL transactions and update DB (one batch)."""
     if not sell_list:
         print("[SELL] No sell signals today.")
         return
 
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
-    for ticker in sell_list:
-
-        # Load position
-        row = cur.execute("""
-            SELECT quantity, currency
-            FROM portfolio_positions
-            WHERE ticker=?
-        """, (ticker,)).fetchone()
-
-        if row is None:
-            print(f"[SELL] Attempted to sell {ticker}, but position not found.")
-            continue
-
-        qty, currency = row
-
-        # Get price
-        df = price_data[ticker]
-        price_ccy = df["Close"].iloc[-1]
-
-        # FX conversion
-        if currency == "USD":
-            fx_rate = fx_row["USD"]
-        elif currency == "EUR":
-            fx_rate = fx_row["EUR"]
-        else:
-            fx_rate = 1.0
-
-        price_pln = price_ccy * fx_rate
-
-        # ---------------------------------------------------
-        # Record transaction
-        # ---------------------------------------------------
-        record_transaction(
-            timestamp=today,
-            ticker=ticker,
-            side="SELL",
-            quantity=qty,
-            price_ccy=price_ccy,
-            currency=currency,
-            price_pln=price_pln,
-            regime=regime,
-            note="SELL triggered by rules"
-        )
-
-        # Remove position from table
-        remove_position(ticker)
-
-        print(f"[SELL EXECUTED] {ticker}: sold {qty} @ {price_ccy:.2f} {currency} "
-              f"({price_pln:.2f} PLN)")
-
-    conn.close()
+    positions = load_positions()
+    missing = [t for t in sell_list if t not in set(positions["ticker"])]
+    for ticker in missing:
+        print(f"[SELL] Attempted to sell {ticker}, but position not found.")
+
+    # full exit of every listed position: no targets → target qty = 0
+    orders = build_rebalance_orders(
+        positions[positions["ticker"].isin(sell_list)],
+        alloc_df=None,
+        price_data=price_data,
+        fx_row=fx_row,
+        costs=costs,
+    )
+    execute_orders(today, orders, regime=regime, note="SELL triggered by rules")
 
 # ==============================================================
 # BUILD TARGET ALLOCATION (MONTHLY REBALANCING)
@@ -0,0 +1,104 @@
+# src/portfolio_config.py
+
+"""
+Konfiguracja wielu portfeli (kont) dla jednego przebiegu silnika.
+
+Plik JSON (przykład: src/config/portfolios.example.json):
+
+    {
+      "portfolios": [
+        {"name": "main", "db": "data/portfolio.db", "contribution": 2000},
+        {"name": "ike", "db": "data/portfolios/ike.db", "contribution": 500,
+         "currency": "EUR", "top_n": 3, "broker": "xtb"}
+      ]
+    }
+
+Pola portfela:
+  name         – etykieta w logach i raporcie (unikalna)
+  db           – plik SQLite z księgą portfela (osobny na konto)
+  contribution – miesięczna wpłata w walucie `currency` (domyślnie 2000)
+  currency     – waluta wpłaty, przeliczana na PLN kursem z dnia (PLN/USD/EUR)
+  top_n        – ile spółek z rankingu momentum trzymać (domyślnie 5)
+  broker       – model kosztów z costs.BROKERS (domyślnie MOMENTUM_BROKER)
+
+Księgi i wyceny nadal prowadzone są w PLN – `currency` dotyczy tylko wpłat.
+
+    specs = load_portfolios("src/config/portfolios.json")
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import List
+
+from costs import BROKERS
+from db import DB_PATH
+
+DEFAULT_CONTRIBUTION = 2000
+DEFAULT_TOP_N = 5
+CURRENCIES = ("PLN", "USD", "EUR")
+
+
+class PortfolioSpec:
+    """Parametry jednego portfela; domyślne = dotychczasowy pojedynczy portfel."""
+
+    def __init__(
+        self,
+        name: str = "main",
+        db: str | Path | None = None,
+        contribution: float = DEFAULT_CONTRIBUTION,
+        currency: str = "PLN",
+        top_n: int = DEFAULT_TOP_N,
+        broker: str | None = None,
+    ):
+        if currency not in CURRENCIES:
+            raise ValueError(f"Portfel {name!r}: nieobsługiwana waluta {currency!r}. Dostępne: {CURRENCIES}")
+        if int(top_n) < 1:
+            raise ValueError(f"Portfel {name!r}: top_n musi być >= 1 (jest {top_n})")
+        if broker is not None and broker not in BROKERS:
+            raise ValueError(f"Portfel {name!r}: nieznany broker {broker!r}. Dostępne: {sorted(BROKERS)}")
+
+        self.name = name
+        self.db = Path(db) if db is not None else None
+        self.contribution = float(contribution)
+        self.currency = currency
+        self.top_n = int(top_n)
+        self.broker = broker
+
+    def __repr__(self) -> str:
+        return (f"PortfolioSpec({self.name}: db={self.db or DB_PATH}, wpłata {self.contribution:g} {self.currency}, "
+                f"top {self.top_n}, broker {self.broker or 'domyślny'})")
+
+    def contribution_pln(self, fx_row) -> float:
+        """Miesięczna wpłata przeliczona na PLN (fx_row: kursy USD / EUR w PLN)."""
+        rate = 1.0 if self.currency == "PLN" else float(fx_row[self.currency])
+        return round(self.contribution * rate, 2)
+
+
+def load_portfolios(path: str | Path) -> List[PortfolioSpec]:
+    """Wczytuje i waliduje listę portfeli z pliku JSON."""
+    path = Path(path)
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+
+    entries = raw.get("portfolios", []) if isinstance(raw, dict) else raw
+    if not entries:
+        raise ValueError(f"{path}: brak portfeli w konfiguracji")
+
+    fields = {"name", "db", "contribution", "currency", "top_n", "broker"}
+    specs = []
+    for i, entry in enumerate(entries):
+        unknown = set(entry) - fields
+        if unknown:
+            raise ValueError(f"{path}: portfel #{i + 1} ma nieznane pola {sorted(unknown)}")
+        if "name" not in entry or "db" not in entry:
+            raise ValueError(f"{path}: portfel #{i + 1} musi mieć 'name' i 'db'")
+        specs.append(PortfolioSpec(**entry))
+
+    for attr in ("name", "db"):
+        values = [str(getattr(s, attr)) for s in specs]
+        dupes = sorted({v for v in values if values.count(v) > 1})
+        if dupes:
+            raise ValueError(f"{path}: powtórzone '{attr}': {dupes} – każdy portfel potrzebuje własnej księgi")
+    return specs
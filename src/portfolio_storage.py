@@ -1,5 +1,5 @@
 import pandas as pd
-from db import get_connection
+from db import get_connection, invalidate_snapshots
 
 
 # ---------------------------------------------------------
@@ -34,6 +34,7 @@ def record_contribution(timestamp, amount_pln):
         """,
         (timestamp, amount_pln),
     )
+    invalidate_snapshots(conn, str(timestamp)[:10])
 
     conn.commit()
     conn.close()
@@ -41,6 +42,30 @@ def record_contribution(timestamp, amount_pln):
     print(f"[CONTRIBUTION] Saved contribution: {amount_pln} PLN on {timestamp}")
 
 
+# ---------------------------------------------------------
+# Cash in PLN (contributions minus net trading)
+# ---------------------------------------------------------
+def estimate_cash_pln():
+    """
+    Gotówka na koncie w PLN:
+      wpłaty (contributions + cash_flows) - zakupy + sprzedaże (transactions, w PLN).
+    """
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        contributed = cur.execute("SELECT COALESCE(SUM(amount_pln), 0) FROM external_flows").fetchone()[0]
+        traded = cur.execute(
+            """
+            SELECT COALESCE(SUM(CASE WHEN side = 'BUY' THEN -quantity * price_pln
+                                     ELSE quantity * price_pln END), 0)
+            FROM transactions
+            """
+        ).fetchone()[0]
+    finally:
+        conn.close()
+    return round(contributed + traded, 2)
+
+
 # ---------------------------------------------------------
 # Compute total equity in PLN
 # ---------------------------------------------------------
@@ -0,0 +1,372 @@
+# src/price_integrity.py
+
+"""
+Kontrola integralności magazynu cen (data/prices/*.csv).
+
+Dociąganie z Yahoo (data_loader) tylko deduplikuje daty – brakujące
+sesje, zera, powtórzone notowania czy pojedyncze błędne ticki trafiają
+do CSV bez ostrzeżenia i psują ranking momentum. Ten moduł skanuje
+magazyn wektorowo: wszystkie tickery trafiają do jednego panelu
+[data x ticker] (siatka = unia dat tickerów i sesji giełdy), a każda
+kontrola to jedna operacja numpy na całym panelu – jedno przejście
+po każdej kolumnie, bez pętli po tickerach i wierszach.
+
+Rodzaje problemów (kolumna `kind`):
+
+  do ponownego pobrania (REFETCH_KINDS):
+    gap          – brak sesji giełdy między pierwszym a ostatnim notowaniem
+    nan          – wiersz jest, ale bez ceny zamknięcia
+    nonpositive  – cena <= 0
+    outlier      – skok |log-zwrot| > MAX_LOG_RETURN odwrócony następnego
+                   dnia (pojedynczy błędny tick)
+    stale        – >= STALE_RUN identycznych zamknięć z rzędu
+
+  informacyjne:
+    split        – skok Close bez skoku Adj Close (split w danych
+                   nieskorygowanych – patrz warstwa korekt)
+    jump         – duży, trwały ruch ceny (może być prawdziwy)
+    off_calendar – notowanie w dzień bez sesji (święto, weekend)
+
+Wyniki są cache'owane per plik po sumie kontrolnej (blake2b zawartości):
+kolejny skan czyta ponownie tylko zmienione CSV. Z listy problemów
+refetch_list() buduje {ticker: data od której pobrać ponownie}, a repair()
+przekazuje ją do data_loader.refetch_from_yahoo().
+
+    issues = scan_store()                         # DataFrame problemów
+    todo = refetch_list(issues)                   # {"AAPL": Timestamp(...)}
+    repair(todo)                                  # ponowne pobranie z Yahoo
+    python src/price_integrity.py --repair
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+import data_loader
+from instrumentation import count
+from trading_calendar import DEFAULT_EXCHANGE, get_calendar
+
+INTEGRITY_DIR = Path(__file__).resolve().parent.parent / "data" / "integrity"
+CACHE_NAME = "issues.pkl"
+
+MAX_LOG_RETURN = 0.4    # |ln(P_t / P_t-1)| > 0.4 ≈ +49% / -33% w jedną sesję
+STALE_RUN = 5           # tyle identycznych zamknięć z rzędu = zamrożone notowanie
+
+# ile tickerów walidujemy naraz (panel [T x CHUNK_SIZE], ~15 macierzy roboczych)
+CHUNK_SIZE = 250
+
+REFETCH_KINDS = ("gap", "nan", "nonpositive", "outlier", "stale")
+INFO_KINDS = ("split", "jump", "off_calendar")
+KINDS = REFETCH_KINDS + INFO_KINDS
+
+ISSUE_COLUMNS = ["ticker", "kind", "start", "end", "rows", "detail"]
+
+
+# -------------------------------------------------------------
+# Panel
+# -------------------------------------------------------------
+def _stack(frames: Dict[str, pd.DataFrame], sessions: np.ndarray):
+    """
+    Wspólna siatka dat (unia dat tickerów i sesji w ich zakresie) oraz
+    macierze [T x K]: Close, Adj Close (NaN gdy brak kolumny), present.
+    """
+    tickers = list(frames)
+    days = [frames[t].index.to_numpy().astype("datetime64[D]") for t in tickers]
+    nonempty = [d for d in days if len(d)]
+    if not nonempty:
+        return np.array([], dtype="datetime64[D]"), tickers, np.empty((0, len(tickers))), None, None
+    lo = min(d[0] for d in nonempty)
+    hi = max(d[-1] for d in nonempty)
+    grid = np.union1d(np.concatenate(nonempty), sessions[(sessions >= lo) & (sessions <= hi)])
+
+    shape = (len(grid), len(tickers))
+    close = np.full(shape, np.nan)
+    adj = np.full(shape, np.nan)
+    present = np.zeros(shape, dtype=bool)
+    for j, (t, d) in enumerate(zip(tickers, days)):
+        rows = np.searchsorted(grid, d)
+        present[rows, j] = True
+        close[rows, j] = frames[t]["Close"].to_numpy(dtype=float)
+        if "Adj Close" in frames[t]:
+            adj[rows, j] = frames[t]["Adj Close"].to_numpy(dtype=float)
+    return grid, tickers, close, adj, present
+
+
+def _log_returns(values: np.ndarray, valid: np.ndarray):
+    """
+    Log-zwrot od poprzedniego ważnego wiersza kolumny (luki w siatce nie
+    przerywają szeregu) + indeks następnego ważnego wiersza. Wektorowo:
+    maximum.accumulate po indeksach ważnych wierszy.
+    """
+    t = values.shape[0]
+    rows = np.arange(t)[:, None]
+    last = np.maximum.accumulate(np.where(valid, rows, -1), axis=0)
+    prev = np.vstack([np.full((1, values.shape[1]), -1), last[:-1]])
+    prev_val = np.take_along_axis(values, np.maximum(prev, 0), axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ret = np.where(valid & (prev >= 0), np.log(values / prev_val), np.nan)
+
+    nxt = np.minimum.accumulate(np.where(valid, rows, t)[::-1], axis=0)[::-1]
+    nxt = np.vstack([nxt[1:], np.full((1, values.shape[1]), t)])
+    return ret, prev_val, nxt
+
+
+def _run_length(mask: np.ndarray) -> np.ndarray:
+    """Długość całego ciągu True, do którego należy każda komórka (0 poza ciągami)."""
+    def forward(m):
+        c = np.cumsum(m, axis=0)
+        return c - np.maximum.accumulate(np.where(~m, c, 0), axis=0)
+
+    return np.where(mask, forward(mask) + forward(mask[::-1])[::-1] - 1, 0)
+
+
+def _issues(kind: str, mask: np.ndarray, grid: np.ndarray, tickers: List[str], detail=None) -> pd.DataFrame:
+    """Komórki maski → ciągi kolejnych wierszy siatki per ticker (start, end, rows)."""
+    cols, rows = np.nonzero(mask.T)
+    if len(rows) == 0:
+        return pd.DataFrame(columns=ISSUE_COLUMNS)
+    new_run = np.r_[True, (np.diff(cols) != 0) | (np.diff(rows) != 1)]
+    starts = np.flatnonzero(new_run)
+    ends = np.r_[starts[1:], len(rows)] - 1
+    return pd.DataFrame({
+        "ticker": np.asarray(tickers, dtype=object)[cols[starts]],
+        "kind": kind,
+        "start": pd.DatetimeIndex(grid[rows[starts]]),
+        "end": pd.DatetimeIndex(grid[rows[ends]]),
+        "rows": ends - starts + 1,
+        "detail": detail[rows[starts], cols[starts]] if detail is not None else np.nan,
+    })
+
+
+def validate_panel(
+    frames: Dict[str, pd.DataFrame],
+    exchange: str = DEFAULT_EXCHANGE,
+    max_log_return: float = MAX_LOG_RETURN,
+    stale_run: int = STALE_RUN,
+) -> pd.DataFrame:
+    """
+    Wszystkie kontrole naraz na panelu {ticker: ramka z kolumną Close
+    (i opcjonalnie Adj Close)}. Zwraca DataFrame ISSUE_COLUMNS;
+    detail = współczynnik skoku (split / jump / outlier) albo powtarzana
+    cena (stale).
+    """
+    sessions = get_calendar(exchange).sessions
+    grid, tickers, close, adj, present = _stack(frames, sessions)
+    if len(grid) == 0:
+        return pd.DataFrame(columns=ISSUE_COLUMNS)
+
+    rows = np.arange(len(grid))[:, None]
+    first = np.where(present.any(axis=0), present.argmax(axis=0), len(grid))
+    last = len(grid) - 1 - present[::-1].argmax(axis=0)
+    in_span = (rows >= first) & (rows <= last)
+    is_session = np.isin(grid, sessions)[:, None]
+
+    valid = present & np.isfinite(close) & (close > 0)
+    ret, prev_close, nxt = _log_returns(close, valid)
+    ret_next = np.take_along_axis(np.vstack([ret, np.full((1, ret.shape[1]), np.nan)]), nxt, axis=0)
+
+    big = np.abs(np.nan_to_num(ret)) > max_log_return
+    adj_valid = present & np.isfinite(adj) & (adj > 0)
+    adj_ret, _, _ = _log_returns(adj, adj_valid)
+    has_adj = adj_valid.any(axis=0)
+    split = big & has_adj & ~(np.abs(np.nan_to_num(adj_ret)) > max_log_return)
+    outlier = big & ~split & (np.abs(np.nan_to_num(ret + ret_next, nan=np.inf)) < max_log_return / 2)
+    # powrót po błędnym ticku (następny ważny wiersz) to część outliera, nie osobny skok
+    reverted = np.zeros_like(outlier)
+    r, c = np.nonzero(outlier)
+    keep = nxt[r, c] < len(grid)
+    reverted[nxt[r, c][keep], c[keep]] = True
+    jump = big & ~split & ~outlier & ~reverted
+
+    same = valid & (close == prev_close)
+    # stale_run identycznych cen = stale_run - 1 kolejnych "równa poprzedniej";
+    # do ciągu dokładamy pierwsze notowanie (to, które było powtarzane)
+    stale = _run_length(same) >= stale_run - 1
+    stale |= valid & np.take_along_axis(np.vstack([stale, np.zeros((1, stale.shape[1]), dtype=bool)]), nxt, axis=0)
+
+    ratio = np.exp(ret)
+    parts = [
+        _issues("gap", is_session & in_span & ~present, grid, tickers),
+        _issues("nan", present & ~np.isfinite(close), grid, tickers),
+        _issues("nonpositive", present & (close <= 0), grid, tickers),
+        _issues("outlier", outlier, grid, tickers, ratio),
+        _issues("stale", stale, grid, tickers, close),
+        _issues("split", split, grid, tickers, ratio),
+        _issues("jump", jump, grid, tickers, ratio),
+        _issues("off_calendar", present & ~is_session, grid, tickers),
+    ]
+    parts = [p for p in parts if len(p)]
+    if not parts:
+        return pd.DataFrame(columns=ISSUE_COLUMNS)
+    return pd.concat(parts, ignore_index=True).sort_values(["ticker", "start", "kind"], ignore_index=True)
+
+
+# -------------------------------------------------------------
+# Cache po sumie kontrolnej pliku
+# -------------------------------------------------------------
+def file_checksum(path: Path) -> str:
+    return hashlib.blake2b(path.read_bytes(), digest_size=16).hexdigest()
+
+
+def _params(exchange: str, max_log_return: float, stale_run: int) -> dict:
+    return {"exchange": exchange, "max_log_return": max_log_return, "stale_run": stale_run}
+
+
+def _load_cache(path: Path, params: dict) -> tuple[dict, pd.DataFrame]:
+    """({ticker: suma kontrolna}, problemy tych tickerów); inne parametry skanu = pusty cache."""
+    empty = ({}, pd.DataFrame(columns=ISSUE_COLUMNS))
+    if not path.exists():
+        return empty
+    try:
+        raw = pd.read_pickle(path)
+    except Exception:
+        return empty
+    return (raw["checksums"], raw["issues"]) if raw.get("params") == params else empty
+
+
+def _save_cache(path: Path, params: dict, checksums: dict, issues: pd.DataFrame) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    pd.to_pickle({"params": params, "checksums": checksums, "issues": issues}, tmp)
+    os.replace(tmp, path)
+
+
+def _concat(parts: List[pd.DataFrame]) -> pd.DataFrame:
+    parts = [p for p in parts if len(p)]
+    if not parts:
+        return pd.DataFrame(columns=ISSUE_COLUMNS)
+    return pd.concat(parts, ignore_index=True).sort_values(["ticker", "start", "kind"], ignore_index=True)
+
+
+def _read_prices(path: Path) -> pd.DataFrame:
+    """Tylko kolumny potrzebne do walidacji (Close, opcjonalnie Adj Close)."""
+    return pd.read_csv(
+        path,
+        usecols=lambda c: c in ("Date", "Close", "Adj Close"),
+        parse_dates=["Date"],
+        date_format="%Y-%m-%d",
+        index_col="Date",
+    ).sort_index()
+
+
+def store_tickers(store_dir: Path | None = None) -> List[str]:
+    store_dir = Path(store_dir or data_loader.DATA_DIR)
+    return sorted(p.stem for p in store_dir.glob("*.csv"))
+
+
+def scan_store(
+    tickers: Iterable[str] | None = None,
+    store_dir: str | Path | None = None,
+    cache_dir: str | Path | None = INTEGRITY_DIR,
+    exchange: str = DEFAULT_EXCHANGE,
+    max_log_return: float = MAX_LOG_RETURN,
+    stale_run: int = STALE_RUN,
+    force: bool = False,
+) -> pd.DataFrame:
+    """
+    Skan magazynu CSV. Pliki o niezmienionej sumie kontrolnej biorą wynik
+    z cache (cache_dir=None wyłącza cache, force=True skanuje wszystko);
+    zmienione walidowane są blokami po CHUNK_SIZE tickerów.
+    Zwraca DataFrame ISSUE_COLUMNS posortowany po tickerze i dacie.
+    """
+    store_dir = Path(store_dir or data_loader.DATA_DIR)
+    tickers = list(tickers) if tickers is not None else store_tickers(store_dir)
+    params = _params(exchange, max_log_return, stale_run)
+    cache_path = Path(cache_dir) / CACHE_NAME if cache_dir else None
+    sums, cached = _load_cache(cache_path, params) if cache_path and not force else ({}, None)
+
+    hits, frames, fresh = [], {}, []
+    for t in tickers:
+        path = store_dir / f"{t}.csv"
+        if not path.exists():
+            continue
+        checksum = file_checksum(path)
+        if sums.get(t) == checksum:
+            count("integrity_cache.hit")
+            hits.append(t)
+            continue
+        count("integrity_cache.miss")
+        sums[t] = checksum
+        frames[t] = _read_prices(path)
+        if len(frames) >= CHUNK_SIZE:
+            fresh.append(validate_panel(frames, exchange, max_log_return, stale_run))
+            frames.clear()
+    if frames:
+        fresh.append(validate_panel(frames, exchange, max_log_return, stale_run))
+
+    scanned = [t for t in tickers if t in sums and t not in hits]
+    previous = cached if cached is not None else pd.DataFrame(columns=ISSUE_COLUMNS)
+    if scanned and cache_path:
+        # cache trzyma wszystkie kiedykolwiek skanowane tickery, nie tylko te z wywołania
+        _save_cache(cache_path, params, sums, _concat([previous[~previous["ticker"].isin(scanned)], *fresh]))
+    return _concat([previous[previous["ticker"].isin(hits)], *fresh])
+
+
+# -------------------------------------------------------------
+# Lista do ponownego pobrania / naprawa
+# -------------------------------------------------------------
+def refetch_list(issues: pd.DataFrame, kinds: Iterable[str] = REFETCH_KINDS) -> Dict[str, pd.Timestamp]:
+    """{ticker: najwcześniejsza data problemu} dla problemów z `kinds`."""
+    bad = issues[issues["kind"].isin(list(kinds))]
+    if bad.empty:
+        return {}
+    return {t: pd.Timestamp(d) for t, d in bad.groupby("ticker")["start"].min().items()}
+
+
+def repair(refetch: Dict[str, pd.Timestamp], end=None) -> Dict[str, int]:
+    """
+    Pobiera ponownie z Yahoo wiersze od daty z listy (data_loader.refetch_from_yahoo)
+    i zwraca {ticker: liczba wierszy po naprawie}; błędy pobrania nie przerywają pętli.
+    """
+    repaired = {}
+    for ticker, start in sorted(refetch.items()):
+        try:
+            repaired[ticker] = len(data_loader.refetch_from_yahoo(ticker, start, end=end))
+        except Exception as exc:
+            print(f"[INTEGRITY] Nie udało się pobrać ponownie {ticker} od {start:%Y-%m-%d}: {exc}")
+    return repaired
+
+
+def format_issues(issues: pd.DataFrame) -> str:
+    """Podsumowanie: liczba tickerów i wierszy per rodzaj problemu."""
+    lines = [f"{'kind':<14} {'tickery':>8} {'zdarzenia':>10} {'wiersze':>9}"]
+    for kind in KINDS:
+        sub = issues[issues["kind"] == kind]
+        if len(sub):
+            lines.append(f"{kind:<14} {sub['ticker'].nunique():>8} {len(sub):>10} {int(sub['rows'].sum()):>9}")
+    return "\n".join(lines)
+
+
+# -------------------------------------------------------------
+# CLI
+# -------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Kontrola integralności magazynu cen")
+    parser.add_argument("--tickers", nargs="+", default=None, help="domyślnie wszystkie CSV z magazynu")
+    parser.add_argument("--exchange", default=DEFAULT_EXCHANGE)
+    parser.add_argument("--force", action="store_true", help="ignoruj cache sum kontrolnych")
+    parser.add_argument("--repair", action="store_true", help="pobierz ponownie tickery z listy refetch")
+    parser.add_argument("--out", default=None, help="zapisz listę problemów do CSV")
+    args = parser.parse_args()
+
+    issues = scan_store(args.tickers, exchange=args.exchange, force=args.force)
+    print(f"[INTEGRITY] Magazyn {data_loader.DATA_DIR}: {len(issues)} zdarzeń\n")
+    print(format_issues(issues))
+    if args.out:
+        issues.to_csv(args.out, index=False)
+        print(f"\n[INTEGRITY] Lista → {args.out}")
+
+    todo = refetch_list(issues)
+    print(f"\n[INTEGRITY] Do ponownego pobrania: {len(todo)} tickerów")
+    for t, start in list(todo.items())[:20]:
+        print(f"  {t:<10} od {start:%Y-%m-%d}")
+    if args.repair and todo:
+        repaired = repair(todo)
+        print(f"\n[INTEGRITY] Naprawione: {len(repaired)}/{len(todo)}")
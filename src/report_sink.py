@@ -0,0 +1,262 @@
+# src/report_sink.py
+
+"""
+Strumieniowy zapis dużych raportów (equity, transakcje) w kawałkach.
+
+Zamiast trzymać całą krzywą equity jako listę słowników i na końcu pisać
+CSV, wiersze trafiają do bufora o stałym rozmiarze (`chunk_size`), który
+po zapełnieniu jest dopisywany na dysk – pamięć nie rośnie z długością
+przebiegu.
+
+Format (bez zależności poza numpy) – katalog `<nazwa>.cols/`:
+
+    _schema.json        kolumny, typy, liczba wierszy, słowniki tekstów
+    <kolumna>.bin       surowe wartości little-endian, dopisywane kawałkami
+                          f8    → float64
+                          i8    → int64
+                          date  → int64 (ns od epoki, NaT = INT64_MIN)
+                          str   → int32 (kod w słowniku ze _schema.json)
+
+Kolumny można czytać pojedynczo (np. tylko "equity" do metryk), całość
+albo kawałkami – także eksport do CSV idzie kawałkami:
+
+    with ReportSink("reports/backtest", export_csv=True) as sink:
+        eq = sink.table("equity", {"date": "date", "equity": "f8", "flow": "f8"})
+        for ...:
+            eq.append(date, value, flow)
+    df = read_columnar("reports/backtest/equity.cols", columns=["equity"])
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import count
+
+DEFAULT_CHUNK_SIZE = 10_000
+
+FORMAT = "momentum-columnar"
+VERSION = 1
+
+_DTYPES = {"f8": "<f8", "i8": "<i8", "date": "<i8", "str": "<i4"}
+_BUFFER_DTYPES = {"f8": float, "i8": np.int64, "date": "datetime64[ns]", "str": object}
+
+
+def _schema_path(path: Path) -> Path:
+    return path / "_schema.json"
+
+
+# -------------------------------------------------------------
+# Zapis
+# -------------------------------------------------------------
+class ColumnarWriter:
+    """Jedna tabela: bufor `chunk_size` wierszy → dopisywanie do plików kolumn."""
+
+    def __init__(self, path: str | Path, columns: Dict[str, str], chunk_size: int = DEFAULT_CHUNK_SIZE):
+        unknown = {k for k in columns.values() if k not in _DTYPES}
+        if unknown:
+            raise ValueError(f"Nieznane typy kolumn: {sorted(unknown)}. Dostępne: {sorted(_DTYPES)}")
+
+        self.path = Path(path)
+        self.columns = dict(columns)
+        self.chunk_size = chunk_size
+        self.rows = 0
+        self.chunks: List[int] = []
+        self._dictionaries: Dict[str, Dict[str, int]] = {c: {} for c, k in columns.items() if k == "str"}
+        self._buffer = {c: np.empty(chunk_size, dtype=_BUFFER_DTYPES[k]) for c, k in columns.items()}
+        self._n = 0
+        self._closed = False
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        for c in self.columns:
+            (self.path / f"{c}.bin").write_bytes(b"")
+        self._write_schema()
+
+    # ---------------------------------------------------------
+    def append(self, *values, **named) -> None:
+        """Jeden wiersz (pozycyjnie w kolejności kolumn albo po nazwach)."""
+        row = named if named else dict(zip(self.columns, values))
+        i = self._n
+        for c in self.columns:
+            self._buffer[c][i] = row.get(c)
+        self._n += 1
+        if self._n == self.chunk_size:
+            self.flush()
+
+    def extend(self, frame: pd.DataFrame | Dict[str, Iterable]) -> None:
+        """Wiele wierszy naraz (np. cały blok wyników) – dzielone na kawałki."""
+        data = {c: np.asarray(frame[c]) for c in self.columns}
+        n = len(next(iter(data.values()))) if data else 0
+        start = 0
+        while start < n:
+            take = min(self.chunk_size - self._n, n - start)
+            for c in self.columns:
+                self._buffer[c][self._n:self._n + take] = data[c][start:start + take]
+            self._n += take
+            start += take
+            if self._n == self.chunk_size:
+                self.flush()
+
+    # ---------------------------------------------------------
+    def _encode(self, column: str, kind: str, values: np.ndarray) -> np.ndarray:
+        if kind == "date":
+            return pd.to_datetime(values).to_numpy(dtype="datetime64[ns]").view("<i8")
+        if kind == "str":
+            codes = self._dictionaries[column]
+            return np.array([codes.setdefault(str(v), len(codes)) for v in values], dtype="<i4")
+        return values.astype(_DTYPES[kind])
+
+    def flush(self) -> None:
+        if self._n == 0:
+            return
+        for c, kind in self.columns.items():
+            raw = self._encode(c, kind, self._buffer[c][: self._n])
+            with open(self.path / f"{c}.bin", "ab") as fh:
+                fh.write(raw.tobytes())
+        self.rows += self._n
+        self.chunks.append(self._n)
+        count("report_sink.chunk")
+        self._n = 0
+        self._write_schema()
+
+    def _write_schema(self) -> None:
+        schema = {
+            "format": FORMAT,
+            "version": VERSION,
+            "rows": self.rows,
+            "chunks": self.chunks,
+            "columns": [{"name": c, "kind": k} for c, k in self.columns.items()],
+            "dictionaries": {c: list(d) for c, d in self._dictionaries.items()},
+        }
+        tmp = _schema_path(self.path).with_suffix(".tmp")
+        tmp.write_text(json.dumps(schema), encoding="utf-8")
+        os.replace(tmp, _schema_path(self.path))
+
+    def close(self) -> None:
+        if not self._closed:
+            self.flush()
+            self._closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ReportSink:
+    """
+    Zestaw tabel jednego przebiegu w katalogu `root`
+    (np. reports/backtest/equity.cols, reports/backtest/trades.cols).
+    Przy export_csv=True zamknięcie eksportuje też każdą tabelę do CSV
+    (kawałkami, obok katalogu .cols).
+    """
+
+    def __init__(self, root: str | Path, chunk_size: int = DEFAULT_CHUNK_SIZE, export_csv: bool = False):
+        self.root = Path(root)
+        self.chunk_size = chunk_size
+        self.export_csv = export_csv
+        self.tables: Dict[str, ColumnarWriter] = {}
+
+    def table(self, name: str, columns: Dict[str, str]) -> ColumnarWriter:
+        if name not in self.tables:
+            self.tables[name] = ColumnarWriter(self.root / f"{name}.cols", columns, self.chunk_size)
+        return self.tables[name]
+
+    def close(self) -> Dict[str, Path]:
+        """Zamyka tabele; zwraca {nazwa: ścieżka} (CSV, jeśli eksport)."""
+        out = {}
+        for name, writer in self.tables.items():
+            writer.close()
+            out[name] = writer.path
+            if self.export_csv:
+                out[name] = export_csv(writer.path, self.root / f"{name}.csv")
+        return out
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# -------------------------------------------------------------
+# Odczyt
+# -------------------------------------------------------------
+def read_schema(path: str | Path) -> dict:
+    schema = json.loads(_schema_path(Path(path)).read_text(encoding="utf-8"))
+    if schema.get("format") != FORMAT:
+        raise ValueError(f"{path}: nieznany format raportu {schema.get('format')!r}")
+    return schema
+
+
+def _decode(values: np.ndarray, kind: str, dictionary: List[str] | None):
+    if kind == "date":
+        return values.view("datetime64[ns]")
+    if kind == "str":
+        return np.asarray(dictionary, dtype=object)[values] if len(values) else np.array([], dtype=object)
+    return values
+
+
+def iter_columnar(path: str | Path, columns: List[str] | None = None,
+                  chunk_size: int = 100_000) -> Iterator[pd.DataFrame]:
+    """Czyta tabelę kawałkami po `chunk_size` wierszy (memmap, bez wczytania całości)."""
+    path = Path(path)
+    schema = read_schema(path)
+    kinds = {c["name"]: c["kind"] for c in schema["columns"]}
+    cols = columns or list(kinds)
+    rows = schema["rows"]
+
+    if rows == 0:
+        yield pd.DataFrame({
+            c: _decode(np.empty(0, dtype=_DTYPES[kinds[c]]), kinds[c], schema["dictionaries"].get(c))
+            for c in cols
+        })
+        return
+
+    maps = {c: np.memmap(path / f"{c}.bin", dtype=_DTYPES[kinds[c]], mode="r", shape=(rows,)) for c in cols}
+    for start in range(0, rows, chunk_size):
+        stop = min(start + chunk_size, rows)
+        yield pd.DataFrame({
+            c: _decode(np.array(maps[c][start:stop]), kinds[c], schema["dictionaries"].get(c))
+            for c in cols
+        })
+
+
+def read_columnar(path: str | Path, columns: List[str] | None = None) -> pd.DataFrame:
+    """Cała tabela (albo wybrane kolumny) jako DataFrame."""
+    return pd.concat(list(iter_columnar(path, columns)), ignore_index=True)
+
+
+def export_csv(path: str | Path, csv_path: str | Path, chunk_size: int = 100_000) -> Path:
+    """Eksport tabeli do CSV kawałkami (pamięć ograniczona do jednego kawałka)."""
+    csv_path = Path(csv_path)
+    header = True
+    with open(csv_path, "w", newline="", encoding="utf-8") as fh:
+        for chunk in iter_columnar(path, chunk_size=chunk_size):
+            chunk.to_csv(fh, index=False, header=header)
+            header = False
+    return csv_path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Podgląd / eksport raportu kolumnowego (.cols)")
+    parser.add_argument("path", help="katalog tabeli, np. reports/backtest_simple/equity.cols")
+    parser.add_argument("--csv", default=None, help="eksport do CSV")
+    args = parser.parse_args()
+
+    schema = read_schema(args.path)
+    print(f"{args.path}: {schema['rows']} wierszy, kolumny: "
+          + ", ".join(f"{c['name']}:{c['kind']}" for c in schema["columns"]))
+    if args.csv:
+        print(f"→ {export_csv(args.path, args.csv)}")
+    else:
+        print(next(iter_columnar(args.path, chunk_size=10)))
@@ -0,0 +1,201 @@
+# src/run_context.py
+
+"""
+Kontekst danych jednego przebiegu silnika.
+
+Każdy ticker jest ładowany z data_loader DOKŁADNIE RAZ, w najszerszym
+potrzebnym oknie (domyślnie 20 lat do `as_of`). Etapy (regime, momentum,
+equity, sell, buy) dostają widoki (przycięte okna) tej samej ramki,
+więc:
+  - nie ma podwójnego I/O (wcześniej uniwersum 20y + ponownie 2y),
+  - wszystkie etapy widzą ten sam snapshot cen (ten sam ostatni Close).
+
+Ładowanie jest równoległe (pula wątków) i bezpieczne wątkowo – dwa etapy
+proszące o ten sam ticker czekają na jedno pobranie.
+
+    with RunDataContext(as_of="2025-01-10") as ctx:
+        ctx.load(universe)
+        spy = ctx.history("SPY", period="15y")
+        prices_2y = ctx.histories(top5, period="2y")
+
+Kontekst może żyć dłużej niż jeden przebieg (daemon.py): advance(as_of)
+przesuwa okno na nowy dzień i dociąga TYLKO nowe słupki już załadowanych
+tickerów (data_loader.load_new_bars), zamiast czytać historię od nowa.
+
+Ceny są korygowane o splity i dywidendy (adjustments.py) przy odczycie:
+kontekst trzyma surowe ramki z CSV, a load() / history() / histories()
+zwracają widoki skorygowane – te same szeregi co backtesty
+(auto_adjust=True). Ostatni wiersz ma współczynnik 1, więc wyceny
+i ceny zleceń się nie zmieniają. adjust=False = surowe ceny.
+"""
+
+from __future__ import annotations
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable
+
+import pandas as pd
+
+from adjustments import AdjustmentStore
+from data_loader import _period_to_days, load_new_bars, load_single_history
+from instrumentation import count
+
+# Najszersze okno potrzebne w silniku (uniwersum momentum)
+DEFAULT_YEARS = 20
+
+
+class RunDataContext:
+    def __init__(
+        self,
+        as_of: str | pd.Timestamp | None = None,
+        years: int = DEFAULT_YEARS,
+        allow_download: bool = True,
+        max_workers: int = 8,
+        adjust: bool = True,
+        adjustments: AdjustmentStore | None = None,
+    ):
+        self.as_of = pd.to_datetime(as_of).normalize() if as_of is not None else pd.Timestamp.today().normalize()
+        self.years = years
+        self.start = self.as_of - pd.DateOffset(years=years)
+        self.allow_download = allow_download
+        self.adjustments = adjustments or (AdjustmentStore() if adjust else None)
+
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="data")
+        self._lock = threading.Lock()
+        self._futures: Dict[str, Future] = {}
+
+    # ---------------------------------------------------------
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True)
+
+    # ---------------------------------------------------------
+    def _load_one(self, ticker: str) -> pd.DataFrame:
+        df = load_single_history(
+            ticker,
+            start=self.start.strftime("%Y-%m-%d"),
+            end=self.as_of.strftime("%Y-%m-%d"),
+            allow_download=self.allow_download,
+        )
+        if self.adjustments is not None:
+            self.adjustments.update(ticker, df)
+        return df
+
+    def _adjusted(self, ticker: str, df: pd.DataFrame) -> pd.DataFrame:
+        return self.adjustments.adjusted(ticker, df) if self.adjustments is not None else df
+
+    def _future(self, ticker: str) -> Future:
+        with self._lock:
+            fut = self._futures.get(ticker)
+            if fut is None:
+                fut = self._pool.submit(self._load_one, ticker)
+                self._futures[ticker] = fut
+                count("run_context.miss")
+            else:
+                count("run_context.hit")
+        return fut
+
+    def load(self, tickers: Iterable[str], strict: bool = True, raw: bool = False) -> Dict[str, pd.DataFrame]:
+        """
+        Ładuje (raz) podane tickery i zwraca {ticker: pełna ramka}
+        (skorygowana o splity / dywidendy, jeśli kontekst ma adjustments).
+
+        strict=True  → brak danych dla któregokolwiek tickera = ValueError
+                       (tak jak data_loader.load_price_history dla listy),
+        strict=False → tickery bez danych są pomijane z ostrzeżeniem.
+        raw=True     → surowe ceny z CSV (wycena historycznych ilości sztuk).
+        """
+        futures = {t: self._future(t) for t in dict.fromkeys(tickers)}
+
+        result: Dict[str, pd.DataFrame] = {}
+        missing: list[str] = []
+        for ticker, fut in futures.items():
+            try:
+                df = fut.result()
+                result[ticker] = df if raw else self._adjusted(ticker, df)
+            except Exception as exc:
+                print(f"[data_loader] BŁĄD dla {ticker}: {exc}")
+                missing.append(ticker)
+
+        if missing and strict:
+            raise ValueError(f"[data_loader] Brak danych dla: {missing}")
+        return result
+
+    def advance(self, as_of: str | pd.Timestamp) -> Dict[str, int]:
+        """
+        Przesuwa kontekst na dzień `as_of`: dla każdego załadowanego tickera
+        dociąga tylko słupki po jego ostatniej dacie i obcina początek okna.
+        Tickery z błędem ładowania są zapominane (następny load() spróbuje od nowa).
+
+        Zwraca {ticker: liczba nowych słupków}.
+        """
+        as_of = pd.to_datetime(as_of).normalize()
+        if as_of < self.as_of:
+            raise ValueError(f"advance() do tyłu: {as_of:%Y-%m-%d} < {self.as_of:%Y-%m-%d}")
+        self.as_of = as_of
+        self.start = as_of - pd.DateOffset(years=self.years)
+
+        with self._lock:
+            loaded = {t: f for t, f in self._futures.items() if f.done() and f.exception() is None}
+            self._futures = dict(loaded)
+
+        added: Dict[str, int] = {}
+
+        def refresh(ticker: str, df: pd.DataFrame) -> pd.DataFrame:
+            last = df.index.max() if len(df) else self.start
+            new = load_new_bars(ticker, last, end=as_of, allow_download=self.allow_download)
+            added[ticker] = len(new)
+            if len(new):
+                df = pd.concat([df, new])
+            df = df.loc[self.start:]
+            if self.adjustments is not None:
+                self.adjustments.update(ticker, df)
+            return df
+
+        with self._lock:
+            for ticker, fut in loaded.items():
+                self._futures[ticker] = self._pool.submit(refresh, ticker, fut.result())
+            updated = {t: self._futures[t] for t in loaded}
+
+        for ticker, fut in updated.items():
+            if fut.exception() is not None:
+                print(f"[data_loader] BŁĄD przy dociąganiu {ticker}: {fut.exception()}")
+                with self._lock:
+                    self._futures.pop(ticker, None)
+        count("run_context.advance")
+        return added
+
+    @property
+    def tickers(self) -> list[str]:
+        with self._lock:
+            return [t for t, f in self._futures.items() if f.done() and f.exception() is None]
+
+    # ---------------------------------------------------------
+    # Widoki
+    # ---------------------------------------------------------
+    def _window(self, df: pd.DataFrame, period: str | None) -> pd.DataFrame:
+        if period is None:
+            return df
+        start = self.as_of - pd.Timedelta(days=_period_to_days(period))
+        return df.loc[start:]
+
+    def history(self, ticker: str, period: str | None = None) -> pd.DataFrame:
+        """Ramka tickera (opcjonalnie tylko ostatnie `period`, np. '2y')."""
+        return self._window(self.load([ticker])[ticker], period)
+
+    def histories(
+        self,
+        tickers: Iterable[str],
+        period: str | None = None,
+        strict: bool = False,
+        raw: bool = False,
+    ) -> Dict[str, pd.DataFrame]:
+        """{ticker: widok} dla wielu tickerów (domyślnie pomija brakujące)."""
+        frames = self.load(tickers, strict=strict, raw=raw)
+        return {t: self._window(df, period) for t, df in frames.items()}
@@ -1,6 +1,96 @@
 from __future__ import annotations
+import numpy as np
 import pandas as pd
-from typing import List, Dict
+from typing import List, Dict, Iterable
+
+from indicators import IndicatorCache
+
+
+# Reguły wyjścia w kolejności priorytetu
+EXIT_RULES = ["BEAR", "NOT_IN_TOP", "MOMENTUM", "TREND"]
+
+
+def exit_rule_masks(
+    held_tickers: Iterable[str],
+    regime: str,
+    top_tickers: Iterable[str],
+    close: pd.Series | None = None,
+    sma: pd.Series | None = None,
+    roc12: pd.Series | None = None,
+    roc12_threshold: float = -0.05,
+) -> pd.DataFrame:
+    """
+    Wektorowa ocena reguł wyjścia dla wszystkich trzymanych pozycji naraz.
+
+    Zwraca DataFrame bool [ticker x EXIT_RULES]:
+      - BEAR       : rynek w trybie BEAR (dotyczy wszystkich pozycji)
+      - NOT_IN_TOP : ticker wypadł z listy TOP N
+      - MOMENTUM   : ROC12 < roc12_threshold (ułamek, -0.05 = -5%)
+      - TREND      : Close < SMA200
+
+    close / sma / roc12 to Series [ticker]; brak wartości (NaN / brak
+    tickera) = reguła nie jest spełniona.
+    """
+    held = pd.Index(list(held_tickers), name="ticker")
+    n = len(held)
+
+    def values(s: pd.Series | None) -> np.ndarray:
+        if s is None:
+            return np.full(n, np.nan)
+        return s.reindex(held).to_numpy(dtype=float)
+
+    close_v, sma_v, roc_v = values(close), values(sma), values(roc12)
+
+    with np.errstate(invalid="ignore"):
+        masks = {
+            "BEAR": np.full(n, regime == "BEAR"),
+            "NOT_IN_TOP": ~held.isin(list(top_tickers)),
+            "MOMENTUM": roc_v < roc12_threshold,
+            "TREND": close_v < sma_v,
+        }
+    return pd.DataFrame(masks, index=held)[EXIT_RULES]
+
+
+def evaluate_exit_rules(
+    held_tickers: Iterable[str],
+    regime: str,
+    top_tickers: Iterable[str],
+    indicators: IndicatorCache,
+    as_of: pd.Timestamp | str | None = None,
+    roc12_threshold: float = -0.05,
+    sma_window: int = 200,
+    roc_periods: int = 252,
+) -> Dict[str, List[str]]:
+    """
+    Ocena wszystkich reguł wyjścia na dzień `as_of` (domyślnie ostatni dzień
+    panelu) ze wskaźnikami z IndicatorCache – bez pętli po pozycjach.
+    Ta sama funkcja działa w silniku dziennym i w backteście (dowolna data).
+
+    Zwraca { "TICKER": ["NOT_IN_TOP", "TREND", ...], ... } tylko dla
+    tickerów z co najmniej jednym sygnałem (powody w kolejności priorytetu).
+    """
+    held = list(held_tickers)
+    masks = exit_rule_masks(
+        held,
+        regime,
+        top_tickers,
+        close=indicators.at("close", as_of, held),
+        sma=indicators.at("sma", as_of, held, window=sma_window),
+        roc12=indicators.at("roc", as_of, held, periods=roc_periods),
+        roc12_threshold=roc12_threshold,
+    )
+    return reasons_from_masks(masks)
+
+
+def reasons_from_masks(masks: pd.DataFrame) -> Dict[str, List[str]]:
+    """DataFrame bool [ticker x reguła] -> {ticker: [powody]}."""
+    hit = masks.to_numpy()
+    rules = np.array(masks.columns)
+    return {
+        ticker: rules[row].tolist()
+        for ticker, row in zip(masks.index, hit)
+        if row.any()
+    }
 
 
 def generate_sell_signals(
@@ -23,30 +113,15 @@ def generate_sell_signals(
       ['ticker', 'roc3', 'roc6', 'roc12', 'score']
     i wartości 'roc12' są wyrażone w procentach (np. 12.3, -4.5).
     """
+    roc12 = momentum_df.set_index("ticker")["roc12"].astype(float) / 100.0
+    masks = exit_rule_masks(
+        held_tickers,
+        regime,
+        top5,
+        roc12=roc12,
+        roc12_threshold=roc12_threshold / 100.0,
+    )
 
-    signals: Dict[str, str] = {}
-
-    # PRIORYTET 1 → BEAR = SELL EVERYTHING (na razie tylko na posiadanych tickerach)
-    if regime == "BEAR":
-        for ticker in held_tickers:
-            signals[ticker] = "BEAR"
-        return signals
-
-    # Mamy BULL – analizujemy tylko tickery, które faktycznie trzymamy
-    mom_by_ticker = momentum_df.set_index("ticker")
-
-    # PRIORYTET 2 → Momentum SELL (ROC12 < threshold)
-    for ticker in held_tickers:
-        if ticker not in mom_by_ticker.index:
-            continue
-        roc12 = float(mom_by_ticker.loc[ticker, "roc12"])
-        if roc12 < roc12_threshold:
-            signals[ticker] = "MOMENTUM"
-
-    # PRIORYTET 3 → już nie jest w TOP5
-    for ticker in held_tickers:
-        if ticker not in top5:
-            # tylko jeśli nie ma już innego powodu
-            signals.setdefault(ticker, "NOT_IN_TOP5")
-
-    return signals
+    # priorytet: BEAR → MOMENTUM → NOT_IN_TOP5
+    masks = masks[["BEAR", "MOMENTUM", "NOT_IN_TOP"]].rename(columns={"NOT_IN_TOP": "NOT_IN_TOP5"})
+    return {ticker: reasons[0] for ticker, reasons in reasons_from_masks(masks).items()}
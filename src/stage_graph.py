@@ -0,0 +1,130 @@
+# src/stage_graph.py
+
+"""
+Mały graf zależności etapów silnika.
+
+Każdy etap to funkcja, która dostaje wyniki swoich zależności jako
+argumenty nazwane (nazwa zależności = nazwa argumentu). Etapy bez
+wzajemnych zależności (np. SPY, uniwersum, FX) startują równolegle
+w puli wątków – to etapy I/O (Yahoo, CSV, SQLite), więc GIL nie
+przeszkadza. Synchronizacja następuje tylko tam, gdzie dane są
+naprawdę potrzebne.
+
+    graph = StageGraph()
+    graph.add("spy", load_spy)
+    graph.add("fx", load_fx)
+    graph.add("equity", compute_equity, deps=["spy", "fx"])
+    results = graph.run()
+
+Wyniki policzone wcześniej (np. wspólne dane rynkowe dla kilku portfeli)
+można podać jako gotowe wejścia – etapy zależą od nich jak od zwykłych etapów:
+
+    graph.run(inputs={"spy": spy_df})
+
+Każdy etap jest automatycznie mierzony przez instrumentation.span().
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List
+
+from instrumentation import span
+
+
+class StageError(RuntimeError):
+    """Błąd w którymś z etapów – oryginalny wyjątek jest w __cause__."""
+
+    def __init__(self, stage: str, exc: BaseException):
+        super().__init__(f"Etap '{stage}' zakończył się błędem: {exc!r}")
+        self.stage = stage
+
+
+class StageGraph:
+    def __init__(self):
+        self._stages: Dict[str, tuple[Callable, List[str]]] = {}
+
+    def add(self, name: str, fn: Callable, deps: Iterable[str] = ()) -> "StageGraph":
+        if name in self._stages:
+            raise ValueError(f"Etap '{name}' już istnieje.")
+        self._stages[name] = (fn, list(deps))
+        return self
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._stages
+
+    def stage(self, name: str, deps: Iterable[str] = ()):
+        """Wersja dekoratorowa add()."""
+        def deco(fn):
+            self.add(name, fn, deps)
+            return fn
+        return deco
+
+    # ---------------------------------------------------------
+    def order(self, known: Iterable[str] = ()) -> List[str]:
+        """
+        Kolejność topologiczna (waliduje brakujące zależności i cykle).
+        known = nazwy gotowych wejść – etapy o tych nazwach są pomijane.
+        """
+        known = set(known)
+        for name, (_, deps) in self._stages.items():
+            missing = [d for d in deps if d not in self._stages and d not in known]
+            if missing:
+                raise ValueError(f"Etap '{name}' zależy od nieistniejących etapów: {missing}")
+
+        done: List[str] = []
+        pending = {n: v for n, v in self._stages.items() if n not in known}
+        while pending:
+            ready = [n for n, (_, deps) in pending.items() if all(d in done or d in known for d in deps)]
+            if not ready:
+                raise ValueError(f"Cykl w grafie etapów: {sorted(pending)}")
+            for n in ready:
+                done.append(n)
+                del pending[n]
+        return done
+
+    def _call(self, name: str, results: dict):
+        fn, deps = self._stages[name]
+        with span(name):
+            return fn(**{d: results[d] for d in deps})
+
+    def run(self, max_workers: int = 4, inputs: dict | None = None) -> dict:
+        """
+        Uruchamia graf. max_workers=1 → wykonanie sekwencyjne
+        (w kolejności topologicznej, w bieżącym wątku).
+        inputs = gotowe wyniki {nazwa: wartość}; etapy o tych nazwach nie są
+        uruchamiane (np. wskaźniki przedłużone w pamięci przez daemon).
+
+        Zwraca {nazwa_etapu: wynik} (razem z inputs). Przy pierwszym błędzie
+        nie startuje kolejnych etapów, czeka na już uruchomione i rzuca StageError.
+        """
+        results: dict = dict(inputs or {})
+        order = self.order(known=results)
+
+        if max_workers <= 1:
+            for name in order:
+                try:
+                    results[name] = self._call(name, results)
+                except Exception as exc:
+                    raise StageError(name, exc) from exc
+            return results
+
+        pending = list(order)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stage") as pool:
+            while pending or running:
+                for name in [n for n in pending if all(d in results for d in self._stages[n][1])]:
+                    pending.remove(name)
+                    running[pool.submit(self._call, name, dict(results))] = name
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    name = running.pop(fut)
+                    exc = fut.exception()
+                    if exc is not None:
+                        wait(running)
+                        raise StageError(name, exc) from exc
+                    results[name] = fut.result()
+
+        return results
@@ -1,5 +1,7 @@
 import pandas as pd
 
+from indicators import sma
+
 
 def compute_regime(spy):
     """
@@ -38,7 +40,7 @@ def compute_regime(spy):
 
     # --- Budujemy pomocniczy DataFrame ---
     df = pd.DataFrame({"price": spy_series})
-    df["SMA200"] = df["price"].rolling(200).mean()
+    df["SMA200"] = sma(df["price"], 200)
 
     last = df.iloc[-1]
 
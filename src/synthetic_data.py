@@ -0,0 +1,362 @@
+# src/synthetic_data.py
+
+"""
+Generator syntetycznych danych rynkowych do testów obciążeniowych.
+
+Zapisuje pliki w DOKŁADNIE tym samym formacie co data_loader
+(data/prices/<TICKER>.csv z kolumnami Date, Open, High, Low, Close,
+Adj Close, Volume), więc data_loader, momentum, backtesty i screener
+mogą pracować na 1 000 – 5 000 tickerów bez dostępu do sieci.
+
+Co jest modelowane:
+  - daty = sesje NYSE z trading_calendar (bez weekendów i świąt),
+  - wspólny czynnik rynkowy (ticker SPY) + beta i szum idiosynkratyczny,
+  - luki w notowaniach (pojedyncze brakujące dni),
+  - splity: kolumna Close jest NIEskorygowana (skok ceny w dniu splitu),
+    Adj Close jest ciągła — tak wygląda magazyn, do którego dopisywano
+    dane przyrostowo przed i po splicie,
+  - delistingi: historia kończy się przed datą końcową,
+  - późne debiuty (IPO): historia zaczyna się po dacie startowej.
+
+Wszystko jest deterministyczne dla danego `seed` (i `chunk_size`).
+
+Użycie (z katalogu repo):
+    python src/synthetic_data.py --tickers 1000 --years 20
+    MOMENTUM_PRICE_DIR=data/synthetic/prices \
+    MOMENTUM_UNIVERSE=data/synthetic/prices/_manifest.json python src/main.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+import numpy as np
+import pandas as pd
+
+from trading_calendar import trading_sessions
+
+DEFAULT_OUT_DIR = Path(__file__).resolve().parent.parent / "data" / "synthetic" / "prices"
+MANIFEST_NAME = "_manifest.json"
+MARKET_TICKER = "SPY"
+
+# Ile tickerów generujemy naraz (ogranicza pamięć przy 5 000 tickerów)
+CHUNK_SIZE = 250
+
+SPLIT_RATIOS = np.array([2.0, 3.0, 4.0, 5.0, 10.0, 0.1])
+SPLIT_RATIO_P = np.array([0.45, 0.15, 0.15, 0.1, 0.1, 0.05])
+
+
+# -------------------------------------------------------------
+# Pomocnicze
+# -------------------------------------------------------------
+def synthetic_tickers(n_tickers: int, prefix: str = "SYN") -> List[str]:
+    """Zwraca listę nazw tickerów: SYN00000, SYN00001, ..."""
+    return [f"{prefix}{i:05d}" for i in range(n_tickers)]
+
+
+def _trading_dates(years: int, end: str | None) -> pd.DatetimeIndex:
+    """Sesje NYSE (trading_calendar) – te same, względem których walidują inne moduły."""
+    end_ts = pd.to_datetime(end).normalize() if end else pd.Timestamp.today().normalize()
+    start_ts = end_ts - pd.DateOffset(years=years)
+    return trading_sessions(start_ts, end_ts).rename("Date")
+
+
+def _market_returns(n_days: int, seed: int) -> np.ndarray:
+    """Dzienne log-zwroty czynnika rynkowego (również ceny SPY)."""
+    rng = np.random.default_rng([seed, 0])
+    vol = 0.18 / np.sqrt(252)
+    drift = 0.08 / 252
+    # proste reżimy zmienności: co ~rok losujemy mnożnik zmienności
+    regime = np.repeat(rng.choice([0.7, 1.0, 1.8], size=n_days // 252 + 1, p=[0.4, 0.45, 0.15]), 252)
+    return drift + vol * regime[:n_days] * rng.standard_normal(n_days)
+
+
+def _ohlcv_frame(
+    dates: pd.DatetimeIndex,
+    adj_close: np.ndarray,
+    split_factor: np.ndarray,
+    rng: np.random.Generator,
+) -> pd.DataFrame:
+    """Buduje ramkę OHLCV dla jednego tickera z ciągłej ceny skorygowanej."""
+    close = adj_close * split_factor
+    spread = np.abs(rng.normal(0.0, 0.008, size=(3, close.shape[0])))
+    open_ = close * (1.0 + rng.normal(0.0, 0.004, size=close.shape[0]))
+    high = np.maximum(open_, close) * (1.0 + spread[0])
+    low = np.minimum(open_, close) * (1.0 - spread[1])
+    # przed splitem cena nieskorygowana = adj * ratio, więc wolumen nieskorygowany = / ratio
+    volume = (rng.lognormal(14.0, 0.6, size=close.shape[0]) / split_factor).astype(np.int64)
+
+    return pd.DataFrame(
+        {
+            "Open": open_,
+            "High": high,
+            "Low": low,
+            "Close": close,
+            "Adj Close": adj_close,
+            "Volume": volume,
+        },
+        index=dates,
+    )
+
+
+def _generate_chunk(
+    tickers: List[str],
+    dates: pd.DatetimeIndex,
+    market: np.ndarray,
+    rng: np.random.Generator,
+    gap_prob: float,
+    split_prob: float,
+    delist_prob: float,
+    ipo_prob: float,
+) -> tuple[Dict[str, pd.DataFrame], Dict[str, dict]]:
+    """Generuje blok tickerów wektorowo (T x N), potem tnie na ramki."""
+    n_days, n = len(dates), len(tickers)
+
+    beta = rng.uniform(0.6, 1.6, size=n)
+    drift = rng.normal(0.04, 0.10, size=n) / 252
+    idio_vol = rng.uniform(0.15, 0.55, size=n) / np.sqrt(252)
+
+    log_ret = market[:, None] * beta + drift + idio_vol * rng.standard_normal((n_days, n))
+    log_ret[0, :] = 0.0
+    p0 = rng.uniform(5.0, 300.0, size=n)
+    adj = p0 * np.exp(np.cumsum(log_ret, axis=0))
+
+    # okno życia tickera: [first, last)
+    first = np.zeros(n, dtype=np.int64)
+    last = np.full(n, n_days, dtype=np.int64)
+    ipo = rng.random(n) < ipo_prob
+    first[ipo] = rng.integers(0, n_days // 2, size=ipo.sum())
+    delisted = rng.random(n) < delist_prob
+    last[delisted] = rng.integers(n_days // 2, n_days - 1, size=delisted.sum())
+
+    # splity: dzień i współczynnik; przed splitem cena nieskorygowana = adj * ratio
+    has_split = rng.random(n) < split_prob
+    split_day = rng.integers(1, n_days, size=n)
+    split_ratio = rng.choice(SPLIT_RATIOS, size=n, p=SPLIT_RATIO_P)
+
+    gaps = rng.random((n_days, n)) < gap_prob
+
+    frames: Dict[str, pd.DataFrame] = {}
+    meta: Dict[str, dict] = {}
+    day_idx = np.arange(n_days)
+
+    for j, ticker in enumerate(tickers):
+        split_factor = np.ones(n_days)
+        if has_split[j]:
+            split_factor[day_idx < split_day[j]] = split_ratio[j]
+
+        df = _ohlcv_frame(dates, adj[:, j], split_factor, rng)
+
+        keep = (day_idx >= first[j]) & (day_idx < last[j]) & ~gaps[:, j]
+        df = df[keep]
+        frames[ticker] = df
+
+        meta[ticker] = {
+            "first_date": df.index[0].strftime("%Y-%m-%d") if not df.empty else None,
+            "last_date": df.index[-1].strftime("%Y-%m-%d") if not df.empty else None,
+            "delisted": bool(delisted[j]),
+            "gap_days": int(gaps[first[j]:last[j], j].sum()),
+            "split": (
+                {"date": dates[split_day[j]].strftime("%Y-%m-%d"), "ratio": float(split_ratio[j])}
+                if has_split[j] and first[j] < split_day[j] < last[j]
+                else None
+            ),
+        }
+
+    return frames, meta
+
+
+# -------------------------------------------------------------
+# Publiczne API
+# -------------------------------------------------------------
+def iter_synthetic_panel(
+    n_tickers: int = 1000,
+    years: int = 20,
+    end: str | None = None,
+    seed: int = 42,
+    gap_prob: float = 0.002,
+    split_prob: float = 0.05,
+    delist_prob: float = 0.05,
+    ipo_prob: float = 0.10,
+    include_market: bool = True,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[tuple[Dict[str, pd.DataFrame], Dict[str, dict]]]:
+    """
+    Generator blokami: zwraca kolejne pary (frames, meta) po `chunk_size` tickerów.
+
+    Pierwszy blok zawiera też ticker rynkowy (SPY), jeśli include_market=True.
+    Ten sam seed i ten sam chunk_size => identyczne dane. Zmiana chunk_size
+    zmienia dane tickerów (każdy blok losuje z własnego strumienia RNG).
+    """
+    dates = _trading_dates(years, end)
+    market = _market_returns(len(dates), seed)
+
+    if include_market:
+        rng = np.random.default_rng([seed, 1])
+        adj = 400.0 * np.exp(np.cumsum(market))
+        spy = _ohlcv_frame(dates, adj, np.ones(len(dates)), rng)
+        yield {MARKET_TICKER: spy}, {
+            MARKET_TICKER: {
+                "first_date": dates[0].strftime("%Y-%m-%d"),
+                "last_date": dates[-1].strftime("%Y-%m-%d"),
+                "delisted": False,
+                "gap_days": 0,
+                "split": None,
+            }
+        }
+
+    tickers = synthetic_tickers(n_tickers)
+    for chunk_no, start in enumerate(range(0, n_tickers, chunk_size)):
+        rng = np.random.default_rng([seed, 2, chunk_no])
+        yield _generate_chunk(
+            tickers[start:start + chunk_size],
+            dates,
+            market,
+            rng,
+            gap_prob=gap_prob,
+            split_prob=split_prob,
+            delist_prob=delist_prob,
+            ipo_prob=ipo_prob,
+        )
+
+
+def generate_price_panel(n_tickers: int = 100, **kwargs) -> Dict[str, pd.DataFrame]:
+    """
+    Zwraca cały syntetyczny panel w pamięci: {ticker: DataFrame}.
+    Ramki mają ten sam kształt, co wynik data_loader.load_single_history
+    (index Date + kolumna Ticker).
+    """
+    panel: Dict[str, pd.DataFrame] = {}
+    for frames, _ in iter_synthetic_panel(n_tickers=n_tickers, **kwargs):
+        for ticker, df in frames.items():
+            df = df.copy()
+            df["Ticker"] = ticker
+            panel[ticker] = df
+    return panel
+
+
+def write_price_store(
+    out_dir: str | Path = DEFAULT_OUT_DIR,
+    n_tickers: int = 1000,
+    **kwargs,
+) -> dict:
+    """
+    Generuje dane i zapisuje je jako CSV w formacie data_loader.
+
+    Oprócz plików cenowych zapisuje `_manifest.json` z parametrami,
+    listą tickerów oraz informacją o splitach, lukach i delistingach
+    (przydatne do weryfikacji walidatorów danych).
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    all_meta: Dict[str, dict] = {}
+    for frames, meta in iter_synthetic_panel(n_tickers=n_tickers, **kwargs):
+        for ticker, df in frames.items():
+            df.rename_axis("Date").reset_index().to_csv(
+                out_dir / f"{ticker}.csv",
+                index=False,
+                float_format="%.6f",
+                date_format="%Y-%m-%d",
+            )
+        all_meta.update(meta)
+        print(f"[synthetic] Zapisano {len(all_meta)} tickerów → {out_dir}")
+
+    manifest = {
+        "params": {"n_tickers": n_tickers, **kwargs},
+        "tickers": [t for t in all_meta if t != MARKET_TICKER],
+        "market_ticker": MARKET_TICKER if MARKET_TICKER in all_meta else None,
+        "series": all_meta,
+    }
+    with open(out_dir / MANIFEST_NAME, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+
+    return manifest
+
+
+def load_synthetic_universe(out_dir: str | Path = DEFAULT_OUT_DIR) -> List[str]:
+    """Lista tickerów (bez SPY) z manifestu wygenerowanego magazynu."""
+    with open(Path(out_dir) / MANIFEST_NAME, encoding="utf-8") as f:
+        return json.load(f)["tickers"]
+
+
+def generate_fundamentals(tickers: List[str], seed: int = 42) -> pd.DataFrame:
+    """
+    Syntetyczne fundamenty w formacie buffett_lynch_screener.fetch_fundamentals
+    (index = ticker), żeby compute_scores dało się testować offline.
+    """
+    rng = np.random.default_rng([seed, 3])
+    n = len(tickers)
+    sectors = np.array([
+        "Technology", "Healthcare", "Financial Services", "Consumer Cyclical",
+        "Industrials", "Energy", "Utilities", "Communication Services",
+    ])
+
+    def col(mean, std, nan_frac=0.03):
+        x = rng.normal(mean, std, size=n)
+        x[rng.random(n) < nan_frac] = np.nan
+        return x
+
+    roe = col(0.15, 0.12)
+    df = pd.DataFrame(
+        {
+            "ticker": tickers,
+            "sector": rng.choice(sectors, size=n),
+            "roic_approx": roe,
+            "roe": roe,
+            "gross_margin": col(0.45, 0.15),
+            "oper_margin": col(0.18, 0.10),
+            "profit_margin": col(0.12, 0.08),
+            "revenue_growth": col(0.08, 0.12),
+            "earnings_growth": col(0.10, 0.25),
+            "pe": np.abs(col(22.0, 10.0)),
+            "forward_pe": np.abs(col(19.0, 8.0)),
+            "pb": np.abs(col(4.0, 3.0)),
+            "ps": np.abs(col(3.5, 2.5)),
+            "pfcf": np.abs(col(25.0, 12.0)),
+            "ev_to_ebitda": np.abs(col(14.0, 6.0)),
+            "ev_to_revenue": np.abs(col(3.8, 2.5)),
+            "beta": np.abs(col(1.05, 0.35)),
+            "debt_to_equity": np.abs(col(90.0, 60.0)),
+            "current_ratio": np.abs(col(1.6, 0.6)),
+            "quick_ratio": np.abs(col(1.2, 0.5)),
+            "total_debt": np.abs(col(1e10, 8e9)),
+            "free_cashflow": col(2e9, 3e9),
+        }
+    )
+    return df.set_index("ticker")
+
+
+# -------------------------------------------------------------
+# CLI
+# -------------------------------------------------------------
+def _parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Syntetyczny magazyn cen do testów obciążeniowych.")
+    p.add_argument("--tickers", type=int, default=1000, help="liczba tickerów (bez SPY)")
+    p.add_argument("--years", type=int, default=20, help="długość historii w latach")
+    p.add_argument("--end", default=None, help="ostatni dzień (YYYY-MM-DD), domyślnie dziś")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--gap-prob", type=float, default=0.002, help="szansa braku notowania w danym dniu")
+    p.add_argument("--split-prob", type=float, default=0.05, help="odsetek tickerów ze splitem")
+    p.add_argument("--delist-prob", type=float, default=0.05, help="odsetek tickerów zdjętych z obrotu")
+    p.add_argument("--ipo-prob", type=float, default=0.10, help="odsetek tickerów z późnym debiutem")
+    p.add_argument("--out", default=str(DEFAULT_OUT_DIR), help="katalog docelowy")
+    return p.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    write_price_store(
+        out_dir=args.out,
+        n_tickers=args.tickers,
+        years=args.years,
+        end=args.end,
+        seed=args.seed,
+        gap_prob=args.gap_prob,
+        split_prob=args.split_prob,
+        delist_prob=args.delist_prob,
+        ipo_prob=args.ipo_prob,
+    )
@@ -1,69 +1,325 @@
+import numpy as np
 import pandas as pd
-from db import record_transaction, update_position
-from datetime import datetime
+from costs import get_cost_model
+from db import write_order_batch
+from fx import fx_rates_for
+from portfolio_storage import estimate_cash_pln, load_positions
+from run_context import RunDataContext
 
+# Minimum value of a partial rebalance trade (smaller deltas are skipped).
+# Full exits (target = 0) are always executed.
+MIN_TRADE_VALUE_PLN = 100.0
 
-def buy_according_to_allocation(today, alloc_df, fx_row, price_data):
+QTY_DECIMALS = 4
+
+ORDER_COLUMNS = [
+    "ticker", "side", "quantity", "currency", "price_ccy", "price_pln",
+    "current_qty", "target_qty", "value_pln", "avg_price_ccy", "avg_price_pln",
+    "fee_pln", "cost_pln",
+]
+
+
+# ==============================================================
+# PRICE / FX RESOLUTION (whole order table at once)
+# ==============================================================
+
+def resolve_prices(tickers, price_data=None, as_of=None):
+    """
+    Last Close for all tickers in one lookup -> Series [ticker] (NaN if missing).
+
+    price_data : {ticker: DataFrame} already loaded by the caller (engine run);
+                 tickers not in it are loaded together, in parallel,
+                 through one RunDataContext.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    price_data = dict(price_data or {})
+    missing = [t for t in tickers if t not in price_data]
+    if missing:
+        with RunDataContext(as_of=as_of, years=1) as ctx:
+            price_data.update(ctx.load(missing, strict=False))
+
+    closes = {t: price_data[t]["Close"].dropna() for t in tickers if price_data.get(t) is not None}
+    last = {t: float(c.iloc[-1]) for t, c in closes.items() if not c.empty}
+    return pd.Series(last, dtype=float).reindex(tickers)
+
+
+def _position_columns(df, positions):
+    """Adds current_qty / avg_*_old (and default currency) from held positions."""
+    cur = positions.set_index("ticker") if not positions.empty else pd.DataFrame(
+        columns=["quantity", "currency", "avg_price_ccy", "avg_price_pln"])
+    tickers = df["ticker"] if "ticker" in df else df.index.to_series()
+
+    held_ccy = cur["currency"].reindex(tickers).to_numpy()
+    if "currency" not in df:
+        df["currency"] = held_ccy
+    else:
+        df["currency"] = df["currency"].where(df["currency"].notna(), held_ccy)
+    df["currency"] = df["currency"].fillna("USD")
+
+    df["current_qty"] = cur["quantity"].reindex(tickers).fillna(0.0).to_numpy(dtype=float)
+    df["avg_ccy_old"] = cur["avg_price_ccy"].reindex(tickers).fillna(0.0).to_numpy(dtype=float)
+    df["avg_pln_old"] = cur["avg_price_pln"].reindex(tickers).fillna(0.0).to_numpy(dtype=float)
+    return df
+
+
+def _with_prices(df, price_data, fx_row):
+    """Adds price_ccy / price_pln for all rows; drops rows without a valid price."""
+    tickers = df["ticker"] if "ticker" in df else df.index.to_series()
+    df["price_ccy"] = resolve_prices(tickers, price_data).reindex(tickers).to_numpy()
+    missing = (df["price_ccy"].isna() | (df["price_ccy"] <= 0)).to_numpy()
+    for t in tickers[missing]:
+        print(f"[ORDERS] Brak prawidłowej ceny dla {t} — pomijam.")
+    df = df[~missing].copy()
+    df["fx_rate"] = fx_rates_for(df["currency"], fx_row).to_numpy()
+    df["price_pln"] = df["price_ccy"] * df["fx_rate"]
+    return df
+
+
+def _with_costs(df, costs):
+    """
+    Execution prices for the whole table at once (costs.CostModel):
+    price_ccy gets slippage, price_pln becomes the effective per-share PLN
+    price (FX spread and commission included), value_pln is recomputed.
     """
-    Executes BUY operations for each row in alloc_df:
+    ex = get_cost_model(costs).execution(
+        df["side"].to_numpy(), df["quantity"].to_numpy(dtype=float),
+        df["price_ccy"].to_numpy(dtype=float), df["fx_rate"].to_numpy(dtype=float),
+        df["currency"].to_numpy(),
+    )
+    df["price_ccy"] = ex["price_ccy"]
+    df["price_pln"] = ex["price_pln"]
+    df["fee_pln"] = np.round(ex["fee_pln"], 2)
+    df["cost_pln"] = np.round(ex["cost_pln"], 2)
+    df["value_pln"] = (df["quantity"] * df["price_pln"]).round(2)
+    return df
+
+
+def _buy_quantity(df, budget_pln, costs):
+    """BUY quantity for a PLN budget with all costs, rounded DOWN to QTY_DECIMALS."""
+    qty = get_cost_model(costs).buy_quantity(
+        budget_pln, df["price_ccy"].to_numpy(dtype=float),
+        df["fx_rate"].to_numpy(dtype=float), df["currency"].to_numpy(),
+    )
+    scale = 10 ** QTY_DECIMALS
+    return np.floor(np.round(qty * scale, 6)) / scale
+
+
+def _with_avg_prices(df):
+    """Average price after the order: weighted on BUY, unchanged on SELL."""
+    buy = df["side"] == "BUY"
+    new_qty = df["current_qty"] + df["quantity"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df["avg_price_ccy"] = np.where(
+            buy, (df["current_qty"] * df["avg_ccy_old"] + df["quantity"] * df["price_ccy"]) / new_qty, df["avg_ccy_old"])
+        df["avg_price_pln"] = np.where(
+            buy, (df["current_qty"] * df["avg_pln_old"] + df["quantity"] * df["price_pln"]) / new_qty, df["avg_pln_old"])
+    return df
+
+
+# ==============================================================
+# ORDER GENERATION (netting)
+# ==============================================================
+
+def build_rebalance_orders(positions, alloc_df, price_data, fx_row,
+                           min_trade_value_pln=MIN_TRADE_VALUE_PLN,
+                           exits=(), costs=None, cash_pln=None):
+    """
+    Diffs current positions against the target allocation and returns
+    only the net orders needed to get there.
+
+    positions : DataFrame from load_positions()
+                (ticker | quantity | currency | avg_price_ccy | avg_price_pln)
+    alloc_df  : DataFrame from build_target_allocation()
+                (ticker | currency | target_value_ccy ...), may be empty
+    exits     : tickers forced to target 0 (e.g. sell signals)
+    costs     : CostModel / broker name from costs.BROKERS (None = default broker)
+    cash_pln  : available cash; total BUY value_pln (costs included) is capped
+                at cash_pln + SELL proceeds (None = no cap)
+
+    Held tickers missing from alloc_df get target 0 (full exit).
+    Partial adjustments below min_trade_value_pln are dropped.
+    BUY deltas are sized with CostModel.buy_quantity: the mid value of the
+    missing quantity is the budget, so costs come out of the target, not on top.
+
+    Returns DataFrame (SELLs first, then BUYs):
+        ticker | side | quantity | currency | price_ccy | price_pln |
+        current_qty | target_qty | value_pln | avg_price_ccy | avg_price_pln |
+        fee_pln | cost_pln
+    where price_* are execution prices (price_pln includes all costs) and
+    avg_price_* is the position's average price AFTER the order.
+    """
+    tgt = alloc_df.set_index("ticker") if alloc_df is not None and not alloc_df.empty else pd.DataFrame(
+        columns=["currency", "target_value_ccy"])
+    tgt = tgt.drop(index=[t for t in exits if t in tgt.index])
+
+    tickers = list(dict.fromkeys(list(positions["ticker"]) + list(tgt.index)))
+    if not tickers:
+        return pd.DataFrame(columns=ORDER_COLUMNS)
+
+    df = pd.DataFrame(index=pd.Index(tickers, name="ticker"))
+    df["currency"] = tgt["currency"].reindex(tickers)
+    df["target_value_ccy"] = tgt["target_value_ccy"].reindex(tickers).fillna(0.0).astype(float)
+    df = _position_columns(df, positions)
+    df = _with_prices(df, price_data, fx_row)
+
+    df["target_qty"] = (df["target_value_ccy"] / df["price_ccy"]).round(QTY_DECIMALS)
+    delta = df["target_qty"] - df["current_qty"]
+    df["value_pln"] = (delta.abs() * df["price_pln"]).round(2)
+
+    full_exit = (df["target_qty"] == 0) & (df["current_qty"] > 0)
+    keep = (delta != 0) & (full_exit | (df["value_pln"] >= min_trade_value_pln))
+    df, delta = df[keep].copy(), delta[keep]
+
+    df["side"] = np.where(delta > 0, "BUY", "SELL")
+    df["quantity"] = delta.abs().round(QTY_DECIMALS)
+    buy = (df["side"] == "BUY").to_numpy()
+    if buy.any():
+        budget = df["value_pln"].to_numpy(dtype=float)[buy]
+        if cash_pln is not None:
+            sells = _with_costs(df[~buy].copy(), costs)
+            available = max(cash_pln + sells["value_pln"].sum() - 0.01 * buy.sum(), 0.0)  # grosz zapasu na zaokrąglenia
+            if budget.sum() > available:
+                budget = budget * (available / budget.sum())
+        df.loc[buy, "quantity"] = _buy_quantity(df[buy], budget, costs)
+        df = df[df["quantity"] > 0].copy()
+    df = _with_costs(df, costs)
+    df["target_qty"] = np.where(
+        df["side"] == "BUY", df["current_qty"] + df["quantity"], df["target_qty"]
+    ).round(QTY_DECIMALS)
+    df = _with_avg_prices(df)
+
+    df = df.reset_index().sort_values("side", ascending=False, kind="stable")  # SELL before BUY
+    return df[ORDER_COLUMNS].reset_index(drop=True)
+
+
+def price_orders(orders, price_data=None, fx_row=None, positions=None, costs=None):
+    """
+    Completes a raw order table with prices, FX and quantities
+    (all rows at once, as arrays).
+
+    orders : ticker | side | quantity and/or value_pln | [currency]
+             - rows without quantity are sized from value_pln
+               (BUY: the budget covers the costs too),
+             - missing currency = currency of the held position, else USD,
+             - SELL quantity is capped at the held quantity.
+    costs  : CostModel / broker name (None = default broker)
+
+    Returns a table in ORDER_COLUMNS, ready for execute_orders().
+    """
+    if orders is None or orders.empty:
+        return pd.DataFrame(columns=ORDER_COLUMNS)
+    if positions is None:
+        positions = load_positions()
+
+    df = orders.reset_index(drop=True).copy()
+    for col in ("quantity", "value_pln"):
+        if col not in df:
+            df[col] = np.nan
+    df = _position_columns(df, positions)
+    df = _with_prices(df, price_data, fx_row)
+
+    sell = df["side"] == "SELL"
+    budget_qty = np.where(
+        sell,
+        df["value_pln"].astype(float) / df["price_pln"],
+        get_cost_model(costs).buy_quantity(
+            df["value_pln"].to_numpy(dtype=float), df["price_ccy"].to_numpy(dtype=float),
+            df["fx_rate"].to_numpy(dtype=float), df["currency"].to_numpy(),
+        ),
+    )
+    qty = df["quantity"].astype(float).fillna(pd.Series(budget_qty, index=df.index))
+    qty = qty.round(QTY_DECIMALS)
+    df["quantity"] = np.where(sell, np.minimum(qty, df["current_qty"]), qty)
+    df = df[df["quantity"] > 0].copy()
+
+    df["target_qty"] = np.where(
+        df["side"] == "BUY", df["current_qty"] + df["quantity"], df["current_qty"] - df["quantity"]
+    ).round(QTY_DECIMALS)
+    df = _with_costs(df, costs)
+    df = _with_avg_prices(df)
+
+    df = df.sort_values("side", ascending=False, kind="stable")  # SELL before BUY
+    return df[ORDER_COLUMNS].reset_index(drop=True)
+
+
+# ==============================================================
+# BATCH EXECUTION
+# ==============================================================
+
+def execute_orders(today, orders, regime, note="REBALANCE (net)"):
+    """
+    Executes a whole order table as one batch: one DB transaction with all
+    transaction rows and resulting position updates.
+    """
+    if orders is None or orders.empty:
+        print("[ORDERS] Brak zleceń do wykonania.")
+        return
+
+    o = orders
+    final_qty = np.where(o["side"] == "BUY", o["current_qty"] + o["quantity"], o["current_qty"] - o["quantity"])
+    final_qty = np.round(final_qty, QTY_DECIMALS)
+    closed = final_qty <= 0
+
+    transactions = [
+        (today, r.ticker, r.side, float(r.quantity), float(r.price_ccy), r.currency,
+         float(r.price_pln), regime, note, float(r.fee_pln))
+        for r in o.itertuples(index=False)
+    ]
+    upserts = [
+        (r.ticker, float(q), r.currency, float(r.avg_price_ccy), float(r.avg_price_pln))
+        for r, q, c in zip(o.itertuples(index=False), final_qty, closed) if not c
+    ]
+    deletes = o.loc[closed, "ticker"].tolist()
+
+    write_order_batch(transactions, upserts, deletes)
+
+    for r in o.itertuples(index=False):
+        print(f"[{r.side} EXECUTED] {r.ticker}: {r.quantity} @ {r.price_ccy:.2f} {r.currency} "
+              f"({r.price_pln:.2f} PLN), pozycja {r.current_qty} → {r.target_qty}")
+    print(f"[ORDERS] Batch: {len(o)} zleceń, {len(upserts)} aktualizacji pozycji, {len(deletes)} zamkniętych.")
+    if o["cost_pln"].sum() > 0:
+        print(f"[ORDERS] Koszty transakcyjne: {o['cost_pln'].sum():,.2f} PLN "
+              f"(w tym prowizje {o['fee_pln'].sum():,.2f} PLN)")
+
+
+def execute_order_table(today, orders, regime="BULL", note="ORDER TABLE",
+                        price_data=None, fx_row=None, costs=None):
+    """
+    Batch execution API: prices a raw order table in one pass
+    (see price_orders) and writes it as one DB transaction.
+
+        orders = pd.DataFrame({"ticker": [...], "side": "BUY", "value_pln": [...]})
+        execute_order_table(today, orders, fx_row=fx_row)
+
+    Returns the executed (priced) orders.
+    """
+    priced = price_orders(orders, price_data=price_data, fx_row=fx_row, costs=costs)
+    execute_orders(today, priced, regime=regime, note=note)
+    return priced
+
+
+def buy_according_to_allocation(today, alloc_df, fx_row, price_data, regime="BULL",
+                                min_trade_value_pln=MIN_TRADE_VALUE_PLN, exits=(), costs=None,
+                                cash_pln=None):
+    """
+    Rebalances the portfolio to alloc_df:
     ticker | target_value_ccy | currency
+
+    Only net deltas vs current positions are traded (no full re-buy of
+    tickers already held), and all of them go to the DB as one batch.
+    BUYs never spend more than cash_pln (default: estimate_cash_pln())
+    plus the proceeds of the SELLs in the same batch.
     """
+    print("\n[BUY ENGINE] Rozpoczynam rebalancing (zlecenia netto)...")
+
+    orders = build_rebalance_orders(
+        load_positions(), alloc_df, price_data, fx_row,
+        min_trade_value_pln=min_trade_value_pln,
+        exits=exits,
+        costs=costs,
+        cash_pln=estimate_cash_pln() if cash_pln is None else cash_pln,
+    )
+    execute_orders(today, orders, regime=regime, note="REBALANCE according to target allocation")
 
-    print("\n[BUY ENGINE] Rozpoczynam wykonywanie zakupów...")
-
-    for _, row in alloc_df.iterrows():
-        ticker = row["ticker"]
-        target_value_ccy = row["target_value_ccy"]
-        currency = row["currency"]
-
-        df = price_data.get(ticker)
-        if df is None or df.empty:
-            print(f"[BUY] Brak danych price_data dla {ticker} — pomijam.")
-            continue
-
-        # last available close price
-        price_ccy = df["Close"].iloc[-1]
-
-        if price_ccy <= 0:
-            print(f"[BUY] Cena nieprawidłowa dla {ticker} — pomijam.")
-            continue
-
-        # quantity to buy
-        qty = target_value_ccy / price_ccy
-        qty = round(qty, 4)  # precision
-
-        # FX conversion
-        if currency == "USD":
-            fx = fx_row["USD"]
-        elif currency == "EUR":
-            fx = fx_row["EUR"]
-        else:
-            fx = 1.0
-
-        price_pln = price_ccy * fx
-
-        print(f"[BUY] {ticker}: kupuję {qty} @ {price_ccy} {currency}, ({price_pln:.2f} PLN)")
-
-        # -- Record transaction
-        record_transaction(
-            timestamp=today,
-            ticker=ticker,
-            side="BUY",
-            quantity=qty,
-            price_ccy=price_ccy,
-            currency=currency,
-            price_pln=price_pln,
-            regime="BULL",   # możesz tu dodać realny regime z main()
-            note="BUY according to target allocation"
-        )
-
-        # -- Update portfolio state
-        update_position(
-            ticker=ticker,
-            qty=qty,
-            currency=currency,
-            avg_price_ccy=price_ccy,
-            avg_price_pln=price_pln
-        )
-
-    print("[BUY ENGINE] Zakończono wykonywanie zakupów.\n")
+    print("[BUY ENGINE] Zakończono rebalancing.\n")
+    return orders
@@ -0,0 +1,281 @@
+# src/trading_calendar.py
+
+"""
+Kalendarz sesji giełdowych (NYSE, GPW, XETRA) na pandas-market-calendars.
+
+Sesje liczone są RAZ dla całego zakresu (domyślnie 1990 … dziś + 3 lata)
+i zapisywane w data/calendars/<giełda>.npz, więc kolejne uruchomienia nie
+importują nawet pandas_market_calendars. Na sesjach budujemy gęstą tablicę
+"dzień kalendarzowy → indeks pierwszej sesji >= tego dnia", dzięki czemu:
+
+    cal = get_calendar("NYSE")
+    cal.is_trading_day(date)          # O(1)
+    cal.next_trading_day(date)        # O(1) – pierwsza sesja w dniu date lub później
+    cal.monthly_sessions(10, start, end)   # wektorowo: sesja "10-go lub następna" w każdym miesiącu
+    cal.next_close(now)               # najbliższe zamknięcie sesji (UTC, z wcześniejszymi zamknięciami)
+
+Bez pandas_market_calendars (np. minimalne środowisko) kalendarz spada
+do dni roboczych pon–pt (zamknięcie o stałej godzinie REGULAR_CLOSE)
+z ostrzeżeniem.
+
+Dni rebalansu / wpłat (10-ty albo najbliższa kolejna sesja):
+    is_rebalance_day(today)                      # main
+    rebalance_dates("2015-01-01", "2025-12-31")  # backtesty
+"""
+
+from __future__ import annotations
+
+from datetime import date, datetime
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import count
+
+# nazwa w projekcie -> kod kalendarza w pandas_market_calendars
+EXCHANGES = {
+    "NYSE": "NYSE",
+    "WSE": "XWAR",
+    "XETRA": "XETR",
+}
+
+# regularne zamknięcie (strefa giełdy) – tylko gdy brak pandas_market_calendars
+REGULAR_CLOSE = {
+    "NYSE": ("America/New_York", "16:00"),
+    "WSE": ("Europe/Warsaw", "17:00"),
+    "XETRA": ("Europe/Berlin", "17:30"),
+}
+
+DEFAULT_EXCHANGE = "NYSE"   # uniwersum momentum to spółki z USA
+REBALANCE_DAY = 10
+
+CALENDAR_START = "1990-01-01"
+CALENDAR_YEARS_AHEAD = 3
+
+CALENDAR_DIR = Path(__file__).resolve().parent.parent / "data" / "calendars"
+_DEFAULT_DIR = object()  # store_dir domyślny: CALENDAR_DIR odczytany przy wywołaniu (można go podmienić)
+
+_DAY = np.timedelta64(1, "D")
+
+
+def _to_day(value) -> np.datetime64:
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return np.datetime64(value, "D")
+    return np.datetime64(pd.Timestamp(value).date(), "D")
+
+
+# -------------------------------------------------------------
+# Źródło sesji
+# -------------------------------------------------------------
+def _regular_closes(exchange: str, sessions: np.ndarray) -> np.ndarray:
+    """Zamknięcia o stałej godzinie (UTC, datetime64[s]) – fallback bez mcal."""
+    tz, hhmm = REGULAR_CLOSE[exchange]
+    local = pd.DatetimeIndex(sessions) + pd.Timedelta(f"{hhmm}:00")
+    return local.tz_localize(tz).tz_convert("UTC").tz_localize(None).to_numpy().astype("datetime64[s]")
+
+
+def _fetch_sessions(exchange: str, start: str, end: str) -> tuple[np.ndarray, np.ndarray]:
+    """Sesje [start, end] jako datetime64[D] + ich zamknięcia w UTC (bez cache)."""
+    try:
+        import pandas_market_calendars as mcal
+    except ImportError:
+        print(f"[CALENDAR] Brak pandas_market_calendars – {exchange}: dni robocze pon–pt.")
+        sessions = pd.bdate_range(start, end).to_numpy().astype("datetime64[D]")
+        return sessions, _regular_closes(exchange, sessions)
+
+    schedule = mcal.get_calendar(EXCHANGES[exchange]).schedule(start, end)
+    sessions = schedule.index.to_numpy().astype("datetime64[D]")
+    closes = schedule["market_close"].dt.tz_convert("UTC").dt.tz_localize(None).to_numpy().astype("datetime64[s]")
+    return sessions, closes
+
+
+def _load_sessions(exchange: str, start: str, end: str, store_dir: Path | None) -> tuple[np.ndarray, np.ndarray]:
+    path = store_dir / f"{exchange}.npz" if store_dir is not None else None
+    if path is not None and path.exists():
+        try:
+            stored = np.load(path)
+            if str(stored["start"]) <= start and str(stored["end"]) >= end and "closes" in stored:
+                count("calendar.disk_hit")
+                return stored["sessions"], stored["closes"]
+        except Exception as exc:
+            print(f"[CALENDAR] Nie udało się wczytać {path.name}: {exc} – liczę od nowa.")
+
+    count("calendar.build")
+    sessions, closes = _fetch_sessions(exchange, start, end)
+    if path is not None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, sessions=sessions, closes=closes, start=start, end=end)
+    return sessions, closes
+
+
+# -------------------------------------------------------------
+# Kalendarz
+# -------------------------------------------------------------
+class TradingCalendar:
+    """Sesje jednej giełdy + tablica "dzień → następna sesja" (O(1))."""
+
+    def __init__(self, exchange: str, sessions: np.ndarray, start: str, end: str, closes: np.ndarray | None = None):
+        self.exchange = exchange
+        self.sessions = np.asarray(sessions, dtype="datetime64[D]")
+        # zamknięcie każdej sesji w UTC (naiwne datetime64[s])
+        self.closes = (np.asarray(closes, dtype="datetime64[s]") if closes is not None
+                       else _regular_closes(exchange, self.sessions))
+        self.start = _to_day(start)
+        self.end = _to_day(end)
+
+        # next_idx[d] = indeks pierwszej sesji >= start + d  (len(sessions) = brak w zakresie)
+        days = np.arange(self.start, self.end + _DAY, dtype="datetime64[D]")
+        self._next_idx = np.searchsorted(self.sessions, days, side="left")
+        self._is_session = np.zeros(len(days), dtype=bool)
+        inside = (self.sessions >= self.start) & (self.sessions <= self.end)
+        self._is_session[(self.sessions[inside] - self.start).astype(int)] = True
+
+    def __repr__(self) -> str:
+        return f"TradingCalendar({self.exchange}, {len(self.sessions)} sesji, {self.start} … {self.end})"
+
+    # ---------------------------------------------------------
+    def _offset(self, day: np.datetime64) -> int:
+        if not (self.start <= day <= self.end):
+            raise ValueError(f"{day} poza zakresem kalendarza {self.exchange} ({self.start} … {self.end})")
+        return int((day - self.start) // _DAY)
+
+    def is_trading_day(self, value) -> bool:
+        return bool(self._is_session[self._offset(_to_day(value))])
+
+    def next_trading_day(self, value) -> pd.Timestamp:
+        """Pierwsza sesja w dniu `value` lub później."""
+        i = self._next_idx[self._offset(_to_day(value))]
+        if i >= len(self.sessions):
+            raise ValueError(f"Brak sesji {self.exchange} po {value} w zakresie kalendarza")
+        return pd.Timestamp(self.sessions[i])
+
+    def sessions_between(self, start, end) -> pd.DatetimeIndex:
+        lo = np.searchsorted(self.sessions, _to_day(start), side="left")
+        hi = np.searchsorted(self.sessions, _to_day(end), side="right")
+        return pd.DatetimeIndex(self.sessions[lo:hi])
+
+    # ---------------------------------------------------------
+    def next_trading_days(self, values) -> pd.DatetimeIndex:
+        """
+        Wektorowo: dla każdej daty pierwsza sesja w tym dniu lub później;
+        NaT, gdy w zakresie kalendarza nie ma już sesji (po ostatniej).
+        """
+        days = pd.DatetimeIndex(values).to_numpy().astype("datetime64[D]")
+        if len(days) and (days.min() < self.start or days.max() > self.end):
+            raise ValueError(f"Daty poza zakresem kalendarza {self.exchange} ({self.start} … {self.end})")
+        idx = self._next_idx[((days - self.start) // _DAY).astype(int)]
+        past_end = idx >= len(self.sessions)
+        out = self.sessions[np.minimum(idx, len(self.sessions) - 1)]
+        out[past_end] = np.datetime64("NaT")
+        return pd.DatetimeIndex(out)
+
+    def next_close(self, now=None) -> pd.Timestamp:
+        """
+        Najbliższe zamknięcie sesji ściśle po `now` (UTC; naiwne `now` = UTC,
+        domyślnie teraz). Uwzględnia skrócone sesje (np. dzień po Thanksgiving).
+        """
+        now = pd.Timestamp.now(tz="UTC") if now is None else pd.Timestamp(now)
+        now = now.tz_convert("UTC").tz_localize(None) if now.tzinfo else now
+        i = np.searchsorted(self.closes, now.to_datetime64().astype("datetime64[s]"), side="right")
+        if i >= len(self.closes):
+            raise ValueError(f"Brak zamknięć sesji {self.exchange} po {now} w zakresie kalendarza")
+        return pd.Timestamp(self.closes[i]).tz_localize("UTC")
+
+    def session_of_close(self, close) -> pd.Timestamp:
+        """Data sesji (dzień giełdy) dla zamknięcia z next_close()."""
+        close = pd.Timestamp(close)
+        close = close.tz_convert("UTC").tz_localize(None) if close.tzinfo else close
+        i = np.searchsorted(self.closes, close.to_datetime64().astype("datetime64[s]"), side="left")
+        return pd.Timestamp(self.sessions[min(i, len(self.sessions) - 1)])
+
+    def monthly_sessions(self, day: int, start, end) -> pd.DatetimeIndex:
+        """
+        Dla każdego miesiąca z [start, end]: sesja w dniu `day` albo pierwsza
+        kolejna (dla dni 29–31 w krótszym miesiącu – od ostatniego dnia miesiąca).
+        Zwraca tylko sesje w zakresie [start, end].
+        """
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        months = pd.date_range(start.to_period("M").to_timestamp(), end, freq="MS")
+        targets = months + pd.to_timedelta(np.minimum(day, months.days_in_month) - 1, unit="D")
+        out = self.next_trading_days(targets)
+        return out[(out >= start) & (out <= end)].unique()
+
+
+def _default_end() -> str:
+    return f"{date.today().year + CALENDAR_YEARS_AHEAD}-12-31"
+
+
+@lru_cache(maxsize=None)
+def _calendar(exchange: str, start: str, end: str, store_dir: str | None) -> TradingCalendar:
+    sessions, closes = _load_sessions(exchange, start, end, Path(store_dir) if store_dir else None)
+    return TradingCalendar(exchange, sessions, start, end, closes=closes)
+
+
+def get_calendar(
+    exchange: str = DEFAULT_EXCHANGE,
+    start: str = CALENDAR_START,
+    end: str | None = None,
+    store_dir: str | Path | None = _DEFAULT_DIR,
+) -> TradingCalendar:
+    """
+    Kalendarz giełdy (NYSE / WSE / XETRA) – raz na proces (lru_cache)
+    i raz na dysku (domyślnie CALENDAR_DIR, store_dir=None wyłącza zapis).
+    """
+    if store_dir is _DEFAULT_DIR:
+        store_dir = CALENDAR_DIR
+    if exchange not in EXCHANGES:
+        raise ValueError(f"Nieznana giełda {exchange!r}. Dostępne: {sorted(EXCHANGES)}")
+    if end is None:
+        end = _default_end()
+    return _calendar(exchange, str(start)[:10], str(end)[:10], str(store_dir) if store_dir else None)
+
+
+# -------------------------------------------------------------
+# Dni rebalansu / wpłat
+# -------------------------------------------------------------
+def monthly_session(today, day: int = REBALANCE_DAY, exchange: str = DEFAULT_EXCHANGE) -> pd.Timestamp:
+    """Sesja "`day`-ty albo następna" w miesiącu daty `today`."""
+    ts = pd.Timestamp(today)
+    target = ts.replace(day=min(day, ts.days_in_month))
+    return get_calendar(exchange).next_trading_day(target)
+
+
+def is_rebalance_day(today, day: int = REBALANCE_DAY, exchange: str = DEFAULT_EXCHANGE) -> bool:
+    """Czy `today` to sesja rebalansu (10-ty albo najbliższa kolejna sesja)."""
+    return pd.Timestamp(today).normalize() == monthly_session(today, day, exchange)
+
+
+def _calendar_covering(start: pd.Timestamp, end: pd.Timestamp, exchange: str) -> TradingCalendar:
+    return get_calendar(
+        exchange,
+        start=min(start.strftime("%Y-%m-%d"), CALENDAR_START),
+        end=max(end.strftime("%Y-%m-%d"), _default_end()),
+    )
+
+
+def trading_sessions(start, end, exchange: str = DEFAULT_EXCHANGE) -> pd.DatetimeIndex:
+    """Wszystkie sesje giełdy w [start, end] (bez weekendów i świąt)."""
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    return _calendar_covering(start, end, exchange).sessions_between(start, end)
+
+
+def rebalance_dates(start, end, day: int = REBALANCE_DAY, exchange: str = DEFAULT_EXCHANGE) -> pd.DatetimeIndex:
+    """Wszystkie sesje rebalansu w [start, end] (wektorowo)."""
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    return _calendar_covering(start, end, exchange).monthly_sessions(day, start, end)
+
+
+def rebalance_rows(index: pd.DatetimeIndex, day: int = REBALANCE_DAY, exchange: str = DEFAULT_EXCHANGE) -> np.ndarray:
+    """
+    Wiersze panelu cen `index` z rebalansem: pierwszy wiersz w dniu sesji
+    rebalansu lub później (panel może mieć luki / inne dni niż kalendarz).
+    """
+    if len(index) == 0:
+        return np.array([], dtype=np.int64)
+    dates = rebalance_dates(index[0], index[-1], day, exchange)
+    rows = np.unique(index.searchsorted(dates, side="left"))
+    return rows[rows < len(index)]
@@ -1,11 +1,33 @@
+import json
+import os
+from pathlib import Path
+
 import pandas as pd
 
+# Nadpisanie wszechświata: lista po przecinku ("AAPL,MSFT") albo ścieżka
+# do pliku JSON z kluczem "tickers" (np. _manifest.json z synthetic_data.py)
+UNIVERSE_ENV = "MOMENTUM_UNIVERSE"
+
+
+def _universe_override(value):
+    path = Path(value)
+    if path.suffix == ".json" or path.is_file():
+        with open(path, encoding="utf-8") as f:
+            return list(json.load(f)["tickers"])
+    return [t.strip() for t in value.split(",") if t.strip()]
+
 
 def load_universe():
     """
     Zwraca listę tickerów wykorzystywanych w strategii momentum (Strategy B).
     Możesz dowolnie rozszerzyć wszechświat akcji.
+
+    MOMENTUM_UNIVERSE podmienia listę (np. na tickery magazynu syntetycznego):
+        MOMENTUM_UNIVERSE=data/synthetic/prices/_manifest.json
     """
+    override = os.environ.get(UNIVERSE_ENV)
+    if override:
+        return _universe_override(override)
 
     # US mega-cap momentum universe
     tickers = [
@@ -0,0 +1,333 @@
+# src/walk_forward.py
+
+"""
+Walk-forward dla strategii momentum (backtest_simple.simulate).
+
+Historia dzielona jest na kroczące foldy:
+
+    |------ train (train_years) ------|-- test (test_months) --|
+              |------ train ------------------|-- test --|          (przesunięcie step_months)
+
+W każdym foldzie:
+  1. na oknie train liczymy KAŻDĄ kombinację parametrów z siatki
+     (top_n, zestaw okresów ROC) i wybieramy najlepszą wg `objective`
+     (metryka z analytics.summarize, np. sharpe / cagr / calmar),
+  2. wybrane parametry oceniamy na następującym po nim oknie test
+     (out-of-sample).
+
+Foldy liczone są równolegle w puli procesów. Panel cen trafia RAZ do
+pamięci współdzielonej (multiprocessing.shared_memory); workery dołączają
+do niego i budują widok numpy tylko do odczytu – bez kopiowania panelu
+przy każdym zadaniu. Wskaźniki (ROC) każdy proces liczy raz na cały panel.
+
+Wynik:
+  - tabela foldów: okna, wybrane parametry, wynik train, metryki test,
+  - sklejona krzywa OOS: zwroty TWR kolejnych okien test łańcuchowo
+    (start = 1.0; wpłaty nie zniekształcają zwrotu),
+  - metryki całej krzywej OOS.
+
+    python src/walk_forward.py --train-years 3 --test-months 6 --workers 4
+    python src/walk_forward.py --top-n 3 5 10 --objective calmar
+    python src/walk_forward.py --panel data/panels/prices.npz   # compact_store zamiast Yahoo
+    python src/walk_forward.py --panel-server                   # panel z panel_server.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from analytics import format_summary, returns, summarize, wealth_index
+from report_sink import ReportSink
+
+DEFAULT_GRID = {
+    "top_n": [3, 5, 10],
+    "roc_periods": [(63, 126, 252), (126, 252), (21, 63, 126)],
+}
+
+REPORT_DIR = "reports/walk_forward"
+
+
+# -------------------------------------------------------------
+# Foldy i siatka parametrów
+# -------------------------------------------------------------
+def make_folds(
+    dates: pd.DatetimeIndex,
+    train_years: int = 3,
+    test_months: int = 6,
+    step_months: int | None = None,
+    warmup_days: int = 252,
+) -> List[dict]:
+    """
+    Kroczące okna train/test na sesjach `dates`. Pierwsze `warmup_days`
+    sesji to tylko historia dla wskaźników (ROC12) – train zaczyna się po niej.
+    Ostatni test może być krótszy (kończy się na ostatniej sesji).
+    """
+    step = pd.DateOffset(months=step_months or test_months)
+    if len(dates) <= warmup_days:
+        return []
+
+    folds = []
+    train_start = dates[warmup_days]
+    last = dates[-1]
+    while True:
+        train_end = train_start + pd.DateOffset(years=train_years)
+        test_end = train_end + pd.DateOffset(months=test_months)
+        if train_end >= last:
+            break
+        folds.append({
+            "fold": len(folds),
+            "train_start": train_start,
+            "train_end": train_end - pd.Timedelta(days=1),
+            "test_start": train_end,
+            "test_end": min(test_end - pd.Timedelta(days=1), last),
+        })
+        train_start = train_start + step
+    return folds
+
+
+def expand_grid(grid: Dict[str, Sequence]) -> List[dict]:
+    """{"top_n": [3, 5], ...} -> lista wszystkich kombinacji parametrów."""
+    keys = list(grid)
+    return [dict(zip(keys, combo)) for combo in itertools.product(*(grid[k] for k in keys))]
+
+
+def _label(params: dict) -> str:
+    return " ".join(
+        f"{k}={'/'.join(map(str, v)) if isinstance(v, (tuple, list)) else v}" for k, v in params.items()
+    )
+
+
+# -------------------------------------------------------------
+# Panel w pamięci współdzielonej
+# -------------------------------------------------------------
+class SharedPanel:
+    """
+    Panel Close [data x ticker] w bloku shared_memory. Rodzic tworzy blok
+    (create), workery dołączają po nazwie (attach) i dostają DataFrame
+    zbudowany na widoku numpy tylko do odczytu.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, shape, index, columns, owner: bool):
+        self.shm = shm
+        self.shape = tuple(shape)
+        self.index = index
+        self.columns = list(columns)
+        self.owner = owner
+
+    @classmethod
+    def create(cls, panel: pd.DataFrame) -> "SharedPanel":
+        values = panel.to_numpy(dtype=np.float64)
+        shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=np.float64, buffer=shm.buf)[:] = values
+        return cls(shm, values.shape, panel.index.to_numpy(), panel.columns, owner=True)
+
+    @classmethod
+    def attach(cls, spec: dict) -> "SharedPanel":
+        shm = shared_memory.SharedMemory(name=spec["name"])
+        return cls(shm, spec["shape"], spec["index"], spec["columns"], owner=False)
+
+    def spec(self) -> dict:
+        """Lekki opis (nazwa bloku + osie) do przekazania workerom."""
+        return {"name": self.shm.name, "shape": self.shape, "index": self.index, "columns": self.columns}
+
+    def frame(self) -> pd.DataFrame:
+        values = np.ndarray(self.shape, dtype=np.float64, buffer=self.shm.buf)
+        values.flags.writeable = False
+        return pd.DataFrame(values, index=pd.DatetimeIndex(self.index), columns=self.columns, copy=False)
+
+    def close(self) -> None:
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+# -------------------------------------------------------------
+# Praca jednego foldu
+# -------------------------------------------------------------
+_WORKER: dict = {}
+
+
+def _init_worker(spec: dict) -> None:
+    from indicators import IndicatorCache
+
+    shared = SharedPanel.attach(spec)
+    prices = shared.frame()
+    _WORKER.update(shared=shared, prices=prices, indicators=IndicatorCache(prices))
+
+
+def _simulate(params: dict, start, end, costs=None) -> dict:
+    from backtest_simple import simulate
+
+    return simulate(_WORKER["prices"], _WORKER["indicators"], start=start, end=end, costs=costs, **params)
+
+
+def run_fold(fold: dict, candidates: List[dict], objective: str = "sharpe", costs=None) -> dict:
+    """Przegląd siatki na train, ocena najlepszych parametrów na test (z kosztami `costs`)."""
+    train = [_simulate(p, fold["train_start"], fold["train_end"], costs) for p in candidates]
+
+    # wszystkie kandydatki mają te same sesje – metryki jednym wywołaniem
+    scores = summarize(
+        np.column_stack([r["equity"] for r in train]),
+        flows=np.column_stack([r["flow"] for r in train]),
+        dates=train[0]["dates"],
+    )[objective].to_numpy()
+    best = int(np.nanargmax(scores)) if np.isfinite(scores).any() else 0
+
+    test = _simulate(candidates[best], fold["test_start"], fold["test_end"], costs)
+    return {
+        **fold,
+        "params": candidates[best],
+        "train_score": float(scores[best]),
+        "train_scores": scores.tolist(),
+        "dates": test["dates"],
+        "equity": test["equity"],
+        "flow": test["flow"],
+    }
+
+
+def _run_fold_task(args) -> dict:
+    return run_fold(*args)
+
+
+# -------------------------------------------------------------
+# Walk-forward
+# -------------------------------------------------------------
+def stitch_oos(results: List[dict]) -> pd.DataFrame:
+    """
+    Sklejona krzywa out-of-sample: zwroty TWR każdego okna test łańcuchowo.
+    Pierwszy dzień okna test to wejście (zwrot 0) – łączymy okna bez
+    przenoszenia kapitału między nimi. Kolumny: fold | ret | oos_equity.
+    """
+    parts = []
+    for res in sorted(results, key=lambda r: r["test_start"]):
+        rets = returns(res["equity"], res["flow"])[:, 0]
+        parts.append(pd.DataFrame({"fold": res["fold"], "ret": np.nan_to_num(rets)}, index=res["dates"]))
+    if not parts:
+        return pd.DataFrame(columns=["fold", "ret", "oos_equity"])
+    oos = pd.concat(parts)
+    oos = oos[~oos.index.duplicated(keep="first")]
+    oos["oos_equity"] = wealth_index(oos["ret"].to_numpy())[:, 0]
+    oos.index.name = "date"
+    return oos
+
+
+def walk_forward(
+    prices: pd.DataFrame,
+    grid: Dict[str, Sequence] | None = None,
+    train_years: int = 3,
+    test_months: int = 6,
+    step_months: int | None = None,
+    objective: str = "sharpe",
+    workers: int | None = None,
+    costs=None,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    prices : panel Close [data x ticker] (z historią na rozgrzewkę ROC)
+    costs  : CostModel / nazwa brokera (costs.py) – ta sama taryfa na train i test
+    Zwraca (tabela foldów, sklejona krzywa OOS).
+    """
+    candidates = expand_grid(grid or DEFAULT_GRID)
+    prices = prices[prices.notna().any(axis=1)]
+    folds = make_folds(prices.index, train_years, test_months, step_months)
+    if not folds:
+        raise ValueError("Za krótka historia na choćby jeden fold train/test.")
+
+    workers = workers or min(len(folds), os.cpu_count() or 1)
+    print(f"[WF] {len(folds)} foldów x {len(candidates)} kombinacji parametrów, procesy: {workers}")
+
+    shared = SharedPanel.create(prices)
+    try:
+        tasks = [(fold, candidates, objective, costs) for fold in folds]
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(shared.spec(),)) as pool:
+                results = list(pool.map(_run_fold_task, tasks))
+        else:
+            _init_worker(shared.spec())
+            try:
+                results = [_run_fold_task(t) for t in tasks]
+            finally:
+                _WORKER.pop("shared").close()
+                _WORKER.clear()
+    finally:
+        shared.close()
+
+    rows = []
+    for r in results:
+        stats = summarize(r["equity"], flows=r["flow"], dates=r["dates"]).iloc[0]
+        rows.append({
+            "fold": r["fold"],
+            "train_start": r["train_start"], "train_end": r["train_end"],
+            "test_start": r["test_start"], "test_end": r["test_end"],
+            "params": _label(r["params"]),
+            f"train_{objective}": r["train_score"],
+            **{f"test_{m}": stats[m] for m in ("twr", "cagr", "sharpe", "max_drawdown")},
+        })
+    return pd.DataFrame(rows), stitch_oos(results)
+
+
+def write_reports(folds: pd.DataFrame, oos: pd.DataFrame, root: str = REPORT_DIR) -> None:
+    """Tabela foldów (CSV) + krzywa OOS (format kolumnowy, opcjonalnie CSV)."""
+    os.makedirs(root, exist_ok=True)
+    folds.to_csv(os.path.join(root, "folds.csv"), index=False)
+    with ReportSink(root, export_csv=True) as sink:
+        curve = sink.table("oos_equity", {"date": "date", "fold": "i8", "ret": "f8", "oos_equity": "f8"})
+        curve.extend({"date": oos.index, **{c: oos[c] for c in ("fold", "ret", "oos_equity")}})
+
+
+# -------------------------------------------------------------
+# CLI
+# -------------------------------------------------------------
+if __name__ == "__main__":
+    import backtest_simple
+    from universe import load_universe
+
+    parser = argparse.ArgumentParser(description="Walk-forward strategii momentum (foldy równolegle)")
+    parser.add_argument("--train-years", type=int, default=3)
+    parser.add_argument("--test-months", type=int, default=6)
+    parser.add_argument("--step-months", type=int, default=None, help="przesunięcie foldów (domyślnie = test)")
+    parser.add_argument("--objective", default="sharpe", help="metryka wyboru na train (kolumna summarize)")
+    parser.add_argument("--top-n", type=int, nargs="+", default=DEFAULT_GRID["top_n"])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--broker", default=None, help="model kosztów z costs.BROKERS (np. xtb, ibkr)")
+    parser.add_argument("--out", default=REPORT_DIR)
+    parser.add_argument("--panel", default=None,
+                        help="panel compact_store (.npz) – Adj Close zamiast pobierania z Yahoo")
+    parser.add_argument("--panel-server", action="store_true",
+                        help="panel z działającego panel_server.py (bez niego – lokalny compact_store)")
+    args = parser.parse_args()
+
+    if args.panel or args.panel_server:
+        from compact_store import CompactPanel
+        from panel_server import open_panel
+
+        panel = open_panel() if args.panel_server else CompactPanel.load(args.panel)
+        prices = panel.close_panel("Adj Close", tickers=[t for t in load_universe() if t in panel])
+    else:
+        prices = backtest_simple.download_price_history(load_universe())
+    folds, oos = walk_forward(
+        prices,
+        grid={**DEFAULT_GRID, "top_n": args.top_n},
+        train_years=args.train_years,
+        test_months=args.test_months,
+        step_months=args.step_months,
+        objective=args.objective,
+        workers=args.workers,
+        costs=args.broker,
+    )
+    write_reports(folds, oos, args.out)
+
+    print("\n=== WALK-FORWARD: foldy ===\n")
+    print(folds.to_string(index=False))
+    print("\n=== OUT-OF-SAMPLE (sklejone okna test) ===\n")
+    stats = summarize(oos[["oos_equity"]])
+    print(format_summary(stats.iloc[0]))
+    print(f"\nRaporty: {args.out}/folds.csv, {args.out}/oos_equity.cols / .csv")
@@ -0,0 +1,18 @@
+# tests/conftest.py
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import db  # noqa: E402
+
+
+@pytest.fixture
+def ledger_db(tmp_path, monkeypatch):
+    """Pusta baza portfela w tmp_path (katalog roboczy też tmp_path)."""
+    monkeypatch.chdir(tmp_path)
+    with db.use_database(tmp_path / "portfolio.db"):
+        db.init_db()
+        yield tmp_path / "portfolio.db"
@@ -0,0 +1,58 @@
+# tests/test_compact_store.py
+import numpy as np
+import pandas as pd
+import pytest
+
+import trading_calendar
+from compact_store import CODECS, PRICE_FIELDS, PRICE_REL_TOL, CompactPanel, build_panel, verify
+from synthetic_data import write_price_store
+
+
+@pytest.fixture(autouse=True)
+def _calendar_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(trading_calendar, "CALENDAR_DIR", tmp_path / "calendars")
+
+
+def _frames():
+    rng = np.random.default_rng(7)
+    idx = pd.bdate_range("2024-01-01", periods=120)
+    frames = {}
+    for t, scale in (("AAA", 50.0), ("BBB", 3000.0)):
+        close = scale * np.exp(np.cumsum(rng.normal(0, 0.02, len(idx))))
+        frames[t] = pd.DataFrame({
+            "Open": close * 0.99, "High": close * 1.01, "Low": close * 0.98,
+            "Close": close, "Adj Close": close * 0.97,
+            "Volume": rng.integers(0, 10**6, len(idx)).astype(float),
+        }, index=idx)
+    frames["BBB"].loc[idx[10:14], "Volume"] = np.nan
+    frames["BBB"].iloc[5, frames["BBB"].columns.get_loc("Volume")] = 2.0 ** 40   # nie mieści się w uint32
+    frames["NAN"] = pd.DataFrame(np.nan, index=idx[::3], columns=list(PRICE_FIELDS) + ["Volume"])
+    return frames
+
+
+@pytest.mark.parametrize("compress", [False, True])
+@pytest.mark.parametrize("codec", CODECS)
+def test_save_load_round_trip_is_bit_exact(tmp_path, codec, compress):
+    panel = CompactPanel.from_frames(_frames())
+    assert panel.volume.dtype == np.uint64
+
+    loaded = CompactPanel.load(panel.save(tmp_path / "p.npz", codec=codec, compress=compress))
+
+    assert loaded.tickers == panel.tickers and loaded.fields == panel.fields
+    np.testing.assert_array_equal(loaded.dates, panel.dates)
+    np.testing.assert_array_equal(loaded.prices.view(np.uint32), panel.prices.view(np.uint32))
+    assert loaded.volume.dtype == panel.volume.dtype
+    np.testing.assert_array_equal(loaded.volume, panel.volume)
+    np.testing.assert_array_equal(loaded.present, panel.present)
+    assert np.isnan(loaded.frame("NAN")[list(PRICE_FIELDS)].to_numpy()).all()
+
+
+def test_verify_against_generated_store(tmp_path):
+    store = tmp_path / "prices"
+    write_price_store(store, n_tickers=8, years=2, seed=3)
+
+    panel = CompactPanel.load(build_panel(store_dir=store).save(tmp_path / "p.npz", codec="delta"))
+    report = verify(panel, store_dir=store).set_index("field")
+
+    assert report["mismatches"].sum() == 0
+    assert report["max_rel_error"].dropna().le(PRICE_REL_TOL).all()
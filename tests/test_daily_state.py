@@ -0,0 +1,48 @@
+# tests/test_daily_state.py
+import pytest
+
+import daily_state
+import trading_calendar
+from synthetic_data import generate_price_panel
+
+
+@pytest.fixture(autouse=True)
+def _calendar_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(trading_calendar, "CALENDAR_DIR", tmp_path / "calendars")
+
+
+def _upto(panel, day, tickers):
+    return {t: panel[t].loc[:day] for t in tickers if not panel[t].loc[:day].empty}
+
+
+def test_incremental_state_matches_full_recompute(tmp_path):
+    panel = generate_price_panel(n_tickers=6, years=3, seed=11, split_prob=0.0, delist_prob=0.0, ipo_prob=0.0)
+    spy = panel.pop("SPY")["Close"]
+    tickers = sorted(panel)
+    dates = spy.index
+    store = tmp_path / "state"
+
+    # start bez ostatniego tickera, potem po jednej / kilku sesjach
+    steps = [dates[-60], dates[-59], dates[-55], dates[-54]]
+    for day in steps:
+        report = daily_state.verify(_upto(panel, day, tickers[:-1]), spy.loc[:day], store_dir=store)
+        assert report["ok"], (day, report)
+
+    # nowy ticker w połowie strumienia
+    day = dates[-50]
+    report = daily_state.verify(_upto(panel, day, tickers), spy.loc[:day], store_dir=store)
+    assert report["ok"], report
+
+    # przepisana historia (np. korekta po splicie) – ticker musi zostać odbudowany
+    rewritten = tickers[0]
+    panel[rewritten] = panel[rewritten].assign(Close=panel[rewritten]["Close"] * 0.5)
+    day = dates[-49]
+    data = _upto(panel, day, tickers)
+    stats = daily_state.RollingState.load(store / "momentum.npz").update({rewritten: data[rewritten]["Close"]})
+    assert stats["rebuilt"] == 1
+
+    report = daily_state.verify(data, spy.loc[:day], store_dir=store)
+    assert report["ok"], report
+    for day in (dates[-45], dates[-1]):
+        report = daily_state.verify(_upto(panel, day, tickers), spy.loc[:day], store_dir=store)
+        assert report["ok"], report
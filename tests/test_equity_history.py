@@ -0,0 +1,50 @@
+# tests/test_equity_history.py
+import numpy as np
+import pandas as pd
+import pytest
+
+import ledger
+import trading_calendar
+from db import record_transaction
+from equity_history import update_equity_history
+from portfolio_storage import record_contribution
+
+FX = pd.DataFrame({"USD": 4.0, "EUR": 4.3}, index=pd.bdate_range("2026-09-01", "2026-10-30"))
+PRICES = {"AAA": 100.0, "BBB": 25.0}
+
+
+def _price_data():
+    idx = pd.bdate_range("2026-09-01", "2026-10-30")
+    return {t: pd.DataFrame({"Close": np.full(len(idx), p)}, index=idx) for t, p in PRICES.items()}
+
+
+def _buy(day, ticker, qty):
+    record_transaction(f"{day} 18:00:00", ticker, "BUY", qty, PRICES[ticker], "USD", PRICES[ticker] * 4.0, "test")
+
+
+def _sell(day, ticker, qty):
+    record_transaction(f"{day} 18:00:00", ticker, "SELL", qty, PRICES[ticker], "USD", PRICES[ticker] * 4.0, "test")
+
+
+@pytest.fixture(autouse=True)
+def _calendar_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(trading_calendar, "CALENDAR_DIR", tmp_path / "calendars")
+
+
+def test_equity_history_quantities_follow_ledger_replay(ledger_db):
+    record_contribution("2026-10-01 10:00:00", 20_000.0)
+    _buy("2026-10-01", "AAA", 10)
+    _sell("2026-10-02", "AAA", 15)   # sprzedaż ponad stan: pozycja znika, nadwyżka nie jest pamiętana
+    _sell("2026-10-05", "BBB", 8)    # pozycja wpisana ręcznie (poza ledgerem)
+    _buy("2026-10-06", "AAA", 4)
+    _buy("2026-10-06", "BBB", 6)
+    _sell("2026-10-07", "BBB", 2)
+
+    history = update_equity_history(as_of="2026-10-09", price_data=_price_data(), fx_history=FX)
+
+    for day, row in history.iterrows():
+        positions, cash = ledger.state_as_of(day)
+        value = sum(q * PRICES[t] * 4.0 for t, q in zip(positions["ticker"], positions["quantity"]))
+        assert row["positions_pln"] == pytest.approx(value), day
+        assert row["cash_pln"] == pytest.approx(cash), day
+    assert history["positions_pln"].iloc[-1] == pytest.approx((4 * 100.0 + 4 * 25.0) * 4.0)
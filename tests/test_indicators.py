@@ -0,0 +1,28 @@
+# tests/test_indicators.py
+import numpy as np
+import pandas as pd
+
+from indicators import IndicatorCache, sma
+
+
+def _panel(rows=1500):
+    rng = np.random.default_rng(1)
+    idx = pd.bdate_range("2015-01-01", periods=rows)
+    values = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (rows, 4)), axis=0))
+    return pd.DataFrame(values, index=idx, columns=["AAA", "BBB", "CCC", "DDD"])
+
+
+def test_cache_recomputes_ticker_when_old_history_changes(tmp_path):
+    panel = _panel()
+    IndicatorCache(panel.iloc[:1400], store_dir=tmp_path).get("sma", window=200)
+
+    # zmiana daleko przed ogonem źródła (np. przepisany CSV po splicie) + nowe sesje
+    changed = panel.iloc[:1410].copy()
+    changed.iloc[300:310, 1] *= 0.5
+    out = IndicatorCache(changed, store_dir=tmp_path).get("sma", window=200)
+    np.testing.assert_allclose(out.to_numpy(), sma(changed, 200).to_numpy())
+
+    # okno przesunięte o kilka sesji: poza pierwszymi `window` wierszami jak od zera
+    window = changed.iloc[5:]
+    out = IndicatorCache(window, store_dir=tmp_path).get("sma", window=200)
+    np.testing.assert_allclose(out.iloc[200:].to_numpy(), sma(window, 200).iloc[200:].to_numpy())
@@ -0,0 +1,90 @@
+# tests/test_trade_engine.py
+import numpy as np
+import pandas as pd
+import pytest
+
+import ledger
+from costs import BROKERS
+from portfolio_storage import estimate_cash_pln, load_positions, record_contribution
+from trade_engine import build_rebalance_orders, buy_according_to_allocation
+
+FX = pd.Series({"USD": 4.0, "EUR": 4.3})
+PRICES = {"AAA": 100.0, "BBB": 25.0, "CCC": 40.0, "DDD": 7.5}
+
+
+def _price_data(prices=PRICES):
+    idx = pd.bdate_range("2026-10-01", periods=5)
+    return {t: pd.DataFrame({"Close": np.full(len(idx), p)}, index=idx) for t, p in prices.items()}
+
+
+def _alloc(values):
+    return pd.DataFrame({"ticker": list(values), "target_value_ccy": list(values.values()), "currency": "USD"})
+
+
+def _positions(rows):
+    return pd.DataFrame(rows, columns=["ticker", "quantity", "currency", "avg_price_ccy", "avg_price_pln"])
+
+
+# -------------------------------------------------------------
+# Netting
+# -------------------------------------------------------------
+def test_orders_are_net_deltas_vs_held_positions():
+    held = _positions([("AAA", 10, "USD", 90.0, 360.0), ("BBB", 40, "USD", 20.0, 80.0), ("CCC", 5, "USD", 40.0, 160.0)])
+    alloc = _alloc({"AAA": 1500.0, "BBB": 1000.0, "DDD": 750.0})  # CCC wypada z alokacji
+
+    orders = build_rebalance_orders(held, alloc, _price_data(), FX, costs="none").set_index("ticker")
+
+    assert set(orders.index) == {"AAA", "CCC", "DDD"}          # BBB już jest na celu
+    assert orders.loc["AAA", "side"] == "BUY" and orders.loc["AAA", "quantity"] == pytest.approx(5)
+    assert orders.loc["CCC", "side"] == "SELL" and orders.loc["CCC", "quantity"] == pytest.approx(5)
+    assert orders.loc["DDD", "quantity"] == pytest.approx(100)
+    assert orders.loc["AAA", "avg_price_ccy"] == pytest.approx((10 * 90 + 5 * 100) / 15)
+
+
+def test_small_partial_deltas_are_skipped_but_full_exits_are_not():
+    held = _positions([("AAA", 10, "USD", 100.0, 400.0), ("DDD", 1, "USD", 7.5, 30.0)])
+    alloc = _alloc({"AAA": 1010.0})  # +0.1 szt. = 40 PLN < MIN_TRADE_VALUE_PLN
+
+    orders = build_rebalance_orders(held, alloc, _price_data(), FX, costs="none")
+
+    assert orders[["ticker", "side"]].values.tolist() == [["DDD", "SELL"]]
+
+
+# -------------------------------------------------------------
+# Gotówka nigdy poniżej zera
+# -------------------------------------------------------------
+@pytest.mark.parametrize("broker", sorted(BROKERS))
+def test_rebalance_never_overspends_cash(ledger_db, broker):
+    record_contribution("2026-10-01 10:00:00", 20_000.0)
+    buy_according_to_allocation("2026-10-01 18:00:00", _alloc({"AAA": 2500.0, "BBB": 2500.0}),
+                                FX, _price_data(), costs=broker)
+    assert 0 <= estimate_cash_pln() < 200
+
+    # całe equity (z gotówką) w nowy cel, część pozycji sprzedawana w tym samym batchu
+    buy_according_to_allocation("2026-10-08 18:00:00", _alloc({"AAA": 1000.0, "CCC": 2000.0, "DDD": 1950.0}),
+                                FX, _price_data(), costs=broker)
+    assert estimate_cash_pln() >= 0
+
+
+# -------------------------------------------------------------
+# Ledger
+# -------------------------------------------------------------
+def test_ledger_replay_matches_positions(ledger_db):
+    record_contribution("2026-10-01 10:00:00", 30_000.0)
+    steps = [
+        ("2026-10-01 18:00:00", {"AAA": 2000.0, "BBB": 2000.0, "CCC": 2000.0}),
+        ("2026-10-05 18:00:00", {"AAA": 3000.0, "BBB": 500.0, "DDD": 1500.0}),
+        ("2026-10-09 18:00:00", {"AAA": 1000.0, "CCC": 2500.0, "DDD": 1500.0}),
+    ]
+    for i, (day, target) in enumerate(steps):
+        prices = {t: p * (1 + 0.05 * i) for t, p in PRICES.items()}
+        buy_according_to_allocation(day, _alloc(target), FX, _price_data(prices), costs="mbank")
+
+    ledger.ensure_snapshots(until="2026-10-06", freq="W-FRI")
+    replayed, cash = ledger.state_as_of("2026-10-09")
+    stored = load_positions().sort_values("ticker").reset_index(drop=True)
+
+    assert replayed["ticker"].tolist() == stored["ticker"].tolist()
+    for col in ["quantity", "avg_price_ccy", "avg_price_pln"]:
+        np.testing.assert_allclose(replayed[col].astype(float), stored[col].astype(float), rtol=1e-9)
+    assert cash == pytest.approx(estimate_cash_pln(), abs=0.01)